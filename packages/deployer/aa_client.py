@@ -38,6 +38,10 @@ parser.add_argument("--estimate-only", action="store_true",
 
 args = parser.parse_args()
 
+# One keep-alive session for all Bundler and node requests, so each call
+# after the first skips the TCP and TLS handshakes.
+session = requests.Session()
+
 # Multiply w3.eth.gas_price by this to get maxFeePerGas
 ETH_GAS_FEE_MULT = 1.05
 
@@ -163,7 +167,7 @@ def build_op(to_contract, value_in_wei, initcode_hex, calldata_hex):
         [to_contract, value_in_wei, Web3.to_bytes(hexstr=calldata_hex)]
     )
 
-    fee_resp = requests.post(
+    fee_resp = session.post(
         args.bundler_rpc, json=request("rundler_maxPriorityFeePerGas"), timeout=30)
     print("fee_resp", fee_resp.json())
     print("eth_gas", w3.eth.gas_price)
@@ -207,7 +211,7 @@ def estimate_op(p):
     vprint(f"estimation params {est_params}")
     vprint()
 
-    response = requests.post(
+    response = session.post(
         args.bundler_rpc,
         json=request("eth_estimateUserOperationGas", params=est_params), timeout=600
     )
@@ -251,7 +255,7 @@ def submit_op(base_op):
     vprint()
 
     while True:
-        response = requests.post(args.bundler_rpc, json=request(
+        response = session.post(args.bundler_rpc, json=request(
             "eth_sendUserOperation", params=[signed_op, ep_addr]), timeout=600)
         if 'result' in response.json():
             break
@@ -275,7 +279,7 @@ def submit_op(base_op):
     for _ in range(100):
         vprint(f"Waiting for op_hash {op_hash} receipt...")
         time.sleep(10)
-        op_receipt = requests.post(args.bundler_rpc, json=request(
+        op_receipt = session.post(args.bundler_rpc, json=request(
             "eth_getUserOperationReceipt", params=[op_hash['hash']]), timeout=600)
         try:
             op_receipt = op_receipt.json()['result']
@@ -324,7 +328,7 @@ def parse_receipt(op_receipt):
 
 vprint(f"Will connect to {args.bundler_rpc} (Bundler), {args.eth_rpc} (Eth)")
 
-w3 = Web3(Web3.HTTPProvider(args.eth_rpc))
+w3 = Web3(Web3.HTTPProvider(args.eth_rpc, session=session))
 assert w3.is_connected
 
 # Start with the default addresses
@@ -335,7 +339,7 @@ elif args.ep_version == "v6":
 
 # Allow overrides
 if args.entry_point == "detect":
-    detect_response = requests.post(
+    detect_response = session.post(
         args.bundler_rpc, json=request("eth_supportedEntryPoints", params=[]), timeout=60)
 
     assert "result" in detect_response.json()
@@ -1,5 +1,12 @@
 from .server import HybridComputeSDK
 from .userop_manager import UserOpManager
-from .aa_utils import AAUtils
+from .aa_utils import AAUtils, FeeBump, PollSchedule, UserOpError
+from .async_aa_utils import AsyncAAUtils
+from .op_pipeline import OpPipeline
+from .membership import AddressSet
+from .fetch import Fetcher, FetchError
+from .gas_cache import GasEstimateCache
+from .endpoints import EndpointPool
+from .node_client import NodeClient, BlockNotFound
 
-__all__ = ['HybridComputeSDK', 'UserOpManager', 'AAUtils', 'Deploy']
+__all__ = ['HybridComputeSDK', 'UserOpManager', 'AAUtils', 'AsyncAAUtils', 'OpPipeline', 'FeeBump', 'PollSchedule', 'UserOpError', 'Deploy', 'AddressSet', 'Fetcher', 'FetchError', 'GasEstimateCache', 'EndpointPool', 'NodeClient', 'BlockNotFound']
@@ -1,7 +1,9 @@
+import math
 import os
 import re
-import sys
-from typing import Dict, Any, Optional
+import threading
+from concurrent.futures import Future, FIRST_COMPLETED, InvalidStateError, wait
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
 from web3 import Web3
 from eth_account import Account
 import eth_account
@@ -9,21 +11,258 @@ from eth_abi import abi as ethabi
 import requests
 from jsonrpcclient import request
 import time
+from hybrid_compute_sdk.fee_oracle import get_fee_oracle
+from hybrid_compute_sdk.endpoints import EndpointPool
+from hybrid_compute_sdk.gas_cache import GasEstimateCache
+from hybrid_compute_sdk.pvg import L1FeeModel, estimate_pvg
+from hybrid_compute_sdk.sessions import http_session
+from hybrid_compute_sdk.providers import make_provider, get_head_subscription, is_http, HEAD_WAIT_LIMIT
+from hybrid_compute_sdk.userop_hash import UserOpHasher
+
+class UserOpError(Exception):
+    """Base class for errors submitting a UserOperation"""
+
+class UserOpSubmitError(UserOpError):
+    """The Bundler rejected the operation. args[0] is its JSON-RPC error."""
+
+class UserOpTimeoutError(UserOpError):
+    """No receipt before the polling deadline. args[0] is the operation hash."""
+
+class UserOpFailedError(UserOpError):
+    """The operation was included but failed. args[0] is the receipt."""
+
+class PollSchedule:
+    """
+    Delays between receipt polls. Polling starts at 'initial' seconds, which
+    should be about half a block time, and backs off by 'factor' per attempt up
+    to 'max_interval', giving up once 'deadline' seconds have passed in total.
+    The defaults suit Boba's 2 second blocks.
+    """
+
+    def __init__(self, initial=1.0, factor=1.5, max_interval=10.0, deadline=600.0):
+        self.initial = initial
+        self.factor = factor
+        self.max_interval = max_interval
+        self.deadline = deadline
+
+    def delays(self):
+        """Yields each delay, stopping before the deadline would be exceeded. Time
+           spent between delays (e.g. in the poll requests) counts towards it."""
+        delay = self.initial
+        start = time.monotonic()
+        waited = 0.0
+        while max(waited, time.monotonic() - start) + delay <= self.deadline:
+            yield delay
+            waited += delay
+            delay = min(delay * self.factor, self.max_interval)
+
+class ReceiptWatcher:
+    """
+    Waits for many UserOperations with a single polling loop. watch() registers
+    an op hash and returns a concurrent.futures.Future for its receipt. Every
+    'interval' seconds a background thread requests the receipts of all pending
+    ops in one batched eth_getUserOperationReceipt call. Futures fail with
+    UserOpFailedError if the op reverted, or UserOpTimeoutError after 'deadline'
+    seconds. The thread exits when nothing is pending.
+
+    Given a HeadSubscription, the watcher polls once per new block instead of
+    every 'interval' seconds.
+    """
+
+    def __init__(self, aa, interval=1.0, deadline=600.0, heads=None):
+        self.aa = aa
+        self.interval = interval
+        self.deadline = deadline
+        self.heads = heads
+        self.block = None
+        self.pending: Dict[str, Tuple[Future, float]] = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def watch(self, op_hash) -> Future:
+        """Returns a Future for the receipt of op_hash"""
+        with self.lock:
+            if op_hash in self.pending:
+                return self.pending[op_hash][0]
+            future = Future()
+            self.pending[op_hash] = (future, time.monotonic() + self.deadline)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="receipt-watcher", daemon=True)
+                self.thread.start()
+        return future
+
+    def close(self):
+        """Cancels all pending futures"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for future, _ in pending.values():
+            future.cancel()
+
+    def _run(self):
+        try:
+            while self._poll():
+                pass
+        except Exception as e: # pylint: disable=broad-exception-caught
+            # Fail everything pending rather than leave it waiting on a dead thread
+            print("*** Receipt watcher failed:", e)
+            with self.lock:
+                pending, self.pending = self.pending, {}
+                self.thread = None
+            for future, _ in pending.values():
+                settle(future, exc=e)
+        finally:
+            with self.lock:
+                if self.thread is threading.current_thread():
+                    self.thread = None
+
+    def _poll(self) -> bool:
+        """Waits for the next poll and resolves what it can. Returns False once
+           nothing is pending and the thread should exit."""
+        if self.heads is None:
+            time.sleep(self.interval)
+        else:
+            self.block = self.heads.wait_for_block(self.block, HEAD_WAIT_LIMIT)
+        with self.lock:
+            for op_hash in [h for h, (f, _) in self.pending.items() if f.cancelled()]:
+                del self.pending[op_hash]
+            hashes = list(self.pending)
+            if not hashes:
+                self.thread = None
+                return False
+        try:
+            receipts = self.aa.bundler_batch([("eth_getUserOperationReceipt", {'hash': h}) for h in hashes])
+        except Exception as e: # pylint: disable=broad-exception-caught
+            print("*** Receipt poll failed:", e)
+            receipts = [None] * len(hashes)
+        self._resolve(hashes, receipts)
+        return True
+
+    def _resolve(self, hashes: List[str], receipts: List[Optional[dict]]):
+        now = time.monotonic()
+        for op_hash, op_receipt in zip(hashes, receipts):
+            with self.lock:
+                entry = self.pending.get(op_hash)  # Gone if close() was called meanwhile
+                if entry is None or (op_receipt is None and now < entry[1]):
+                    continue
+                del self.pending[op_hash]
+            future = entry[0]
+            try:
+                if op_receipt is None:
+                    print("*** Operation timed out", op_hash)
+                    settle(future, exc=UserOpTimeoutError(op_hash))
+                elif op_receipt['receipt']['status'] != "0x1" or not op_receipt['success']:
+                    settle(future, exc=UserOpFailedError(op_receipt))
+                else:
+                    settle(future, op_receipt)
+            except Exception as e: # pylint: disable=broad-exception-caught
+                print("*** Malformed receipt for", op_hash, e)
+                settle(future, exc=UserOpFailedError(op_receipt))
+
+def settle(future: Future, result=None, exc=None):
+    """Completes a Future unless it was cancelled (possibly concurrently)"""
+    try:
+        if exc is None:
+            future.set_result(result)
+        else:
+            future.set_exception(exc)
+    except InvalidStateError:
+        pass
+
+# Bundler rejection of an op whose nonce matches one already in its mempool
+REPLACEMENT_ERROR = re.compile(r'replacement underpriced|replacement op must increase', re.IGNORECASE)
+
+# Bundler rejections from validating the op (EntryPoint "AAxx" reasons and gas
+# limit complaints). Any of them may come from a stale cached gas estimate,
+# e.g. AA23 when verificationGasLimit no longer covers the account's checks.
+VALIDATION_ERROR = re.compile(r'\bAA\d\d\b|out of gas|preVerificationGas|verificationGasLimit|callGasLimit'
+                              r'|gas limit|too little gas', re.IGNORECASE)
+# ERC-7769 error codes for ops rejected during validation
+VALIDATION_CODES = range(-32507, -32499)
+
+def is_validation_error(error: dict) -> bool:
+    return error.get('code') in VALIDATION_CODES or bool(VALIDATION_ERROR.search(str(error.get('message', ''))))
+
+class FeeBump:
+    """
+    Fee increases for replacing a pending UserOperation. ERC-4337 mempools only
+    accept a replacement with both maxFeePerGas and maxPriorityFeePerGas raised
+    by some minimum (10% by default in rundler), so 'percent' should exceed it.
+    An unmined op is re-bumped every 'interval' seconds, at most 'max_bumps'
+    times, and never beyond 'max_fee' if that is set.
+    """
+
+    def __init__(self, percent=12.5, interval=4.0, max_bumps=5, max_fee=None):
+        self.percent = percent
+        self.interval = interval
+        self.max_bumps = max_bumps
+        self.max_fee = max_fee
+
+    def bump(self, op):
+        """Copy of the op with raised fees, or None if they would exceed max_fee"""
+        def raise_fee(value):
+            value = Web3.to_int(hexstr=value)
+            return max(value + 1, math.ceil(value * (100 + self.percent) / 100))
+        max_fee = raise_fee(op['maxFeePerGas'])
+        if self.max_fee is not None and max_fee > self.max_fee:
+            return None
+        return dict(op, maxFeePerGas=Web3.to_hex(max_fee),
+                    maxPriorityFeePerGas=Web3.to_hex(raise_fee(op['maxPriorityFeePerGas'])))
+
+# Default budget for one executeBatch op in build_batch_op()
+BATCH_CALLDATA_LIMIT = 8192
+BATCH_CALL_GAS_LIMIT = 5_000_000
 
 class AAUtils:
     """
     Library to create and submit AA UserOperations to a Bundler.
+
+    Node and Bundler requests, including those made through self.w3, share one
+    pooled HTTP session, so connections (and TLS sessions) are reused between
+    calls. 'pool_size' bounds the connections kept open per host and 'timeout'
+    applies to each request. A caller-provided 'session' is used as is.
+
+    Receipts for submitted operations are awaited through one shared
+    ReceiptWatcher, so any number of outstanding operations costs one batched
+    Bundler request per poll interval.
+
+    node_url may also be a ws(s):// URL or an IPC socket path. Node calls then
+    go through self.w3's provider, and receipts are polled once per new head
+    from an eth_subscribe("newHeads") subscription.
+
+    With a GasEstimateCache, estimate_op_gas() reuses the Bundler's estimate
+    for ops of the same shape, and sign_submit_op() re-estimates live if the
+    Bundler rejects an op which used a cached estimate.
+
+    With local_pvg, build_op() fills in preVerificationGas from the L1 fee
+    parameters (see pvg.estimate_pvg()), and cached gas estimates use it too.
+
+    Given a FeeBump, sign_submit_op() replaces an op which stays unmined, or
+    which collides with a pending op of the same nonce, with higher fees. By
+    default ops are never replaced.
+
+    bundler_url may list several Bundlers (or BUNDLER_RPC may be comma
+    separated). Requests then go to an EndpointPool, which fails over between
+    them, and estimates and receipt polls are hedged to a second Bundler when
+    the first is slower than usual.
     """
 
     def __init__(
         self,
         node_url: Optional[str] = None,
-        bundler_url: Optional[str] = None,
+        bundler_url: Optional[Union[str, Sequence[str]]] = None,
         #private_key: Optional[str] = None,
+        receipt_poll: Optional[PollSchedule] = None,
+        pool_size: int = 10,
+        timeout: float = 30.0,
+        session: Optional[requests.Session] = None,
+        gas_cache: Optional[GasEstimateCache] = None,
+        local_pvg: bool = False,
+        fee_bump: Optional[FeeBump] = None,
     ):
         # Use environment variables with fallbacks to constructor parameters
         self.node_url = node_url or os.getenv('RPC_URL', 'https://sepolia.boba.network') # FIXME 
-        self.bundler_url = bundler_url or os.getenv('BUNDLER_RPC', 'https://bundler-hc.sepolia.boba.network')
+        self.bundlers = EndpointPool(bundler_url or os.getenv('BUNDLER_RPC', 'https://bundler-hc.sepolia.boba.network'))
+        self.bundler_url = self.bundlers.urls[0]
         #self.entry_point = entry_point or os.getenv('ENTRY_POINTS', '0x0000000071727De22E5E9d8BAf0edAc6f37da032')
         #self.chain_id = chain_id or int(os.getenv('CHAIN_ID', '28882'))  # Boba Sepolia
         #self.private_key = private_key or os.getenv('CLIENT_PRIVATE_KEY')
@@ -31,13 +270,77 @@ class AAUtils:
         #if not self.private_key:
         #    raise ValueError("Private key must be provided either as parameter or via OC_PRIVKEY or CLIENT_PRIVATE_KEY environment variable")
 
+        self.session = session or http_session(pool_size)
+        self.timeout = timeout
+
         # Initialize Web3 connection
-        self.w3 = Web3(Web3.HTTPProvider(self.node_url))
+        self.w3 = Web3(make_provider(self.node_url, self.session, timeout))
         if not self.w3.is_connected:
             raise ConnectionError(f"Failed to connect to node at {self.node_url}")
+        self.fee_oracle = get_fee_oracle(self.w3)
+        self._chain_id = None
+        self._op_hasher = None
+        self.receipt_poll = receipt_poll or PollSchedule()
+        self._receipt_watcher = None
+        self.gas_cache = gas_cache
+        self.l1_fees = L1FeeModel(self.w3) if local_pvg else None
+        self.fee_bump = fee_bump
 
         self.entry_point = '0x0000000071727De22E5E9d8BAf0edAc6f37da032'
 
+    def close(self):
+        """Stops waiting for receipts and closes the pooled connections and the
+           Bundler hedging threads"""
+        if self._receipt_watcher:
+            self._receipt_watcher.close()
+        self.bundlers.close()
+        self.session.close()
+
+    def post(self, url, payload):
+        """POSTs a JSON-RPC request or batch and returns the decoded response"""
+        return self.session.post(url, json=payload, timeout=self.timeout).json()
+
+    def bundler_post(self, payload, hedge=True):
+        """POSTs to the Bundlers, failing over between them. Reads should be hedged;
+           eth_sendUserOperation should not."""
+        return self.bundlers.call(lambda url: self.post(url, payload), hedge)
+
+    @property
+    def chain_id(self):
+        """Chain ID of the node, read once"""
+        if self._chain_id is None:
+            self._chain_id = self.w3.eth.chain_id
+        return self._chain_id
+
+    @property
+    def op_hasher(self):
+        """UserOpHasher for the EntryPoint on this chain, built once"""
+        if self._op_hasher is None:
+            self._op_hasher = UserOpHasher(self.entry_point, self.chain_id)
+        return self._op_hasher
+
+    @property
+    def receipt_watcher(self):
+        """ReceiptWatcher polling at receipt_poll's initial interval, created once"""
+        if self._receipt_watcher is None:
+            self._receipt_watcher = ReceiptWatcher(self, self.receipt_poll.initial, self.receipt_poll.deadline,
+                                                   get_head_subscription(self.node_url))
+        return self._receipt_watcher
+
+    def node_batch(self, calls):
+        """Sends a list of (method, params) calls to the node as a single JSON-RPC
+           batch and returns their results in order."""
+        if calls and not is_http(self.node_url):
+            # A WebSocket or IPC node answers each call over the open connection
+            responses = [dict(self.w3.provider.make_request(method, params), id=i)
+                         for i, (method, params) in enumerate(calls)]
+            return batch_results(calls, responses)
+        return rpc_batch(calls, lambda payload: self.post(self.node_url, payload))
+
+    def bundler_batch(self, calls):
+        """As node_batch(), for read calls to the Bundlers"""
+        return rpc_batch(calls, self.bundler_post)
+
 
     def blockhash(self, num):
         return self.w3.eth.get_block(num).hash
@@ -48,163 +351,340 @@ class AAUtils:
         ret = self.w3.eth.call({'to':self.entry_point,'data':calldata})
         return Web3.to_hex(ret)
 
-    def build_op(self, sender, target, value, calldata, nonce_key=0, paymaster=None):
-        """Builds a UserOperation to call an account's Execute method, passing specified parameters."""
+    def nonce_call(self, addr, key):
+        """The eth_call request for aa_nonce(), for use in a batch"""
+        calldata = selector("getNonce(address,uint192)") + ethabi.encode(['address','uint192'],[addr, key])
+        return ("eth_call", [{'to': self.entry_point, 'data': Web3.to_hex(calldata)}, "latest"])
+
+    def build_op(self, sender, target, value, calldata, nonce_key=0, paymaster=None, nonce=None):
+        """Builds a UserOperation to call an account's Execute method, passing specified parameters.
+           The nonce is read from the EntryPoint for 'nonce_key' unless given."""
+        nonce, fees, l1_params = self.op_inputs(sender, nonce_key, nonce)
+        op = assemble_op(sender, nonce, fees, target, value, calldata, paymaster)
+        if l1_params:
+            op['preVerificationGas'] = Web3.to_hex(estimate_pvg(op, l1_params, fees.base_fee))
+        return op
+
+    def build_batch_op(self, sender, calls, nonce_key=0, paymaster=None, nonce=None,
+                       max_calldata=BATCH_CALLDATA_LIMIT, max_call_gas=BATCH_CALL_GAS_LIMIT):
+        """Builds UserOperations calling an account's executeBatch method for a list of
+           (target, value, calldata) calls. A call may carry a gas estimate as a fourth
+           element. Calls are split, in order, into as few ops as keep each op's
+           executeBatch calldata within 'max_calldata' bytes and its estimated call gas
+           within 'max_call_gas'. Returns the ops, which use consecutive nonces."""
+        nonce, fees, l1_params = self.op_inputs(sender, nonce_key, nonce)
+        nonce = Web3.to_int(hexstr=nonce)
+        ops = []
+        for i, group in enumerate(split_calls(calls, max_calldata, max_call_gas)):
+            op = account_op(sender, Web3.to_hex(nonce + i), fees, execute_batch_calldata(group), paymaster)
+            if l1_params:
+                op['preVerificationGas'] = Web3.to_hex(estimate_pvg(op, l1_params, fees.base_fee))
+            ops.append(op)
+        return ops
 
+    def op_inputs(self, sender, nonce_key=0, nonce=None):
+        """Returns the nonce (as hex), FeeData and L1 fee parameters (or None) for a new op"""
         # Note - currently Tip affects the preVerificationGas estimate due to
         # the mechanism for offsetting the L1 storage fee. If tip is too low
         # the required L2 gas can exceed the block gas limit.
-        tip = max(self.w3.eth.max_priority_fee, Web3.to_wei(0.001, 'gwei'))
-        base_fee = self.w3.eth.gas_price - self.w3.eth.max_priority_fee
-        print("tip", tip, "base_fee", base_fee)
-        assert base_fee > 0
-        fee = max(self.w3.eth.gas_price, 2 * base_fee + tip)
-        print("Using gas prices", fee, tip, "detected",
-              self.w3.eth.gas_price, self.w3.eth.max_priority_fee)
-
-        ex_calldata = selector("execute(address,uint256,bytes)") + \
-            ethabi.encode(['address', 'uint256', 'bytes'],
-                          [target, value, calldata])
-
-        op = {
-           'sender': sender,
-           'nonce': self.aa_nonce(sender,nonce_key),
-           #factory - none
-           #factoryData - none
-           'callData': Web3.to_hex(ex_calldata),
-           'callGasLimit': "0x0",
-           'verificationGasLimit': Web3.to_hex(0),
-           'preVerificationGas': "0x0",
-           'maxFeePerGas': Web3.to_hex(fee),
-           'maxPriorityFeePerGas': Web3.to_hex(tip),
-           # Dummy signature, per Alchemy AA documentation
-           'signature': '0xfffffffffffffffffffffffffffffff0000000000000000000000000000000007aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa1c'
-        }
-        if paymaster:
-          op['paymaster'] = paymaster
-          op['paymasterData'] = "0x"
-          op['paymasterVerificationGasLimit'] = "0x10002"
-          op['paymasterPostOpGasLimit'] = "0x10000"
-        print("Built userOperation", op)
-        return op
+        # The nonce, fee data and L1 fee parameters (unless already cached) and
+        # chain ID are independent, so they are read in one round trip.
+        fees = self.fee_oracle.cached()
+        fee_calls = self.fee_oracle.fee_calls() if fees is None else []
+        l1_params = self.l1_fees.cached() if self.l1_fees else None
+        l1_calls = self.l1_fees.param_calls() if self.l1_fees and l1_params is None else []
+        chain_calls = [("eth_chainId", [])] if self._chain_id is None else []
+        nonce_calls = [self.nonce_call(sender, nonce_key)] if nonce is None else []
+        results = iter(self.node_batch(nonce_calls + fee_calls + l1_calls + chain_calls))
+        if nonce_calls:
+            nonce = next(results)
+        elif not isinstance(nonce, str):
+            nonce = Web3.to_hex(nonce)
+        if fee_calls:
+            fees = self.fee_oracle.update([next(results) for _ in fee_calls])
+        if l1_calls:
+            l1_params = self.l1_fees.update([next(results) for _ in l1_calls])
+        if chain_calls:
+            self._chain_id = Web3.to_int(hexstr=next(results))
+        return nonce, fees, l1_params
 
-    def estimate_op_gas(self, op, extra_pvg=0, extra_vg=0, extra_cg=0):
+    def estimate_pvg(self, op):
+        """preVerificationGas for the op from the L1 fee model, without a Bundler call"""
+        l1_fees = self.l1_fees or L1FeeModel(self.w3)
+        return estimate_pvg(op, l1_fees.params(), self.fee_oracle.fees().base_fee)
+
+    def estimate_op_gas(self, op, extra_pvg=0, extra_vg=0, extra_cg=0, use_cache=True):
         """ Wrapper to call eth_estimateUserOperationGas() and update the op.
             Allows limits to be increased in cases where a bundler is
             providing insufficient estimates. Returns success flag + new op"""
+        if self.gas_cache and use_cache:
+            cached = self.gas_cache.get(op)
+            if cached:
+                if self.l1_fees:
+                    cached['preVerificationGas'] = Web3.to_hex(self.estimate_pvg(op))
+                return True, apply_gas_estimate(op, cached, extra_pvg, extra_vg, extra_cg)
+
         est_params = [op, self.entry_point]
 
-        response = requests.post(
-            self.bundler_url, json=request("eth_estimateUserOperationGas", params=est_params))
-        print("estimateGas response", response.json())
+        response = self.bundler_post(request("eth_estimateUserOperationGas", params=est_params))
+        print("estimateGas response", response)
 
-        if 'error' in response.json():
+        if 'error' in response:
             print("*** eth_estimateUserOperationGas failed")
             time.sleep(2)
             return False, op
 
-        est_result = response.json()['result']
+        if self.gas_cache:
+            self.gas_cache.store(op, response['result'])
+        return True, apply_gas_estimate(op, response['result'], extra_pvg, extra_vg, extra_cg)
 
-        op['preVerificationGas'] = Web3.to_hex(Web3.to_int(
-            hexstr=est_result['preVerificationGas']) + extra_pvg)
-        op['verificationGasLimit'] = Web3.to_hex(Web3.to_int(
-            hexstr=est_result['verificationGasLimit']) + extra_vg)
-        op['callGasLimit'] = Web3.to_hex(Web3.to_int(
-            hexstr=est_result['callGasLimit']) + extra_cg)
-        return True, op
-
-    def sign_v7_op(self, user_op, signer_key):
-        """Signs a UserOperation, returning a modified op containing a 'signature' field."""
-        op = dict(user_op) # Derived fields are added to 'op' prior to hashing
+    def sign_v7_op(self, user_op, signer_key, hasher=None):
+        """Signs a UserOperation, returning a modified op containing a 'signature' field.
+           An optional UserOpHasher overrides the one for this node's EntryPoint and chain."""
+        # The deploy-local script supplies the packed values prior to signature, as it bypasses the bundler.
+        # For normal UserOperations the hasher derives them from the individual fields.
+        user_op['signature'] = sign_op_hash((hasher or self.op_hasher).hash(user_op), signer_key)
+        return user_op
 
-        if 'paymaster' in op:
-            op['paymasterAndData'] = op['paymaster'] + \
-                op['paymasterVerificationGasLimit'][2:].zfill(32) + \
-                op['paymasterPostOpGasLimit'][2:].zfill(32)
-            # TODO - append paymasterData if present
+    def sign_submit_op(self, op, owner_key, poll=None):
+        """Sign and submit a UserOperation to the Bundler, then wait for its receipt.
+           The wait goes through the shared receipt_watcher unless a PollSchedule
+           is given. With a fee_bump, the op is replaced with higher fees while it
+           stays unmined. Raises a UserOpError subclass on failure."""
 
-        # The deploy-local script supplies the packed values prior to signature, as it bypasses the bundler.
-        # For normal UserOperations the fields are derived here
-        if 'accountGasLimits' not in op:
-            account_gas_limits  = ethabi.encode(['uint128'],[Web3.to_int(hexstr=op['verificationGasLimit'])])[16:32] \
-                + ethabi.encode(['uint128'],[Web3.to_int(hexstr=op['callGasLimit'])])[16:32]
-        else:
-            account_gas_limits = Web3.to_bytes(hexstr=op['accountGasLimits'])
+        op, op_hash = self.sign_send_op(op, owner_key)
+        if poll is not None:
+            return self.wait_for_receipt(op_hash, poll)
+        if self.fee_bump is None:
+            return self.watch_receipt(op_hash).result()
+        return self.wait_replacing(op, owner_key, op_hash)
 
-        if 'gasFees' not in op:
-            gas_fees = ethabi.encode(['uint128'],[Web3.to_int(hexstr=op['maxPriorityFeePerGas'])])[16:32] \
-                + ethabi.encode(['uint128'],[Web3.to_int(hexstr=op['maxFeePerGas'])])[16:32]
-        else:
-            gas_fees = Web3.to_bytes(hexstr=op['gasFees'])
-
-        if 'paymasterAndData' not in op:
-            op['paymasterAndData'] = "0x"
-
-        pack1 = ethabi.encode(['address','uint256','bytes32','bytes32','bytes32','uint256','bytes32','bytes32'], \
-              [op['sender'],
-              Web3.to_int(hexstr=op['nonce']),
-              Web3.keccak(hexstr="0x"), # initcode
-              Web3.keccak(hexstr=op['callData']),
-              account_gas_limits,
-              Web3.to_int(hexstr=op['preVerificationGas']),
-              gas_fees,
-              Web3.keccak(hexstr=op['paymasterAndData']),
-              ])
-        pack2 = ethabi.encode(['bytes32','address','uint256'], [Web3.keccak(pack1), self.entry_point, self.w3.eth.chain_id])
-        e_msg = eth_account.messages.encode_defunct(Web3.keccak(pack2))
-        signer_acct = eth_account.account.Account.from_key(signer_key)
-        sig = signer_acct.sign_message(e_msg)
-        user_op['signature'] = Web3.to_hex(sig.signature)
-        return user_op
+    def sign_send_op(self, op, owner_key):
+        """Signs and sends an op, returning (signed op, hash). If the Bundler already
+           holds an op with the same nonce and there is a fee_bump, the fees are
+           bumped until the new op replaces it. If it rejects an op which used a cached gas estimate
+           during validation, for any reason, a copy of the op is re-estimated live and sent once more."""
+        bumps = 0
+        estimated = False
+        while True:
+            signed_op = self.sign_v7_op(op, owner_key)
+            try:
+                return signed_op, self.send_op(signed_op)
+            except UserOpSubmitError as e:
+                message = str(e.args[0].get('message', ''))
+                if self.fee_bump and REPLACEMENT_ERROR.search(message) and bumps < self.fee_bump.max_bumps:
+                    op = self.fee_bump.bump(op)
+                    if op is None:
+                        raise
+                    bumps += 1
+                    print("*** Replacing pending operation, maxFeePerGas", op['maxFeePerGas'])
+                elif not estimated and is_validation_error(e.args[0]) and self.gas_cache and \
+                        self.gas_cache.invalidate(op):
+                    print("*** Retrying with a live gas estimate")
+                    estimated = True
+                    success, op = self.estimate_op_gas(dict(op, signature=DUMMY_SIGNATURE), use_cache=False)
+                    if not success:
+                        raise
+                else:
+                    raise
 
-    def sign_submit_op(self, op, owner_key):
-        """Sign and submit a UserOperation to the Bundler"""
+    def wait_replacing(self, op, owner_key, op_hash):
+        """Waits for a sent op. Each time it stays unmined for fee_bump.interval
+           seconds it is replaced with bumped fees, up to fee_bump.max_bumps times.
+           Returns the receipt of whichever version is included."""
+        futures = [self.watch_receipt(op_hash)]
+        bumps = 0
+        try:
+            while True:
+                timeout = self.fee_bump.interval if bumps < self.fee_bump.max_bumps else None
+                done, _ = wait(futures, timeout, FIRST_COMPLETED)
+                for future in done:
+                    futures.remove(future)
+                    # A replaced version can time out (or be cancelled by close())
+                    # while its successor is pending
+                    if futures and (future.cancelled() or isinstance(future.exception(), UserOpTimeoutError)):
+                        continue
+                    return future.result()
+                if done:
+                    continue
+                bumped = self.fee_bump.bump(op)
+                if bumped is None:
+                    bumps = self.fee_bump.max_bumps
+                    continue
+                bumps += 1
+                print("*** Operation not mined, replacing with maxFeePerGas", bumped['maxFeePerGas'])
+                try:
+                    op_hash = self.send_op(self.sign_v7_op(bumped, owner_key))
+                except UserOpSubmitError:
+                    # Most likely the pending version was just included
+                    bumps = self.fee_bump.max_bumps
+                    continue
+                op = bumped
+                futures.append(self.watch_receipt(op_hash))
+        finally:
+            for future in futures:
+                future.cancel()
 
-        signed_op = self.sign_v7_op(op, owner_key)
+    def watch_receipt(self, op_hash):
+        """Returns a concurrent.futures.Future for the operation's receipt"""
+        return self.receipt_watcher.watch(op_hash)
 
+    def send_op(self, signed_op):
+        """Submits a signed UserOperation and returns its hash, without waiting for a receipt.
+           Raises UserOpSubmitError if the Bundler rejects it."""
         while True:
-            response = requests.post(self.bundler_url, json=request(
-                "eth_sendUserOperation", params=[signed_op, self.entry_point]))
-            if 'result' in response.json():
+            response = self.bundler_post(request(
+                "eth_sendUserOperation", params=[signed_op, self.entry_point]), hedge=False)
+            if 'result' in response:
+                break
+            if not is_unsynced_node_error(response['error']['message']):
                 break
-            if 'error' in response.json():
-                emsg = response.json()['error']['message']
-                if emsg == "replacement underpriced":
-                    print("*** Retrying with increased maxPriorityFeePerGas")
-                    op['maxPriorityFeePerGas'] += 1
-                    time.sleep(5)
-                # Workaround for sending debug_traceCall to unsynced node
-                if not re.search(r'message: block 0x.{64} not found', emsg):
-                    break
             print("*** Retrying eth_sendUserOperation")
             time.sleep(5)
 
-        print("sendOperation response", response.json())
-        if 'error' in response.json():
+        print("sendOperation response", response)
+        if 'error' in response:
             print("*** eth_sendUserOperation failed")
-            sys.exit(1)
+            raise UserOpSubmitError(response['error'])
+        return response['result']
 
-        op_hash = {}
-        op_hash['hash'] = response.json()['result']
-        timeout = True
-        for _ in range(500):
+    def wait_for_receipt(self, op_hash, poll=None):
+        """Polls the Bundler until the operation is included, following 'poll'
+           (default: this instance's receipt_poll). Raises UserOpTimeoutError at
+           the deadline and UserOpFailedError if the operation reverted."""
+        for delay in (poll or self.receipt_poll).delays():
             print("Waiting for receipt...")
-            time.sleep(10)
-            op_receipt = requests.post(self.bundler_url, json=request(
-                "eth_getUserOperationReceipt", params=op_hash))
-            op_receipt = op_receipt.json()['result']
+            time.sleep(delay)
+            op_receipt = self.bundler_post(request(
+                "eth_getUserOperationReceipt", params={'hash': op_hash})).get('result')
             if op_receipt is not None:
-                # print("op_receipt", op_receipt)
-                assert op_receipt['receipt']['status'] == "0x1"
                 print("operation success", op_receipt['success'],
                       "txHash=", op_receipt['receipt']['transactionHash'])
-                timeout = False
-                assert op_receipt['success']
-                break
-        if timeout:
-            print("*** Previous operation timed out")
-            sys.exit(1)
-        return op_receipt
+                if op_receipt['receipt']['status'] != "0x1" or not op_receipt['success']:
+                    raise UserOpFailedError(op_receipt)
+                return op_receipt
+        print("*** Previous operation timed out")
+        raise UserOpTimeoutError(op_hash)
+
+# Dummy signature, per Alchemy AA documentation
+DUMMY_SIGNATURE = '0xfffffffffffffffffffffffffffffff0000000000000000000000000000000007aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa1c' # pylint: disable=line-too-long
+
+# Helpers shared by AAUtils and AsyncAAUtils
+
+def batch_payload(calls):
+    """JSON-RPC batch for a list of (method, params) calls, with the list index as id"""
+    return [request(method, params=params, id=i) for i, (method, params) in enumerate(calls)]
+
+def rpc_batch(calls, post):
+    """Sends (method, params) calls as one JSON-RPC batch through post(payload) and
+       returns their results in order. Falls back to one request per call if
+       batches are not accepted."""
+    if not calls:
+        return []
+    payload = batch_payload(calls)
+    responses = post(payload)
+    if not isinstance(responses, list):
+        responses = [post(p) for p in payload]
+    return batch_results(calls, responses)
+
+def batch_results(calls, responses):
+    """Results of a batch in call order. Raises RuntimeError if any call failed."""
+    by_id = {r.get('id'): r for r in responses}
+    results = []
+    for i, (method, _) in enumerate(calls):
+        resp = by_id.get(i, {'error': "no response"})
+        if 'error' in resp:
+            raise RuntimeError(f"{method} failed: {resp['error']}")
+        results.append(resp['result'])
+    return results
+
+def execute_calldata(target, value, calldata):
+    return selector("execute(address,uint256,bytes)") + \
+        ethabi.encode(['address', 'uint256', 'bytes'], [target, value, calldata])
+
+def execute_batch_calldata(calls):
+    """executeBatch(address[],uint256[],bytes[]) calldata for (target, value, calldata[, gas])
+       calls. The value array is left empty if no call sends value."""
+    values = [call[1] for call in calls]
+    return selector("executeBatch(address[],uint256[],bytes[])") + \
+        ethabi.encode(['address[]', 'uint256[]', 'bytes[]'],
+                      [[call[0] for call in calls], values if any(values) else [], [call[2] for call in calls]])
+
+def split_calls(calls, max_calldata=BATCH_CALLDATA_LIMIT, max_call_gas=BATCH_CALL_GAS_LIMIT):
+    """Splits calls, in order, into groups within the calldata and gas budgets of
+       build_batch_op(). A call over budget on its own gets a group of its own."""
+    # executeBatch selector, then offset and length words for its three arrays
+    base_size = 4 + 6 * 32
+    groups = []
+    group, size, gas = [], base_size, 0
+    for call in calls:
+        # Address, value and offset words, then the length-prefixed calldata
+        call_size = 4 * 32 + 32 * math.ceil(len(call[2]) / 32)
+        call_gas = call[3] if len(call) > 3 else 0
+        if group and (size + call_size > max_calldata or gas + call_gas > max_call_gas):
+            groups.append(group)
+            group, size, gas = [], base_size, 0
+        group.append(call)
+        size += call_size
+        gas += call_gas
+    if group:
+        groups.append(group)
+    return groups
+
+def assemble_op(sender, nonce, fees, target, value, calldata, paymaster=None):
+    """Builds the UserOperation for build_op() from its nonce and FeeData"""
+    return account_op(sender, nonce, fees, execute_calldata(target, value, calldata), paymaster)
+
+def account_op(sender, nonce, fees, account_calldata, paymaster=None):
+    """Builds a UserOperation with the given account calldata from its nonce and FeeData"""
+    tip = max(fees.tip, Web3.to_wei(0.001, 'gwei'))
+    base_fee = fees.base_fee
+    print("tip", tip, "base_fee", base_fee)
+    assert base_fee > 0
+    fee = max(fees.gas_price, 2 * base_fee + tip)
+    print("Using gas prices", fee, tip, "detected",
+          fees.gas_price, fees.tip)
+
+    op = {
+       'sender': sender,
+       'nonce': nonce,
+       #factory - none
+       #factoryData - none
+       'callData': Web3.to_hex(account_calldata),
+       'callGasLimit': "0x0",
+       'verificationGasLimit': Web3.to_hex(0),
+       'preVerificationGas': "0x0",
+       'maxFeePerGas': Web3.to_hex(fee),
+       'maxPriorityFeePerGas': Web3.to_hex(tip),
+       'signature': DUMMY_SIGNATURE
+    }
+    if paymaster:
+      op['paymaster'] = paymaster
+      op['paymasterData'] = "0x"
+      op['paymasterVerificationGasLimit'] = "0x10002"
+      op['paymasterPostOpGasLimit'] = "0x10000"
+    print("Built userOperation", op)
+    return op
+
+def apply_gas_estimate(op, est_result, extra_pvg=0, extra_vg=0, extra_cg=0):
+    """Copies an eth_estimateUserOperationGas result into the op, plus any extra gas"""
+    op['preVerificationGas'] = Web3.to_hex(Web3.to_int(
+        hexstr=est_result['preVerificationGas']) + extra_pvg)
+    op['verificationGasLimit'] = Web3.to_hex(Web3.to_int(
+        hexstr=est_result['verificationGasLimit']) + extra_vg)
+    op['callGasLimit'] = Web3.to_hex(Web3.to_int(
+        hexstr=est_result['callGasLimit']) + extra_cg)
+    return op
+
+def sign_op_hash(op_hash, signer_key):
+    """Signature over a UserOperation hash, as a hex string"""
+    e_msg = eth_account.messages.encode_defunct(op_hash)
+    signer_acct = eth_account.account.Account.from_key(signer_key)
+    return Web3.to_hex(signer_acct.sign_message(e_msg).signature)
+
+def is_unsynced_node_error(emsg):
+    """Workaround for sending debug_traceCall to unsynced node"""
+    return re.search(r'message: block 0x.{64} not found', emsg) is not None
 
 # This is duplicated in HybridComputeSDK as "selector_hex"
 def selector(name):
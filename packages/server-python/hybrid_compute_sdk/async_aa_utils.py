@@ -0,0 +1,199 @@
+import asyncio
+import os
+from typing import Optional
+import aiohttp
+from web3 import AsyncWeb3, Web3
+from eth_abi import abi as ethabi
+from jsonrpcclient import request
+from hybrid_compute_sdk.aa_utils import AAUtils, PollSchedule, UserOpSubmitError, UserOpTimeoutError, \
+    UserOpFailedError, selector, batch_payload, batch_results, assemble_op, apply_gas_estimate, \
+    sign_op_hash, is_unsynced_node_error
+from hybrid_compute_sdk.fee_oracle import get_fee_oracle
+from hybrid_compute_sdk.userop_hash import UserOpHasher
+
+class AsyncAAUtils:
+    """
+    asyncio version of AAUtils. Node and Bundler requests share one aiohttp
+    connection pool, so a single event loop can keep many UserOperations in
+    flight, e.g. with asyncio.gather(). Use as an async context manager, or
+    call close() when done.
+
+    Only the core build/estimate/sign/send path is ported. Unlike AAUtils it
+    talks to a single HTTP node and a single Bundler URL, without EndpointPool
+    failover or hedging, WebSocket/IPC providers, the gas estimate cache,
+    local preVerificationGas estimates or fee bumping of stuck ops.
+    """
+
+    def __init__(
+        self,
+        node_url: Optional[str] = None,
+        bundler_url: Optional[str] = None,
+        receipt_poll: Optional[PollSchedule] = None,
+        max_connections: int = 100,
+    ):
+        self.node_url = node_url or os.getenv('RPC_URL', 'https://sepolia.boba.network')
+        self.bundler_url = bundler_url or os.getenv('BUNDLER_RPC', 'https://bundler-hc.sepolia.boba.network')
+        self.w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(self.node_url))
+        self.fee_oracle = get_fee_oracle(self.w3)
+        self.receipt_poll = receipt_poll or PollSchedule()
+        self.max_connections = max_connections
+        self.session = None
+        self._chain_id = None
+        self._op_hasher = None
+        self.fee_refresh = None  # Future for the fee refresh in flight, if any
+
+        self.entry_point = '0x0000000071727De22E5E9d8BAf0edAc6f37da032'
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """Closes the connection pool"""
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def get_session(self):
+        """The shared aiohttp session, which AsyncWeb3 also uses for the node"""
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=30))
+            await self.w3.provider.cache_async_session(self.session)
+        return self.session
+
+    async def rpc(self, url, payload):
+        """POSTs a JSON-RPC request or batch and returns the decoded response"""
+        session = await self.get_session()
+        async with session.post(url, json=payload) as resp:
+            return await resp.json(content_type=None)
+
+    async def chain_id(self):
+        """Chain ID of the node, read once"""
+        if self._chain_id is None:
+            await self.get_session()
+            self._chain_id = await self.w3.eth.chain_id
+        return self._chain_id
+
+    async def op_hasher(self):
+        """UserOpHasher for the EntryPoint on this chain, built once"""
+        if self._op_hasher is None:
+            self._op_hasher = UserOpHasher(self.entry_point, await self.chain_id())
+        return self._op_hasher
+
+    async def node_batch(self, calls):
+        """Sends a list of (method, params) calls to the node as a single JSON-RPC
+           batch and returns their results in order"""
+        if not calls:
+            return []
+        payload = batch_payload(calls)
+        responses = await self.rpc(self.node_url, payload)
+        if not isinstance(responses, list):
+            responses = await asyncio.gather(*(self.rpc(self.node_url, p) for p in payload))
+        return batch_results(calls, responses)
+
+    async def aa_nonce(self, addr, key):
+        """Returns the keyed AA nonce for an address"""
+        calldata = selector("getNonce(address,uint192)") + ethabi.encode(['address','uint192'],[addr, key])
+        await self.get_session()
+        ret = await self.w3.eth.call({'to': self.entry_point, 'data': calldata})
+        return Web3.to_hex(ret)
+
+    nonce_call = AAUtils.nonce_call
+
+    async def build_op(self, sender, target, value, calldata, nonce_key=0, paymaster=None):
+        """Builds a UserOperation to call an account's Execute method, passing specified parameters."""
+        # As in AAUtils, the independent reads share one round trip. When the
+        # fees are stale, only one build_op at a time adds the fee reads to its
+        # batch; concurrent calls wait for that refresh instead.
+        fees = self.fee_oracle.cached()
+        fee_calls = []
+        refresh = None
+        if fees is None:
+            refresh = self.fee_refresh
+            if refresh is None:
+                fee_calls = self.fee_oracle.fee_calls()
+                self.fee_refresh = asyncio.get_running_loop().create_future()
+        chain_calls = [("eth_chainId", [])] if self._chain_id is None else []
+        try:
+            results = await self.node_batch([self.nonce_call(sender, nonce_key)] + fee_calls + chain_calls)
+            if fee_calls:
+                fees = self.fee_oracle.update(results[1:1 + len(fee_calls)])
+        except BaseException as e:
+            if fee_calls:
+                self.end_fee_refresh(exc=e)
+            raise
+        if fee_calls:
+            self.end_fee_refresh(fees)
+        elif refresh is not None:
+            fees = await asyncio.shield(refresh)
+        if chain_calls:
+            self._chain_id = Web3.to_int(hexstr=results[-1])
+
+        return assemble_op(sender, results[0], fees, target, value, calldata, paymaster)
+
+    def end_fee_refresh(self, fees=None, exc=None):
+        """Completes the fee refresh in flight, passing its outcome to waiting build_op calls"""
+        (refresh, self.fee_refresh) = (self.fee_refresh, None)
+        if exc is None:
+            refresh.set_result(fees)
+        else:
+            refresh.set_exception(exc if isinstance(exc, Exception) else UserOpSubmitError("Fee refresh cancelled"))
+            refresh.exception()  # Retrieved here, as there may be no waiters to do so
+
+    async def estimate_op_gas(self, op, extra_pvg=0, extra_vg=0, extra_cg=0):
+        """ Wrapper to call eth_estimateUserOperationGas() and update the op.
+            Returns success flag + new op"""
+        response = await self.rpc(self.bundler_url, request(
+            "eth_estimateUserOperationGas", params=[op, self.entry_point]))
+        print("estimateGas response", response)
+
+        if 'error' in response:
+            print("*** eth_estimateUserOperationGas failed")
+            return False, op
+
+        return True, apply_gas_estimate(op, response['result'], extra_pvg, extra_vg, extra_cg)
+
+    async def sign_v7_op(self, user_op, signer_key, hasher=None):
+        """Signs a UserOperation, returning a modified op containing a 'signature' field."""
+        user_op['signature'] = sign_op_hash((hasher or await self.op_hasher()).hash(user_op), signer_key)
+        return user_op
+
+    async def send_op(self, signed_op):
+        """Submits a signed UserOperation and returns its hash, without waiting for a receipt"""
+        while True:
+            response = await self.rpc(self.bundler_url, request(
+                "eth_sendUserOperation", params=[signed_op, self.entry_point]))
+            if 'result' in response:
+                print("sendOperation response", response)
+                return response['result']
+            if not is_unsynced_node_error(response['error']['message']):
+                print("*** eth_sendUserOperation failed", response)
+                raise UserOpSubmitError(response['error'])
+            print("*** Retrying eth_sendUserOperation")
+            await asyncio.sleep(5)
+
+    async def sign_submit_op(self, op, owner_key, poll=None):
+        """Sign and submit a UserOperation to the Bundler, then wait for its receipt.
+           Raises a UserOpError subclass on failure."""
+        signed_op = await self.sign_v7_op(op, owner_key)
+        return await self.wait_for_receipt(await self.send_op(signed_op), poll)
+
+    async def wait_for_receipt(self, op_hash, poll=None):
+        """Polls the Bundler until the operation is included, as in AAUtils.wait_for_receipt()"""
+        for delay in (poll or self.receipt_poll).delays():
+            await asyncio.sleep(delay)
+            response = await self.rpc(self.bundler_url, request(
+                "eth_getUserOperationReceipt", params={'hash': op_hash}))
+            op_receipt = response.get('result')
+            if op_receipt is not None:
+                print("operation success", op_receipt['success'],
+                      "txHash=", op_receipt['receipt']['transactionHash'])
+                if op_receipt['receipt']['status'] != "0x1" or not op_receipt['success']:
+                    raise UserOpFailedError(op_receipt)
+                return op_receipt
+        print("*** Previous operation timed out")
+        raise UserOpTimeoutError(op_hash)
@@ -9,7 +9,10 @@ import time
 from web3 import Web3
 from eth_abi import abi as ethabi
 
-from hybrid_compute_sdk.aa_utils import AAUtils, selector
+from hybrid_compute_sdk.aa_utils import AAUtils, selector, DUMMY_SIGNATURE
+from hybrid_compute_sdk.fee_oracle import get_fee_oracle
+from hybrid_compute_sdk.providers import make_provider, wait_for_receipt
+from hybrid_compute_sdk.userop_hash import UserOpHasher, packed_op
 
 ETH_MIN = 50
 BOBA_MIN = 500
@@ -20,6 +23,7 @@ class Deploy:
         self.env_vars = {}
         self.boba_token = None
         self.entry_point = None
+        self.op_hasher = None
         self.contracts_path = contracts_path
 
         # Get the local IP (not localhost) of this machine
@@ -30,15 +34,15 @@ class Deploy:
 
         self.load_config()
 
-        self.l1 = Web3(Web3.HTTPProvider(self.l1_url))
+        self.l1 = Web3(make_provider(self.l1_url))
         assert self.l1.is_connected
         #self.l1.middleware_onion.inject(geth_poa_middleware, layer=0)
 
         # Special case, we want some functions from AAUtils but this script
         # runs before the Bundler is launched.
-        self.aa = AAUtils(node_url=self.eth_url, bundler_url="deployer")
+        self.aa = AAUtils(node_url=self.eth_url, bundler_url="deployer", local_pvg=True)
 
-        self.w3 = Web3(Web3.HTTPProvider(self.eth_url))
+        self.w3 = Web3(make_provider(self.eth_url))
         assert self.w3.is_connected
 
         self.l1_util = EthUtils(self.l1)
@@ -177,13 +181,14 @@ class Deploy:
     def submit_as_v7_op(self, addr, calldata, signer_key):
         """
         Wrapper to build and submit a UserOperation directly to the EntryPoint. We don't
-        have a Bundler to run gas estimation so the values are hard-coded. It might be
-        necessary to change these values e.g. if simulating different L1 prices on the
-        local devnet
+        have a Bundler to run gas estimation so the gas limits are hard-coded. Fees and
+        preVerificationGas come from the node's current fees and L1 fee parameters.
         """
 
         gas_limits = "0x00000000000000000000000000016ed900000000000000000000000000053652"
-        gas_fees   = "0x00000000000000000000000039d106800000000000000000000000025b9c274c"
+        fees = get_fee_oracle(self.w3).fees()
+        tip = max(fees.tip, Web3.to_wei(0.001, 'gwei'))
+        max_fee = max(fees.gas_price, 2 * fees.base_fee + tip)
 
         op = {
             'sender':addr,
@@ -191,26 +196,20 @@ class Deploy:
             'initCode':"0x",
             'callData': Web3.to_hex(calldata),
             'accountGasLimits': gas_limits,
-            'preVerificationGas': "0xF0000",
-            'gasFees': gas_fees,
+            'preVerificationGas': "0x0",
+            'gasFees': Web3.to_hex(tip.to_bytes(16, 'big') + max_fee.to_bytes(16, 'big')),
             'paymasterAndData':"0x",
-            'signature': '0xfffffffffffffffffffffffffffffff0000000000000000000000000000000007aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa1c' # pylint: disable=line-too-long
+            'signature': DUMMY_SIGNATURE,
         }
+        op['preVerificationGas'] = Web3.to_hex(self.aa.estimate_pvg(op))
 
-        op = self.aa.sign_v7_op(op, signer_key)
+        # Hashed for the EntryPoint deployed here, which may be overridden by ENTRY_POINTS
+        if self.op_hasher is None or self.op_hasher.entry_point != self.entry_point.address:
+            self.op_hasher = UserOpHasher(self.entry_point.address, self.l2_util.chain_id)
+        op = self.aa.sign_v7_op(op, signer_key, hasher=self.op_hasher)
 
         # Because the bundler is not running yet we must call the EntryPoint directly.
-        ho = self.entry_point.functions.handleOps([(
-            op['sender'],
-            Web3.to_int(hexstr=op['nonce']),
-            op['initCode'],
-            op['callData'],
-            Web3.to_bytes(hexstr=op['accountGasLimits']),
-            Web3.to_int(hexstr=op['preVerificationGas']),
-            Web3.to_bytes(hexstr=op['gasFees']),
-            op['paymasterAndData'],
-            op['signature'],
-        )], self.deploy_addr).build_transaction({
+        ho = self.entry_point.functions.handleOps([packed_op(op)], self.deploy_addr).build_transaction({
             'from': self.deploy_addr,
             'value': 0,
         })
@@ -258,8 +257,9 @@ class Deploy:
                 'to': addr,
                 'value': Web3.to_wei(1.001, 'ether')
             }
-            if self.w3.eth.gas_price > 1000000:
-                tx['gasPrice'] = self.w3.eth.gas_price
+            gas_price = get_fee_oracle(self.w3).gas_price()
+            if gas_price > 1000000:
+                tx['gasPrice'] = gas_price
             else:
                 tx['gasPrice'] = Web3.to_wei(1, 'gwei')
             self.l2_util.sign_and_submit(tx, self.deploy_key)
@@ -467,11 +467,11 @@ class EthUtils:
         if 'gas' not in tx or tx['gas'] < est:
             tx['gas'] = est
         if 'gasPrice' not in tx and 'maxFeePerGas' not in tx:
-            tx['gasPrice'] = self.w3.eth.gas_price
+            tx['gasPrice'] = get_fee_oracle(self.w3).gas_price()
 
         signed_txn = self.w3.eth.account.sign_transaction(tx, key)
-        ret = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-        rcpt = self.w3.eth.wait_for_transaction_receipt(ret)
+        ret = self.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
+        rcpt = wait_for_receipt(self.w3, ret)
         if rcpt.status != 1:
             print("Transaction failed, txhash =", Web3.to_hex(ret))
         assert rcpt.status == 1
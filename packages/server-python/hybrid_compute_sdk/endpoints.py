@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, List, Optional, Sequence, TypeVar, Union
+
+T = TypeVar('T')
+
+def parse_urls(urls: Union[str, Sequence[str]]) -> List[str]:
+    """A list of endpoint URLs from a list or a comma-separated string"""
+    if isinstance(urls, str):
+        urls = urls.split(',')
+    return [u.strip() for u in urls if u.strip()]
+
+class Unavailable(Exception):
+    """An endpoint answered but cannot serve this request, e.g. a node which has
+       not seen a block yet. Another endpoint is tried, but the endpoint's health
+       and latency record is left unchanged."""
+
+class Endpoint:
+    """Latency and health record for one endpoint"""
+
+    def __init__(self, url: str, window: int):
+        self.url = url
+        self.latencies = deque(maxlen=window)
+        self.failures = 0
+        self.down_until = 0.0
+
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def typical(self) -> Optional[float]:
+        """Median latency of recent successful calls"""
+        if not self.latencies:
+            return None
+        return sorted(self.latencies)[len(self.latencies) // 2]
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+class EndpointPool:
+    """
+    A set of interchangeable JSON-RPC endpoints. call() sends a request to one
+    endpoint, picked at random weighted towards lower latency, and moves on to
+    the next on failure. With hedge=True (for reads), a second endpoint is also
+    tried if the first has not answered within its recent p95 latency, and the
+    first answer wins. An endpoint failing 'failure_threshold' times in a row is
+    skipped for 'cooldown' seconds.
+    """
+
+    def __init__(self, urls: Union[str, Sequence[str]], window: int = 100, failure_threshold: int = 3,
+                 cooldown: float = 30.0, default_hedge_delay: float = 0.5, min_hedge_delay: float = 0.02):
+        self.endpoints = [Endpoint(url, window) for url in parse_urls(urls)]
+        if not self.endpoints:
+            raise ValueError("No endpoint URLs given")
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=4 * len(self.endpoints), thread_name_prefix="endpoint")
+
+    @property
+    def urls(self) -> List[str]:
+        return [ep.url for ep in self.endpoints]
+
+    def ranked(self, candidates: Optional[List[Endpoint]] = None) -> List[Endpoint]:
+        """Endpoints in the order to try them: healthy ones first, the first drawn
+           with probability inversely proportional to its latency"""
+        candidates = self.endpoints if candidates is None else candidates
+        with self.lock:
+            healthy = [ep for ep in candidates if ep.healthy()]
+            down = [ep for ep in candidates if not ep.healthy()]
+            # Untried endpoints get the best observed latency, so they are tried soon
+            known = [ep.typical() for ep in healthy if ep.typical() is not None]
+            best = min(known) if known else 1.0
+            latency = {ep.url: ep.typical() or best for ep in healthy}
+        if len(healthy) > 1:
+            first = random.choices(healthy, weights=[1 / max(latency[ep.url], 1e-3) for ep in healthy])[0]
+            healthy = [first] + sorted((ep for ep in healthy if ep is not first), key=lambda ep: latency[ep.url])
+        return healthy + sorted(down, key=lambda ep: ep.down_until)
+
+    def hedge_delay(self, ep: Endpoint) -> float:
+        with self.lock:
+            p95 = ep.p95()
+        return self.default_hedge_delay if p95 is None else max(p95, self.min_hedge_delay)
+
+    def record(self, ep: Endpoint, latency: Optional[float]) -> None:
+        """Records a successful call's latency, or a failure if latency is None"""
+        with self.lock:
+            if latency is not None:
+                ep.latencies.append(latency)
+                ep.failures = 0
+                ep.down_until = 0.0
+            else:
+                ep.failures += 1
+                if ep.failures >= self.failure_threshold:
+                    ep.down_until = time.monotonic() + self.cooldown
+
+    def close(self) -> None:
+        """Stops the hedging threads. The pool can not be used afterwards."""
+        self.executor.shutdown(wait=False)
+
+    def _timed(self, ep: Endpoint, fn: Callable[[str], T]) -> T:
+        start = time.monotonic()
+        try:
+            result = fn(ep.url)
+        except Unavailable:
+            raise
+        except Exception:
+            self.record(ep, None)
+            raise
+        self.record(ep, time.monotonic() - start)
+        return result
+
+    def call(self, fn: Callable[[str], T], hedge: bool = False, candidates: Optional[List[Endpoint]] = None) -> T:
+        """Returns fn(url) from the first endpoint to succeed. Raises the last
+           error if every endpoint fails."""
+        order = self.ranked(candidates)
+        if not hedge or len(order) == 1:
+            for ep in order[:-1]:
+                try:
+                    return self._timed(ep, fn)
+                except Exception as e: # pylint: disable=broad-exception-caught
+                    print("*** Endpoint request failed:", e)
+            return self._timed(order[-1], fn)
+
+        pending = set()
+        errors = []
+        tried = 0
+        while True:
+            if not pending and tried < len(order):
+                pending.add(self.executor.submit(self._timed, order[tried], fn))
+                tried += 1
+            if not pending:
+                raise errors[-1]
+            timeout = self.hedge_delay(order[tried - 1]) if tried < len(order) else None
+            done, pending = wait(pending, timeout, FIRST_COMPLETED)
+            if not done:
+                print("Hedging request to", order[tried].url)
+                pending.add(self.executor.submit(self._timed, order[tried], fn))
+                tried += 1
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e: # pylint: disable=broad-exception-caught
+                    print("*** Endpoint request failed:", e)
+                    errors.append(e)
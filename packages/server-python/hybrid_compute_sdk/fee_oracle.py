@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+from web3 import Web3
+from hybrid_compute_sdk.providers import provider_endpoint, get_head_subscription, batch_request
+
+class FeeData(NamedTuple):
+    """Fee snapshot, where gas_price is the next block's base fee plus the tip"""
+    block: Optional[int]
+    gas_price: int
+    tip: int
+
+    @property
+    def base_fee(self) -> int:
+        return self.gas_price - self.tip
+
+class FeeOracle:
+    """
+    Caches fee data for one node so that every op or transaction built within
+    a block shares a single fee lookup.
+
+    By default the node's eth_gasPrice and eth_maxPriorityFeePerGas suggestions
+    are used, with base_fee derived as their difference. They are read in one
+    JSON-RPC batch together with eth_blockNumber, so each refresh is a single
+    round trip and the snapshot is tagged with the block it was taken at. If
+    'percentile' is set, a single eth_feeHistory call supplies the next block's
+    base fee and that percentile of the latest block's tips instead.
+
+    The snapshot is reused until observe_block() reports a newer block than the
+    one it was taken at, or for at most 'max_age' seconds (about one block) on
+    nodes without head notifications.
+
+    Oracles for AsyncWeb3 are never refreshed by fees(); their users batch
+    fee_calls() with their own requests and pass the results to update().
+    """
+
+    def __init__(self, w3: Web3, percentile: Optional[float] = None, max_age: float = 2.0):
+        self.w3 = w3
+        self.percentile = percentile
+        self.max_age = max_age
+        self.is_async = getattr(w3.provider, 'is_async', False) is True
+        self.lock = threading.Lock()
+        self.data = None
+        self.expires = 0.0
+        self.latest_block = None
+
+    def fees(self) -> FeeData:
+        """Returns the cached fee data, refreshing it once it is stale"""
+        with self.lock:
+            if self.stale():
+                self.store(self.fetch())
+            return self.data
+
+    def cached(self) -> Optional[FeeData]:
+        """Returns the cached fee data, or None if it needs a refresh"""
+        with self.lock:
+            return None if self.stale() else self.data
+
+    def stale(self) -> bool:
+        return self.data is None or time.monotonic() >= self.expires or \
+            (self.latest_block is not None and
+             (self.data.block is None or self.latest_block > self.data.block))
+
+    def store(self, data: FeeData) -> None:
+        self.data = data
+        self.expires = time.monotonic() + self.max_age
+        if data.block is not None:
+            self.observe_block(data.block)
+
+    def gas_price(self) -> int:
+        """Legacy gas price, for transactions which don't use EIP-1559 fields"""
+        return self.fees().gas_price
+
+    def observe_block(self, number: int) -> None:
+        """Tells the oracle about a new block, so the next lookup refreshes"""
+        if self.latest_block is None or number > self.latest_block:
+            self.latest_block = number
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.data = None
+
+    def fetch(self) -> FeeData:
+        """Reads fee data from the node, batched if the provider supports it"""
+        if self.is_async:
+            raise TypeError("An AsyncWeb3 FeeOracle is refreshed through fee_calls() and update()")
+        responses = batch_request(self.w3.provider, self.fee_calls())
+        for response in responses:
+            if 'error' in response:
+                raise ValueError(f"Fee lookup failed: {response['error']}")
+        return self.parse([r['result'] for r in responses])
+
+    def fee_calls(self):
+        """The (method, params) calls for a refresh, for callers which batch
+           them with other requests. Pass the raw results to update()."""
+        if self.percentile is not None:
+            return [("eth_feeHistory", ["0x1", "latest", [self.percentile]])]
+        return [("eth_blockNumber", []), ("eth_gasPrice", []), ("eth_maxPriorityFeePerGas", [])]
+
+    def parse(self, results) -> FeeData:
+        """FeeData from the raw JSON-RPC results of fee_calls()"""
+        if self.percentile is not None:
+            hist = results[0]
+            base_fee = int(hist['baseFeePerGas'][-1], 16)
+            tip = int(hist['reward'][0][0], 16)
+            return FeeData(int(hist['oldestBlock'], 16), base_fee + tip, tip)
+        return FeeData(int(results[0], 16), int(results[1], 16), int(results[2], 16))
+
+    def update(self, results) -> FeeData:
+        """Stores fee data from the raw JSON-RPC results of fee_calls()"""
+        data = self.parse(results)
+        with self.lock:
+            self.store(data)
+        return data
+
+oracles = {}
+oracles_lock = threading.Lock()
+
+def get_fee_oracle(w3: Web3) -> FeeOracle:
+    """Returns the FeeOracle shared by all users of the same node URL. Setting
+       FEE_HISTORY_PERCENTILE selects eth_feeHistory based fees. AsyncWeb3 users
+       get a separate oracle, refreshed only through fee_calls() and update().
+       On WebSocket and IPC nodes the oracle is told of each new head."""
+    endpoint = provider_endpoint(w3)
+    key = (endpoint or id(w3), getattr(w3.provider, 'is_async', False))
+    with oracles_lock:
+        if key not in oracles:
+            pct = os.getenv('FEE_HISTORY_PERCENTILE')
+            oracles[key] = FeeOracle(w3, percentile=float(pct) if pct else None)
+            heads = get_head_subscription(endpoint)
+            if heads:
+                heads.add_listener(oracles[key].observe_block)
+        return oracles[key]
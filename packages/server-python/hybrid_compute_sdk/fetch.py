@@ -0,0 +1,232 @@
+import asyncio
+import concurrent.futures
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from urllib.parse import urlsplit
+import aiohttp
+
+class FetchError(Exception):
+    """An external data source could not be read"""
+
+class CircuitOpenError(FetchError):
+    """Raised without contacting the upstream while its circuit breaker is open"""
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures. While open, requests
+    fail immediately; after reset_timeout seconds a single probe request is
+    let through, and its result closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self.probing or time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+class Fetcher:
+    """
+    Shared client for handlers which read JSON from external HTTP sources.
+
+    Requests run on a private event loop thread with one pooled aiohttp
+    session. Responses are cached per URL for 'ttl' seconds and then
+    revalidated with If-None-Match when the upstream sent an ETag. Concurrent
+    requests for the same URL share one upstream fetch. Failed requests are
+    retried with jittered exponential backoff, and a circuit breaker per host
+    makes calls fail fast while an upstream is down.
+
+    Handlers call get_json(), which blocks for at most 'deadline' seconds.
+    Async code can await fetch_json() from any event loop.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 30.0,
+        timeout: float = 2.0,
+        retries: int = 2,
+        backoff: float = 0.1,
+        deadline: float = 5.0,
+        max_entries: int = 1024,
+        max_connections: int = 32,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = deadline
+        self.max_entries = max_entries
+        self.max_connections = max_connections
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        # Everything below is only touched from the loop thread
+        self.cache = OrderedDict()  # url -> (expires, etag, value)
+        self.inflight = {}
+        self.breakers = {}
+        self.session = None
+
+        self.loop = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name="hc-fetch", daemon=True).start()
+        return self.loop
+
+    def get_json(self, url: str, ttl: Optional[float] = None) -> Any:
+        """Blocking fetch for use in handlers. Raises FetchError on failure or timeout."""
+        fut = asyncio.run_coroutine_threadsafe(self._get(url, ttl), self._ensure_loop())
+        try:
+            return fut.result(self.deadline)
+        except concurrent.futures.TimeoutError:
+            fut.cancel()
+            raise FetchError(f"Deadline exceeded for {url}")
+
+    async def fetch_json(self, url: str, ttl: Optional[float] = None) -> Any:
+        """Awaitable version of get_json()"""
+        fut = asyncio.run_coroutine_threadsafe(self._get(url, ttl), self._ensure_loop())
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(fut), self.deadline)
+        except asyncio.TimeoutError:
+            raise FetchError(f"Deadline exceeded for {url}")
+
+    def invalidate(self, url: Optional[str] = None) -> None:
+        """Drops one cached URL, or the whole cache"""
+        def drop():
+            if url is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(url, None)
+        self._ensure_loop().call_soon_threadsafe(drop)
+
+    def close(self) -> None:
+        """Cancels in-flight requests, closes the session and stops the loop thread"""
+        with self._lock:
+            loop, self.loop = self.loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(self.deadline)
+        loop.call_soon_threadsafe(loop.stop)
+
+    async def _shutdown(self):
+        tasks = list(self.inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def _get(self, url, ttl):
+        entry = self.cache.get(url)
+        if entry and entry[0] > time.monotonic():
+            self.cache.move_to_end(url)
+            return entry[2]
+
+        # Coalesce: later callers wait on the fetch already in flight. The
+        # shield keeps one caller's cancellation from aborting it for the rest.
+        task = self.inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(url, ttl, entry))
+            self.inflight[url] = task
+            task.add_done_callback(lambda _: self.inflight.pop(url, None))
+        return await asyncio.shield(task)
+
+    async def _refresh(self, url, ttl, entry):
+        host = urlsplit(url).netloc
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            self.breakers[host] = breaker
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {host}")
+
+        headers = {}
+        if entry and entry[1]:
+            headers['If-None-Match'] = entry[1]
+
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+        err = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            try:
+                async with self.session.get(url, headers=headers) as resp:
+                    if resp.status == 304 and 'If-None-Match' in headers:
+                        value = entry[2]
+                        etag = entry[1]
+                    elif resp.status == 304:
+                        # Nothing was sent to revalidate, so a cache on the way
+                        # answered with no body to reuse. Ask once more past it.
+                        if 'Cache-Control' in headers:
+                            breaker.record_success()
+                            raise FetchError(f"Unexpected HTTP 304 from {url}")
+                        headers = {'Cache-Control': "no-cache"}
+                        err = FetchError(f"Unexpected HTTP 304 from {url}")
+                        continue
+                    elif resp.status >= 500 or resp.status == 429:
+                        err = FetchError(f"HTTP {resp.status} from {url}")
+                        continue
+                    elif resp.status >= 400:
+                        # The upstream is working, the request is not
+                        breaker.record_success()
+                        raise FetchError(f"HTTP {resp.status} from {url}")
+                    else:
+                        value = await resp.json(content_type=None)
+                        etag = resp.headers.get('ETag')
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                err = FetchError(f"Request to {url} failed: {e!r}")
+                continue
+
+            breaker.record_success()
+            self._store(url, ttl, etag, value)
+            return value
+
+        breaker.record_failure()
+        raise err
+
+    def _store(self, url, ttl, etag, value):
+        self.cache[url] = (time.monotonic() + (self.ttl if ttl is None else ttl), etag, value)
+        self.cache.move_to_end(url)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+fetcher = None
+
+def get_fetcher() -> Fetcher:
+    """Process-wide Fetcher shared by all handlers"""
+    global fetcher  # pylint: disable=global-statement
+    if fetcher is None:
+        fetcher = Fetcher()
+    return fetcher
@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from web3 import Web3
+from eth_abi import abi as ethabi
+
+EXECUTE_SELECTOR = Web3.keccak(text="execute(address,uint256,bytes)")[:4]
+GAS_FIELDS = ('preVerificationGas', 'verificationGasLimit', 'callGasLimit')
+
+def op_shape(op) -> Tuple:
+    """
+    Cache key for an op's gas estimate: sender, account method, call target and
+    selector, calldata length, paymaster, and whether it deploys the account.
+    Ops with the same shape run the same code paths, so need about the same gas.
+    """
+    calldata = Web3.to_bytes(hexstr=op.get('callData') or "0x")
+    target = inner_selector = None
+    if calldata[:4] == EXECUTE_SELECTOR:
+        try:
+            target, _, inner = ethabi.decode(['address', 'uint256', 'bytes'], calldata[4:])
+            inner_selector = inner[:4]
+        except Exception: # pylint: disable=broad-exception-caught
+            pass
+    # Unset, "" and "0x" all mean no factory or initCode
+    deploys = (op.get('factory') or "0x") != "0x" or (op.get('initCode') or "0x") != "0x"
+    return (op['sender'].lower(), calldata[:4], target, inner_selector, len(calldata),
+            (op.get('paymaster') or "").lower(), deploys)
+
+class GasEstimateCache:
+    """
+    Reuses eth_estimateUserOperationGas results for ops of the same shape (see
+    op_shape()). A cached estimate is scaled by 'margins' (a multiplier per gas
+    field) to cover small differences between ops, and is re-estimated live
+    once it is 'ttl' seconds old or after invalidate(), e.g. when the Bundler
+    rejects an op which used it.
+    """
+
+    def __init__(self, ttl: float = 300.0, margins: Optional[Dict[str, float]] = None, max_entries: int = 1024):
+        self.ttl = ttl
+        self.margins = {'preVerificationGas': 1.2, 'verificationGasLimit': 1.1, 'callGasLimit': 1.1}
+        self.margins.update(margins or {})
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, op) -> Optional[dict]:
+        """The estimate for the op's shape, with margins applied, or None"""
+        key = op_shape(op)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() >= entry[1]:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            est = entry[0]
+        return {f: Web3.to_hex(int(Web3.to_int(hexstr=est[f]) * self.margins.get(f, 1.0))) for f in GAS_FIELDS}
+
+    def store(self, op, est_result: dict) -> None:
+        key = op_shape(op)
+        with self.lock:
+            self.entries[key] = ({f: est_result[f] for f in GAS_FIELDS}, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, op) -> bool:
+        """Drops the estimate for the op's shape. Returns True if there was one."""
+        with self.lock:
+            return self.entries.pop(op_shape(op), None) is not None
@@ -0,0 +1,8 @@
+"""
+Local stand-in for a Boba node and Bundler, for tests and offline load
+testing. Run `python -m hybrid_compute_sdk.localnet --help` for the CLI.
+"""
+from .chain import LocalChain, RpcError
+from .server import LocalChainServer, serve
+
+__all__ = ['LocalChain', 'LocalChainServer', 'RpcError', 'serve']
@@ -0,0 +1,87 @@
+"""
+Serves a LocalChain, or with --bench runs a client throughput benchmark
+against one:
+
+    python -m hybrid_compute_sdk.localnet --port 8545 --latency 0.05 --error-rate 0.01 --seed 1
+    python -m hybrid_compute_sdk.localnet --bench 200 --block-time 0.5 --latency 0.02
+"""
+
+import argparse
+import time
+from eth_account import Account
+from hybrid_compute_sdk.aa_utils import AAUtils, PollSchedule
+from hybrid_compute_sdk.op_pipeline import OpPipeline
+from hybrid_compute_sdk.localnet.chain import LocalChain
+from hybrid_compute_sdk.localnet.server import LocalChainServer
+
+def bench(server, count, keys):
+    """Submits 'count' ops through an OpPipeline and waits for their receipts"""
+    # Receipts are polled by the AAUtils receipt_watcher, at receipt_poll's initial interval
+    aa = AAUtils(node_url=server.url, bundler_url=server.url,
+                 receipt_poll=PollSchedule(initial=0.1, deadline=120))
+    owner = Account.create()
+    sender = "0x" + "5a" * 20
+    start = time.monotonic()
+    op = aa.build_op(sender, owner.address, 0, b"")
+    (_, op) = aa.estimate_op_gas(op)
+    pipeline = OpPipeline(aa, sender, owner.key.hex(), keys=range(1, keys + 1))
+    rejected = 0
+    try:
+        for _ in range(count):
+            try:
+                pipeline.submit(dict(op))
+            except Exception as e: # pylint: disable=broad-exception-caught
+                print("*** Submission failed:", e)
+                rejected += 1
+        submitted = time.monotonic()
+        receipts = pipeline.wait_all()
+    finally:
+        aa.close()
+    done = time.monotonic()
+    accepted = len(receipts)
+    reverted = sum(1 for r in receipts if not r['success'])
+    calls = server.chain.calls
+    print(f"Submitted {accepted} of {count} ops in {submitted - start:.2f}s "
+          f"({accepted / (submitted - start):.1f} ops/s), {rejected} failed to submit")
+    print(f"All receipts after {done - start:.2f}s ({accepted / (done - start):.1f} ops/s), "
+          f"{reverted} reverted")
+    print(f"eth_sendUserOperation calls: {calls['eth_sendUserOperation']}, "
+          f"receipt polls: {calls['eth_getUserOperationReceipt']}, total calls: {sum(calls.values())}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for a Boba node and Bundler")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8545, help="0 picks a free port")
+    parser.add_argument("--chain-id", type=int, default=28882)
+    parser.add_argument("--block-time", type=float, default=1.0, help="seconds; 0 mines on each submission")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds, at random")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of requests failing with HTTP 503")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls returning an error")
+    parser.add_argument("--revert-rate", type=float, default=0.0, help="fraction of included ops reverting")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--bench", type=int, metavar="OPS", help="run a benchmark of OPS UserOperations and exit")
+    parser.add_argument("--keys", type=int, default=8, help="nonce keys used by the benchmark")
+    args = parser.parse_args()
+
+    chain = LocalChain(chain_id=args.chain_id, block_time=args.block_time, latency=args.latency,
+                       jitter=args.jitter, drop_rate=args.drop_rate, error_rate=args.error_rate,
+                       revert_rate=args.revert_rate, seed=args.seed)
+    server = LocalChainServer(chain, args.host, 0 if args.bench else args.port)
+    if args.bench:
+        server.start()
+        try:
+            bench(server, args.bench, args.keys)
+        finally:
+            server.close()
+        return
+    print("Serving node and Bundler JSON-RPC on", server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import random
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+from eth_abi import abi as ethabi
+from eth_account import Account
+from web3 import Web3
+from hybrid_compute_sdk.pvg import GAS_PRICE_ORACLE, L1FeeModel
+from hybrid_compute_sdk.userop_hash import UserOpHasher
+
+ENTRY_POINT = "0x0000000071727De22E5E9d8BAf0edAc6f37da032"
+GET_NONCE = Web3.keccak(text="getNonce(address,uint192)")[:4]
+L1_PARAMS = dict(zip((Web3.keccak(text=sig)[:4] for sig in L1FeeModel.SELECTORS),
+                     (20 * 10**9, 1, 1368, 810949)))
+ZERO_WORD = "0x" + "00" * 32
+EMPTY_BLOOM = "0x" + "00" * 256
+
+class RpcError(Exception):
+    """A JSON-RPC error answer"""
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+def word(value: int) -> str:
+    return "0x" + f"{value:064x}"
+
+class LocalChain:
+    """
+    In-memory stand-in for a Boba node and an ERC-4337 Bundler, answering the
+    JSON-RPC calls made by AAUtils, UserOpManager and the offchain handlers.
+
+    The Bundler checks nonces (AA25) and requires a fee bump to replace a
+    pending op, but does not simulate or check signatures. Pending ops and
+    transactions are included in the next block; blocks are produced every
+    'block_time' seconds, or on each submission if it is 0. EntryPoint nonces
+    and the GasPriceOracle L1 fee parameters are answered for eth_call; any
+    other eth_call returns a zero word.
+
+    'latency' (+ up to 'jitter') seconds are added to each HTTP request.
+    Requests fail outright with probability 'drop_rate', each call returns a
+    JSON-RPC error with probability 'error_rate', and included ops revert with
+    probability 'revert_rate'. Faults are drawn from a generator seeded with
+    'seed', so runs are reproducible.
+    """
+
+    def __init__(self, chain_id: int = 28882, entry_point: str = ENTRY_POINT, block_time: float = 1.0,
+                 base_fee: int = 10**9, tip: int = 10**8, latency: float = 0.0, jitter: float = 0.0,
+                 drop_rate: float = 0.0, error_rate: float = 0.0, revert_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.chain_id = chain_id
+        self.entry_point = entry_point
+        self.block_time = block_time
+        self.base_fee = base_fee
+        self.tip = tip
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.error_rate = error_rate
+        self.revert_rate = revert_rate
+        self.random = random.Random(seed)
+        self.hasher = UserOpHasher(entry_point, chain_id)
+        self.lock = threading.RLock()
+        self.started = time.monotonic()
+        self.block = 0
+        self.seqs: Dict[tuple, int] = {}       # (sender, key) -> next nonce sequence on chain
+        self.mempool: Dict[tuple, tuple] = {}  # (sender, nonce) -> (op hash, pending op)
+        self.pending_txs: Dict[str, dict] = {}
+        self.op_receipts: Dict[str, dict] = {}
+        self.tx_receipts: Dict[str, dict] = {}
+        self.tx_counts: Counter = Counter()
+        self.calls: Counter = Counter()
+
+    # Fault injection, used by the server
+
+    def chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < rate
+
+    def delay(self) -> float:
+        """Latency to add to one HTTP request"""
+        with self.lock:
+            return self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    # JSON-RPC
+
+    def handle(self, payload):
+        """Answers a JSON-RPC request or batch"""
+        if isinstance(payload, list):
+            return [self.handle_one(call) for call in payload]
+        return self.handle_one(payload)
+
+    def handle_one(self, call: Dict[str, Any]) -> Dict[str, Any]:
+        method = call.get('method')
+        response = {'jsonrpc': "2.0", 'id': call.get('id')}
+        try:
+            handler = getattr(self, "rpc_" + str(method), None)
+            if handler is None:
+                raise RpcError(-32601, f"Method not found: {method}")
+            if self.chance(self.error_rate):
+                raise RpcError(-32603, "Injected failure")
+            with self.lock:
+                self.calls[method] += 1
+                self.mine_due()
+                response['result'] = handler(*self.positional(call.get('params')))
+        except RpcError as e:
+            response['error'] = {'code': e.code, 'message': e.message}
+        return response
+
+    @staticmethod
+    def positional(params):
+        if params is None:
+            return []
+        if isinstance(params, dict):
+            return list(params.values())
+        return params
+
+    # Blocks
+
+    def block_hash(self, number: int) -> str:
+        return Web3.to_hex(Web3.keccak(ethabi.encode(['uint256', 'uint256'], [self.chain_id, number])))
+
+    def mine_due(self):
+        """Produces the blocks due by now"""
+        if self.block_time > 0:
+            target = int((time.monotonic() - self.started) / self.block_time)
+            while self.block < target:
+                self.mine()
+
+    def mine(self):
+        """Produces one block, including every pending op and transaction"""
+        self.block += 1
+        block = {'blockNumber': hex(self.block), 'blockHash': self.block_hash(self.block)}
+        if self.mempool:
+            bundle_hash = Web3.to_hex(Web3.keccak(text=f"bundle-{self.block}"))
+            receipt = self.tx_receipt(bundle_hash, self.entry_point, block)
+            for (sender, nonce), (op_hash, op) in sorted(self.mempool.items(), key=lambda item: item[0]):
+                success = not self.chance(self.revert_rate)
+                self.seqs[(sender, nonce >> 64)] = (nonce & (2**64 - 1)) + 1
+                self.op_receipts[op_hash] = {
+                    'userOpHash': op_hash, 'entryPoint': self.entry_point, 'sender': op['sender'],
+                    'nonce': hex(nonce), 'paymaster': op.get('paymaster', "0x" + "00" * 20),
+                    'actualGasCost': hex(100000 * self.base_fee), 'actualGasUsed': hex(100000),
+                    'success': success, 'logs': [], 'receipt': receipt}
+            self.tx_receipts[bundle_hash] = receipt
+            self.mempool.clear()
+        for tx_hash, tx in self.pending_txs.items():
+            self.tx_receipts[tx_hash] = self.tx_receipt(tx_hash, tx['to'], block, tx['from'])
+        self.pending_txs.clear()
+
+    def tx_receipt(self, tx_hash, to, block, sender=None):
+        return dict(block, transactionHash=tx_hash, transactionIndex="0x0", status="0x1",
+                    to=to, contractAddress=None, logs=[], logsBloom=EMPTY_BLOOM, type="0x2",
+                    cumulativeGasUsed=hex(100000), gasUsed=hex(100000),
+                    effectiveGasPrice=hex(self.base_fee + self.tip), **{'from': sender or self.entry_point})
+
+    def block_number(self, tag) -> int:
+        if tag in ("latest", "pending", "safe", "finalized"):
+            return self.block
+        if tag == "earliest":
+            return 0
+        return Web3.to_int(hexstr=tag)
+
+    # Node methods
+
+    def rpc_eth_chainId(self):
+        return hex(self.chain_id)
+
+    def rpc_web3_clientVersion(self):
+        return "hybrid-compute-localnet"
+
+    def rpc_net_version(self):
+        return str(self.chain_id)
+
+    def rpc_eth_blockNumber(self):
+        return hex(self.block)
+
+    def rpc_eth_gasPrice(self):
+        return hex(self.base_fee + self.tip)
+
+    def rpc_eth_maxPriorityFeePerGas(self):
+        return hex(self.tip)
+
+    def rpc_eth_feeHistory(self, count, newest, percentiles=()):
+        newest = self.block_number(newest)
+        blocks = min(Web3.to_int(hexstr=count) if isinstance(count, str) else count, newest + 1)
+        return {'oldestBlock': hex(newest - blocks + 1), 'baseFeePerGas': [hex(self.base_fee)] * (blocks + 1),
+                'gasUsedRatio': [0.5] * blocks, 'reward': [[hex(self.tip)] * len(percentiles)] * blocks}
+
+    def rpc_eth_getBlockByNumber(self, tag, full=False):
+        number = self.block_number(tag)
+        if number > self.block:
+            return None
+        return {'number': hex(number), 'hash': self.block_hash(number),
+                'parentHash': self.block_hash(number - 1) if number else ZERO_WORD,
+                'timestamp': hex(int(number * max(self.block_time, 1))), 'baseFeePerGas': hex(self.base_fee),
+                'gasLimit': hex(30_000_000), 'gasUsed': "0x0", 'transactions': [], 'uncles': [],
+                'miner': "0x" + "00" * 20, 'difficulty': "0x0", 'totalDifficulty': "0x0",
+                'extraData': "0x", 'logsBloom': EMPTY_BLOOM, 'nonce': "0x0000000000000000", 'size': "0x0",
+                'mixHash': ZERO_WORD, 'receiptsRoot': ZERO_WORD, 'sha3Uncles': ZERO_WORD,
+                'stateRoot': ZERO_WORD, 'transactionsRoot': ZERO_WORD}
+
+    def rpc_eth_call(self, tx, tag="latest"):
+        data = Web3.to_bytes(hexstr=tx.get('data') or tx.get('input') or "0x")
+        to = (tx.get('to') or "").lower()
+        if to == self.entry_point.lower() and data[:4] == GET_NONCE:
+            sender, key = ethabi.decode(['address', 'uint192'], data[4:])
+            return word((key << 64) | self.seqs.get((sender.lower(), key), 0))
+        if to == GAS_PRICE_ORACLE.lower() and data[:4] in L1_PARAMS:
+            return word(L1_PARAMS[data[:4]])
+        return ZERO_WORD
+
+    def rpc_eth_estimateGas(self, tx, tag="latest"):
+        return hex(100000)
+
+    def rpc_eth_getBalance(self, address, tag="latest"):
+        return hex(10**18)
+
+    def rpc_eth_getCode(self, address, tag="latest"):
+        return "0x"
+
+    def rpc_eth_getTransactionCount(self, address, tag="latest"):
+        return hex(self.tx_counts[address.lower()])
+
+    def rpc_eth_sendRawTransaction(self, raw):
+        tx_hash = Web3.to_hex(Web3.keccak(hexstr=raw))
+        sender = Account.recover_transaction(raw)
+        self.tx_counts[sender.lower()] += 1
+        self.pending_txs[tx_hash] = {'from': sender, 'to': None}
+        if self.block_time <= 0:
+            self.mine()
+        return tx_hash
+
+    def rpc_eth_getTransactionReceipt(self, tx_hash):
+        return self.tx_receipts.get(tx_hash)
+
+    # Bundler methods
+
+    def rpc_eth_supportedEntryPoints(self):
+        return [self.entry_point]
+
+    def rpc_eth_estimateUserOperationGas(self, op, entry_point=None):
+        calldata = Web3.to_bytes(hexstr=op.get('callData') or "0x")
+        return {'preVerificationGas': hex(50000 + 16 * len(calldata)), 'verificationGasLimit': hex(100000),
+                'callGasLimit': hex(50000 + 16 * len(calldata))}
+
+    def rpc_eth_sendUserOperation(self, op, entry_point=None):
+        sender = op['sender'].lower()
+        nonce = Web3.to_int(hexstr=op['nonce'])
+        (key, seq) = (nonce >> 64, nonce & (2**64 - 1))
+        chain_seq = self.seqs.get((sender, key), 0)
+        next_seq = chain_seq + sum(1 for (s, n) in self.mempool if s == sender and n >> 64 == key)
+        if not chain_seq <= seq <= next_seq:
+            raise RpcError(-32602, "AA25 invalid account nonce")
+        existing = self.mempool.get((sender, nonce))
+        if existing:
+            old = existing[1]
+            for field in ('maxFeePerGas', 'maxPriorityFeePerGas'):
+                if Web3.to_int(hexstr=op[field]) * 10 < Web3.to_int(hexstr=old[field]) * 11:
+                    raise RpcError(-32602, "replacement underpriced: fees must increase by 10%")
+        op_hash = Web3.to_hex(self.hasher.hash(op))
+        self.mempool[(sender, nonce)] = (op_hash, op)
+        if self.block_time <= 0:
+            self.mine()
+        return op_hash
+
+    def rpc_eth_getUserOperationReceipt(self, op_hash):
+        return self.op_receipts.get(op_hash)
+
+    def rpc_eth_getUserOperationByHash(self, op_hash):
+        for pending_hash, op in self.mempool.values():
+            if pending_hash == op_hash:
+                return {'userOperation': op, 'entryPoint': self.entry_point}
+        receipt = self.op_receipts.get(op_hash)
+        if receipt is None:
+            return None
+        return {'entryPoint': self.entry_point, 'blockNumber': receipt['receipt']['blockNumber'],
+                'transactionHash': receipt['receipt']['transactionHash']}
@@ -0,0 +1,79 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from hybrid_compute_sdk.localnet.chain import LocalChain
+
+class RpcHandler(BaseHTTPRequestHandler):
+    """Serves the JSON-RPC interface of the server's LocalChain over HTTP/1.1"""
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, so don't let Nagle's algorithm
+    # hold the body back for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        chain = self.server.chain
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(chain.delay())
+        if chain.chance(chain.drop_rate):
+            self.reply(503, b"Injected failure")
+            return
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            self.reply(200, json.dumps({'jsonrpc': "2.0", 'id': None,
+                                        'error': {'code': -32700, 'message': "Parse error"}}).encode())
+            return
+        self.reply(200, json.dumps(chain.handle(payload)).encode())
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class LocalChainServer(ThreadingHTTPServer):
+    """HTTP server for a LocalChain, serving node and Bundler calls on one URL"""
+    daemon_threads = True
+
+    def __init__(self, chain: Optional[LocalChain] = None, host: str = "127.0.0.1", port: int = 0):
+        self.chain = chain or LocalChain()
+        super().__init__((host, port), RpcHandler)
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self) -> "LocalChainServer":
+        """Serves requests from a background thread"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        if self.thread:
+            self.shutdown()
+            self.thread = None
+        self.server_close()
+
+@contextmanager
+def serve(chain: Optional[LocalChain] = None, host: str = "127.0.0.1", port: int = 0, **options):
+    """
+    Runs a LocalChainServer for the duration of a with block, e.g. in a pytest
+    fixture. Without a 'chain', one is created from the LocalChain 'options'.
+
+        with serve(block_time=0, error_rate=0.1, seed=1) as server:
+            aa = AAUtils(node_url=server.url, bundler_url=server.url)
+    """
+    server = LocalChainServer(chain or LocalChain(**options), host, port).start()
+    try:
+        yield server
+    finally:
+        server.close()
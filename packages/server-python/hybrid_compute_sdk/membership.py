@@ -0,0 +1,253 @@
+import bisect
+import hashlib
+import heapq
+import io
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+from typing import Iterable, Optional, Union
+
+# Index file layout: a header, then a Bloom filter, then the sorted 20-byte
+# addresses. The Bloom filter answers most negative lookups without touching
+# the array; anything it passes is confirmed by binary search.
+INDEX_MAGIC = b"HCAS"
+INDEX_HEADER = struct.Struct("<4sIQQ")  # magic, hash count, entries, Bloom filter bytes
+ADDR_LEN = 20
+BLOOM_BITS_PER_ENTRY = 16
+BLOOM_HASHES = 4
+# Addresses sorted in memory at a time when building an index (20 MiB of records)
+SORT_CHUNK = 1 << 20
+
+def normalize_address(addr: Union[str, bytes]) -> Optional[bytes]:
+    """Returns the 20-byte form of an address given as hex (any case, with or
+       without 0x) or as bytes, or None if it is not an address."""
+    if isinstance(addr, (bytes, bytearray)):
+        return bytes(addr) if len(addr) == ADDR_LEN else None
+    if not isinstance(addr, str):
+        return None
+    if addr[:2] in ("0x", "0X"):
+        addr = addr[2:]
+    if len(addr) != 2 * ADDR_LEN:
+        return None
+    try:
+        return bytes.fromhex(addr)
+    except ValueError:
+        return None
+
+def bloom_positions(addr: bytes, mask: int):
+    """Bit positions of an address in a Bloom filter of mask+1 bits"""
+    d = int.from_bytes(hashlib.blake2b(addr, digest_size=16).digest(), 'little')
+    return [(d >> (32 * i)) & mask for i in range(BLOOM_HASHES)]
+
+def _runs(addresses: Iterable[Union[str, bytes]], chunk: int):
+    """Splits the normalized addresses into sorted, de-duplicated runs of at
+       most 'chunk' entries. Returns (records, spilled): the only run as a list
+       if everything fit in one chunk, otherwise runs spilled to temp files."""
+    spilled = []
+    batch = set()
+    for a in addresses:
+        n = normalize_address(a)
+        if n is None:
+            for f in spilled:
+                f.close()
+            raise ValueError(f"Invalid address: {a!r}")
+        batch.add(n)
+        if len(batch) >= chunk:
+            f = tempfile.TemporaryFile()
+            f.write(b"".join(sorted(batch)))
+            f.seek(0)
+            spilled.append(f)
+            batch = set()
+    if not spilled:
+        return sorted(batch), []
+    if batch:
+        f = tempfile.TemporaryFile()
+        f.write(b"".join(sorted(batch)))
+        f.seek(0)
+        spilled.append(f)
+    return None, spilled
+
+def _read_records(f):
+    """Iterates over the 20-byte records of a file, from the current position"""
+    while True:
+        block = f.read(ADDR_LEN * 4096)
+        if not block:
+            return
+        for off in range(0, len(block), ADDR_LEN):
+            yield block[off:off + ADDR_LEN]
+
+def _bloom(records, count: int) -> bytearray:
+    """Bloom filter over the records"""
+    # Power-of-two size so that positions can be masked rather than reduced
+    bloom_bits = 64
+    while bloom_bits < BLOOM_BITS_PER_ENTRY * count:
+        bloom_bits *= 2
+    bloom = bytearray(bloom_bits // 8)
+    mask = bloom_bits - 1
+    for r in records:
+        for p in bloom_positions(r, mask):
+            bloom[p >> 3] |= 1 << (p & 7)
+    return bloom
+
+def _write_index(addresses: Iterable[Union[str, bytes]], out, chunk: int) -> None:
+    """Writes the index to a binary file object. Lists larger than 'chunk'
+       addresses are sorted externally: sorted runs are spilled to temp files
+       and then merged, so memory use is bounded by the chunk size and the
+       Bloom filter (2 bytes per address) rather than the whole list."""
+    (records, spilled) = _runs(addresses, chunk)
+    if records is not None:
+        bloom = _bloom(records, len(records))
+        out.write(INDEX_HEADER.pack(INDEX_MAGIC, BLOOM_HASHES, len(records), len(bloom)))
+        out.write(bloom)
+        out.write(b"".join(records))
+        return
+
+    with tempfile.TemporaryFile() as merged:
+        count = 0
+        last = None
+        for r in heapq.merge(*(_read_records(f) for f in spilled)):
+            if r != last:
+                merged.write(r)
+                count += 1
+                last = r
+        for f in spilled:
+            f.close()
+        merged.seek(0)
+        bloom = _bloom(_read_records(merged), count)
+        out.write(INDEX_HEADER.pack(INDEX_MAGIC, BLOOM_HASHES, count, len(bloom)))
+        out.write(bloom)
+        merged.seek(0)
+        shutil.copyfileobj(merged, out)
+
+def encode_index(addresses: Iterable[Union[str, bytes]], chunk: int = SORT_CHUNK) -> bytes:
+    """Builds the index for a list of addresses. Raises ValueError on a malformed entry."""
+    out = io.BytesIO()
+    _write_index(addresses, out, chunk)
+    return out.getvalue()
+
+def write_index(addresses: Iterable[Union[str, bytes]], path: str, chunk: int = SORT_CHUNK) -> None:
+    """Writes an index file, streaming the addresses through an external sort.
+       The file is replaced atomically, so a running AddressSet will switch to
+       it on its next reload."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            _write_index(addresses, f, chunk)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+def write_index_from_file(src: str, path: str) -> None:
+    """Writes an index file from a text file with one address per line.
+       Blank lines and lines starting with '#' are ignored."""
+    with open(src, "r", encoding="ascii") as f:
+        write_index((line.strip() for line in f
+            if line.strip() and not line.startswith('#')), path)
+
+class _SortedRecords:
+    """Sequence view of the sorted address array, for use with bisect"""
+    def __init__(self, buf, offset, count):
+        self.buf = buf
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        off = self.offset + ADDR_LEN * i
+        return self.buf[off:off + ADDR_LEN]
+
+class _Index:
+    """An immutable loaded index, backed by an mmap or a bytes object"""
+    def __init__(self, buf):
+        if len(buf) < INDEX_HEADER.size:
+            raise ValueError("Not an address index")
+        (magic, hashes, count, bloom_len) = INDEX_HEADER.unpack_from(buf)
+        if magic != INDEX_MAGIC or hashes != BLOOM_HASHES:
+            raise ValueError("Not an address index")
+        if len(buf) != INDEX_HEADER.size + bloom_len + ADDR_LEN * count:
+            raise ValueError("Truncated address index")
+        self.buf = buf
+        self.bloom = memoryview(buf)[INDEX_HEADER.size:INDEX_HEADER.size + bloom_len]
+        self.mask = 8 * bloom_len - 1
+        self.records = _SortedRecords(buf, INDEX_HEADER.size + bloom_len, count)
+
+    def contains(self, addr: bytes) -> bool:
+        """Bloom filter check, then binary search"""
+        bloom = self.bloom
+        for p in bloom_positions(addr, self.mask):
+            if not bloom[p >> 3] & (1 << (p & 7)):
+                return False
+        i = bisect.bisect_left(self.records, addr)
+        return i < len(self.records) and self.records[i] == addr
+
+class AddressSet:
+    """
+    Membership test for large address allow/deny lists. The list is a sorted
+    array of 20-byte addresses behind a Bloom filter, memory-mapped from an
+    index file built by write_index() so that it is shared between processes.
+    Lookups cost a few hash probes, plus O(log n) for addresses which pass the
+    filter. If the index file is replaced, the new version is picked up
+    without a restart. The file is checked at most once per check_interval
+    seconds, and readers see either the old list or the new one.
+    """
+
+    def __init__(self, path: Optional[str] = None, check_interval: float = 5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._index = _Index(INDEX_HEADER.pack(INDEX_MAGIC, BLOOM_HASHES, 0, 8) + bytes(8))
+        self._stat = None
+        self._next_check = 0.0
+        if path:
+            self.reload()
+
+    @classmethod
+    def from_addresses(cls, addresses: Iterable[Union[str, bytes]]) -> "AddressSet":
+        """Builds an in-memory set, e.g. for a short list from the environment"""
+        s = cls()
+        s._index = _Index(encode_index(addresses))
+        return s
+
+    def reload(self) -> None:
+        """Maps the current index file and swaps it in"""
+        with open(self.path, "rb") as f:
+            st = os.fstat(f.fileno())
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # A single reference assignment, so concurrent lookups never see a mix.
+        # The previous mapping is released once no lookup is using it.
+        self._index = _Index(buf)
+        self._stat = (st.st_ino, st.st_size, st.st_mtime_ns)
+        self._next_check = time.monotonic() + self.check_interval
+
+    def maybe_reload(self) -> None:
+        """Reloads if the index file has been replaced since it was loaded"""
+        if not self.path or time.monotonic() < self._next_check:
+            return
+        self._next_check = time.monotonic() + self.check_interval
+        try:
+            st = os.stat(self.path)
+            if (st.st_ino, st.st_size, st.st_mtime_ns) != self._stat:
+                print("Reloading address index", self.path)
+                self.reload()
+        except (OSError, ValueError) as e:
+            print("WARN address index unavailable, keeping the loaded version:", e)
+
+    def __contains__(self, addr) -> bool:
+        self.maybe_reload()
+        n = normalize_address(addr)
+        return n is not None and self._index.contains(n)
+
+    def __len__(self) -> int:
+        return len(self._index.records)
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3:
+        print("Usage: python -m hybrid_compute_sdk.membership <address list> <index file>")
+        sys.exit(1)
+    write_index_from_file(sys.argv[1], sys.argv[2])
@@ -0,0 +1,115 @@
+import itertools
+import os
+import threading
+import time
+from typing import Optional, Sequence, Union
+from web3 import Web3
+from hybrid_compute_sdk.endpoints import EndpointPool, Unavailable
+from hybrid_compute_sdk.sessions import http_session
+
+class BlockNotFound(Unavailable):
+    """No node has the requested block (yet)"""
+
+class NodeClient:
+    """
+    Read-only JSON-RPC client for offchain handlers, over one or more HTTP
+    nodes (by default the comma-separated OC_NODE_HTTP). Calls go through an
+    EndpointPool, so they fail over between nodes and are hedged to a second
+    node when the first is slow.
+
+    The client tracks the highest block seen from each node. A read at a given
+    block skips nodes known to be behind it, and a node answering "not found"
+    for a block it should have (a request racing block propagation) is passed
+    over for the next one. If no node has the block yet, the read is retried
+    for up to 'block_wait' seconds.
+    """
+
+    def __init__(self, urls: Optional[Union[str, Sequence[str]]] = None, timeout: float = 30.0,
+                 pool_size: int = 10, session=None, block_wait: float = 10.0):
+        self.nodes = EndpointPool(urls or os.environ['OC_NODE_HTTP'])
+        self.timeout = timeout
+        self.session = session or http_session(pool_size)
+        self.block_wait = block_wait
+        self.heights = {url: 0 for url in self.nodes.urls}
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+
+    def request(self, url, method, params):
+        """Sends one JSON-RPC request to one node and returns its result"""
+        payload = {'jsonrpc': "2.0", 'id': next(self.ids), 'method': method, 'params': params}
+        response = self.session.post(url, json=payload, timeout=self.timeout).json()
+        if 'error' in response:
+            raise RuntimeError(f"{method} failed on {url}: {response['error']}")
+        return response['result']
+
+    def note_height(self, url, height):
+        with self.lock:
+            self.heights[url] = max(self.heights[url], height)
+
+    def height(self, url) -> int:
+        """Highest block seen from a node"""
+        with self.lock:
+            return self.heights[url]
+
+    def call(self, method, params, hedge=True):
+        """A read which does not depend on block height"""
+        return self.nodes.call(lambda url: self.request(url, method, params), hedge)
+
+    def read_height(self, url) -> int:
+        number = Web3.to_int(hexstr=self.request(url, "eth_blockNumber", []))
+        self.note_height(url, number)
+        return number
+
+    def block_number(self) -> int:
+        return self.nodes.call(self.read_height, hedge=True)
+
+    def refresh_heights(self):
+        """Reads eth_blockNumber from every node in parallel"""
+        futures = [self.nodes.executor.submit(self.nodes._timed, ep, self.read_height) # pylint: disable=protected-access
+                   for ep in self.nodes.endpoints]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e: # pylint: disable=broad-exception-caught
+                print("*** Node height check failed:", e)
+
+    def at_block(self, number):
+        """Nodes known to have reached the block, or all of them if none is"""
+        ahead = [ep for ep in self.nodes.endpoints if self.height(ep.url) >= number]
+        if not ahead:
+            self.refresh_heights()
+            ahead = [ep for ep in self.nodes.endpoints if self.height(ep.url) >= number]
+        return ahead or None
+
+    def get_block(self, number: int) -> dict:
+        """
+        eth_getBlockByNumber (without transactions) from a node which has the
+        block. Returns the raw JSON-RPC block object. Raises BlockNotFound once
+        no node has produced it within 'block_wait' seconds.
+        """
+        def read(url):
+            block = self.request(url, "eth_getBlockByNumber", [hex(number), False])
+            if block is None:
+                with self.lock:
+                    self.heights[url] = min(self.heights[url], number - 1)
+                raise BlockNotFound(f"Block {number} not found on {url}")
+            self.note_height(url, number)
+            return block
+
+        deadline = time.monotonic() + self.block_wait
+        while True:
+            try:
+                return self.nodes.call(read, hedge=True, candidates=self.at_block(number))
+            except BlockNotFound:
+                if time.monotonic() >= deadline:
+                    raise
+                print(f"*** Block {number} not found on any node, retrying")
+                time.sleep(0.5)
+
+    def block_hash(self, number: int) -> bytes:
+        return Web3.to_bytes(hexstr=self.get_block(number)['hash'])
+
+    def close(self):
+        """Closes the pooled connections and the hedging threads"""
+        self.nodes.close()
+        self.session.close()
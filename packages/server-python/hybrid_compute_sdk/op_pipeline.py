@@ -0,0 +1,134 @@
+import re
+from concurrent.futures import Future, wait
+from typing import Dict, Iterable, List, Optional, Tuple
+from web3 import Web3
+from hybrid_compute_sdk.aa_utils import AAUtils, PollSchedule, UserOpSubmitError, UserOpTimeoutError, \
+    UserOpFailedError
+
+# Bundler rejections which mean our local view of the nonce is wrong
+NONCE_ERROR = re.compile(r'AA25|invalid (account )?nonce|nonce too (low|high)', re.IGNORECASE)
+
+class NonceAllocator:
+    """
+    Allocates EntryPoint v0.7 nonces for one sender without a chain read per op.
+    A nonce is (key << 64) | sequence, and each 192-bit key has an independent
+    sequence, so ops on different keys can be included in any order. Ops are
+    spread round-robin over 'keys'. The sequence for a key is read from the
+    EntryPoint on first use (all keys in one batch) and then counted locally
+    until resync() is called.
+    """
+
+    def __init__(self, aa: AAUtils, sender: str, keys: Iterable[int]):
+        self.aa = aa
+        self.sender = sender
+        self.keys = list(keys)
+        self.next_seq: Dict[int, int] = {}
+        self.turn = 0
+
+    def load(self, keys: Iterable[int]) -> None:
+        """Reads the current sequence of each key from the EntryPoint"""
+        keys = list(keys)
+        results = self.aa.node_batch([self.aa.nonce_call(self.sender, k) for k in keys])
+        for k, r in zip(keys, results):
+            self.next_seq[k] = Web3.to_int(hexstr=r) & (2**64 - 1)
+
+    def allocate(self) -> int:
+        """Returns the next nonce"""
+        missing = [k for k in self.keys if k not in self.next_seq]
+        if missing:
+            self.load(missing)
+        key = self.keys[self.turn % len(self.keys)]
+        self.turn += 1
+        seq = self.next_seq[key]
+        self.next_seq[key] = seq + 1
+        return (key << 64) | seq
+
+    def resync(self, key: int) -> None:
+        """Discards the local sequence for a key after a nonce error"""
+        self.next_seq.pop(key, None)
+
+    def release(self, nonce: int) -> None:
+        """Returns a nonce whose op was not sent, so the key has no gap. If a later
+           nonce was already allocated on the key, the key is resynced instead."""
+        (key, seq) = (nonce >> 64, nonce & (2**64 - 1))
+        if self.next_seq.get(key) == seq + 1:
+            self.next_seq[key] = seq
+        else:
+            self.resync(key)
+
+class OpPipeline:
+    """
+    Submits many UserOperations from one sender back-to-back. Each op gets a
+    locally allocated nonce, is signed and sent, and the next op follows
+    without waiting for a receipt. Sent ops are tracked by the AAUtils
+    receipt_watcher, which polls all of their receipts in one batched Bundler
+    request per round, and wait_all() collects the results. A nonce rejection
+    resyncs that key from the chain and retries once. Any other send failure
+    gives the nonce back, so the key does not skip a sequence number.
+
+    Ops should come from AAUtils.build_op() (and estimate_op_gas()); their
+    nonce is replaced before signing.
+    """
+
+    def __init__(self, aa: AAUtils, sender: str, owner_key: str,
+                 keys: Iterable[int] = range(1, 9), poll: Optional[PollSchedule] = None):
+        self.aa = aa
+        self.owner_key = owner_key
+        self.nonces = NonceAllocator(aa, sender, keys)
+        self.poll = poll or aa.receipt_poll
+        self.pending: List[Tuple[str, Future]] = []
+
+    def submit(self, op: dict) -> str:
+        """Assigns a nonce, signs and sends an op. Returns its hash."""
+        for attempt in range(2):
+            nonce = self.nonces.allocate()
+            op['nonce'] = Web3.to_hex(nonce)
+            signed_op = self.aa.sign_v7_op(op, self.owner_key)
+            try:
+                op_hash = self.aa.send_op(signed_op)
+                break
+            except UserOpSubmitError as e:
+                if not NONCE_ERROR.search(str(e.args[0].get('message', ''))):
+                    self.nonces.release(nonce)
+                    raise
+                self.nonces.resync(nonce >> 64)
+                if attempt:
+                    raise
+                print("*** Nonce rejected, resyncing key", nonce >> 64)
+            except Exception:
+                # The Bundler may or may not have received the op
+                self.nonces.resync(nonce >> 64)
+                raise
+        self.pending.append((op_hash, self.aa.watch_receipt(op_hash)))
+        return op_hash
+
+    def submit_all(self, ops: Iterable[dict]) -> List[str]:
+        return [self.submit(op) for op in ops]
+
+    def wait_all(self) -> List[dict]:
+        """Waits up to the poll deadline for every op submitted since the last
+           wait_all() and returns their receipts in submission order. Failed ops
+           are returned too, with receipt['success'] False. Raises
+           UserOpTimeoutError with the hashes still pending; calling wait_all()
+           again resumes waiting."""
+        (done, _) = wait([f for _, f in self.pending], timeout=self.poll.deadline)
+        print(f"{len(done)}/{len(self.pending)} operations complete")
+        waiting = [h for h, f in self.pending
+                   if f not in done or isinstance(f.exception(), UserOpTimeoutError)]
+        if waiting:
+            # Ops which outlived the watcher's deadline are watched again on the next call
+            self.pending = [(h, self.aa.watch_receipt(h) if h in waiting and f in done else f)
+                            for h, f in self.pending]
+            raise UserOpTimeoutError(waiting)
+
+        receipts = []
+        for _, future in self.pending:
+            e = future.exception()
+            if isinstance(e, UserOpFailedError):
+                receipts.append(e.args[0])
+            elif e is not None:
+                raise e
+            else:
+                receipts.append(future.result())
+        self.pending = []
+        return receipts
@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+from typing import Callable, List, Optional
+from urllib.parse import urlparse
+from web3 import AsyncWeb3, Web3, AsyncIPCProvider, WebSocketProvider, LegacyWebSocketProvider
+from web3.exceptions import TimeExhausted, TransactionNotFound
+
+# Longest wait for a new head before checking anyway, in case a subscription stalls
+HEAD_WAIT_LIMIT = 10.0
+
+def is_http(url: str) -> bool:
+    return urlparse(url).scheme in ('http', 'https')
+
+def ipc_path(url: str) -> str:
+    """Filesystem path of an IPC endpoint given as a path or an ipc:// URL"""
+    return url[len('ipc://'):] if url.startswith('ipc://') else url
+
+def make_provider(url: str, session=None, timeout: float = 30.0):
+    """
+    Web3 provider for a node endpoint: http(s):// URLs use HTTPProvider (with
+    an optional shared requests.Session), ws(s):// URLs a WebSocket provider,
+    and anything else is taken as the path of a geth-style IPC socket.
+    """
+    scheme = urlparse(url).scheme
+    if scheme in ('http', 'https'):
+        return Web3.HTTPProvider(url, request_kwargs={'timeout': timeout}, session=session)
+    if scheme in ('ws', 'wss'):
+        return LegacyWebSocketProvider(url, websocket_timeout=timeout)
+    return Web3.IPCProvider(ipc_path(url), timeout=timeout)
+
+def make_async_provider(url: str, timeout: float = 30.0):
+    """As make_provider(), for AsyncWeb3. WebSocket and IPC providers keep a
+       persistent connection, opened with 'await w3.provider.connect()'. The
+       chain ID is cached, as web3's validation reads it before each call."""
+    cache = {'cache_allowed_requests': True, 'cacheable_requests': {"eth_chainId"}}
+    scheme = urlparse(url).scheme
+    if scheme in ('http', 'https'):
+        return AsyncWeb3.AsyncHTTPProvider(url, request_kwargs={'timeout': timeout}, **cache)
+    if scheme in ('ws', 'wss'):
+        return WebSocketProvider(url, request_timeout=timeout, **cache)
+    return AsyncIPCProvider(ipc_path(url), request_timeout=timeout, **cache)
+
+def provider_endpoint(w3) -> Optional[str]:
+    """The URL or IPC path a Web3 instance is connected to"""
+    ep = getattr(w3.provider, 'endpoint_uri', None) or getattr(w3.provider, 'ipc_path', None)
+    return ep if isinstance(ep, str) else None
+
+def batch_request(provider, calls) -> List[dict]:
+    """Sends (method, params) calls as one JSON-RPC batch, or one at a time if
+       the provider does not support batches. Returns the raw responses."""
+    if len(calls) > 1:
+        try:
+            return provider.make_batch_request(calls)
+        except (AttributeError, NotImplementedError):
+            pass
+    return [provider.make_request(*call) for call in calls]
+
+async def async_batch_request(provider, calls) -> List[dict]:
+    """As batch_request(), for AsyncWeb3 providers"""
+    if len(calls) > 1:
+        try:
+            return await provider.make_batch_request(calls)
+        except (AttributeError, NotImplementedError):
+            pass
+    return [await provider.make_request(*call) for call in calls]
+
+class HeadSubscription:
+    """
+    Follows the chain head through an eth_subscribe("newHeads") subscription on
+    a WebSocket or IPC endpoint. The subscription runs on AsyncWeb3 in a private
+    event loop thread and reconnects after errors. Blocking callers wait in
+    wait_for_block(), and listeners are called with each new block number.
+    """
+
+    def __init__(self, url: str, retry_delay: float = 1.0):
+        self.url = url
+        self.retry_delay = retry_delay
+        self.block = None
+        self.cond = threading.Condition()
+        self.listeners: List[Callable[[int], None]] = []
+        self.waiters: List[Callable[[], None]] = []
+        self.closed = False
+        self.loop = asyncio.new_event_loop()
+        self.task = None
+        self.thread = threading.Thread(target=self._run, name="new-heads", daemon=True)
+        self.thread.start()
+
+    def add_listener(self, listener: Callable[[int], None]) -> None:
+        self.listeners.append(listener)
+
+    def wait_for_block(self, after: Optional[int], timeout: float) -> Optional[int]:
+        """Waits up to 'timeout' seconds for a head newer than 'after' (any head if
+           None) and returns the latest known block number"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.block is not None and (after is None or self.block > after),
+                               timeout)
+            return self.block
+
+    async def wait_for_block_async(self, after: Optional[int], timeout: float) -> Optional[int]:
+        """As wait_for_block(), without blocking the caller's event loop. May return
+           early on a head not newer than 'after', so callers should check."""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = lambda: loop.call_soon_threadsafe(event.set)
+        with self.cond:
+            if self.block is not None and (after is None or self.block > after):
+                return self.block
+            self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.cond:
+                self.waiters.remove(waiter)
+        return self.block
+
+    def close(self) -> None:
+        self.closed = True
+        if self.task:
+            self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join(timeout=5)
+
+    def _new_head(self, number: int) -> None:
+        with self.cond:
+            if self.block is not None and number <= self.block:
+                return
+            self.block = number
+            self.cond.notify_all()
+            waiters = list(self.waiters)
+        for waiter in waiters:
+            waiter()
+        for listener in self.listeners:
+            listener(number)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.task = self.loop.create_task(self._follow())
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        self.loop.close()
+
+    async def _follow(self):
+        while not self.closed:
+            if urlparse(self.url).scheme in ('ws', 'wss'):
+                provider = WebSocketProvider(self.url)
+            else:
+                provider = AsyncIPCProvider(ipc_path(self.url))
+            try:
+                async with AsyncWeb3(provider) as w3:
+                    await w3.eth.subscribe("newHeads")
+                    async for msg in w3.socket.process_subscriptions():
+                        self._new_head(msg['result']['number'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e: # pylint: disable=broad-exception-caught
+                print("*** newHeads subscription failed:", e)
+            await asyncio.sleep(self.retry_delay)
+
+subscriptions = {}
+subscriptions_lock = threading.Lock()
+
+def get_head_subscription(url: Optional[str]) -> Optional[HeadSubscription]:
+    """Returns the HeadSubscription shared by all users of a WebSocket or IPC
+       endpoint, or None for HTTP endpoints, which can't subscribe"""
+    if not url or is_http(url):
+        return None
+    with subscriptions_lock:
+        if url not in subscriptions:
+            subscriptions[url] = HeadSubscription(url)
+        return subscriptions[url]
+
+def wait_for_receipt(w3, tx_hash, timeout: float = 120.0):
+    """
+    Same as w3.eth.wait_for_transaction_receipt(), but on a WebSocket or IPC
+    node the receipt is looked up once per new head rather than polled.
+    """
+    heads = get_head_subscription(provider_endpoint(w3))
+    if heads is None:
+        return w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+    deadline = time.monotonic() + timeout
+    block = None
+    while True:
+        try:
+            return w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeExhausted(f"Transaction {Web3.to_hex(tx_hash)} is not in the chain after {timeout} seconds")
+        block = heads.wait_for_block(block, min(remaining, HEAD_WAIT_LIMIT))
+
+async def async_wait_for_receipt(w3: AsyncWeb3, tx_hash, timeout: float = 120.0):
+    """wait_for_receipt() for AsyncWeb3, waiting without blocking the event loop"""
+    heads = get_head_subscription(provider_endpoint(w3))
+    if heads is None:
+        return await w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+    deadline = time.monotonic() + timeout
+    block = None
+    while True:
+        try:
+            return await w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeExhausted(f"Transaction {Web3.to_hex(tx_hash)} is not in the chain after {timeout} seconds")
+        block = await heads.wait_for_block_async(block, min(remaining, HEAD_WAIT_LIMIT))
@@ -0,0 +1,117 @@
+import threading
+import time
+from typing import NamedTuple, Optional
+from eth_abi import abi as ethabi
+from web3 import Web3
+from hybrid_compute_sdk.userop_hash import packed_op
+
+# OP-stack predeploy reporting the L1 fee parameters
+GAS_PRICE_ORACLE = "0x420000000000000000000000000000000000000F"
+PACKED_OP_TYPE = "(address,uint256,bytes,bytes,bytes32,uint256,bytes32,bytes,bytes)"
+HANDLE_OPS = Web3.keccak(text=f"handleOps({PACKED_OP_TYPE}[],address)")[:4]
+
+# Static preVerificationGas terms, as used by the ERC-4337 reference bundler.
+# An op is priced as if it were alone in its bundle.
+TX_GAS = 21000
+PER_OP_GAS = 18300
+PER_OP_WORD_GAS = 4
+ZERO_BYTE_GAS = 4
+NONZERO_BYTE_GAS = 16
+
+# Stand-in for gas fields which are not filled in yet, so that their final
+# (nonzero) bytes are already paid for
+GAS_FILL = 0xffffffff
+
+class L1FeeParams(NamedTuple):
+    l1_base_fee: int
+    blob_base_fee: int
+    base_fee_scalar: int
+    blob_base_fee_scalar: int
+
+    def l1_fee(self, data: bytes) -> int:
+        """GasPriceOracle.getL1Fee() (Ecotone) for a transaction carrying 'data'.
+           Later formulas discount compressible data, so this is an upper bound."""
+        zeros = data.count(0)
+        l1_gas = zeros * ZERO_BYTE_GAS + (len(data) - zeros) * NONZERO_BYTE_GAS + 68 * 16
+        weighted_price = 16 * self.base_fee_scalar * self.l1_base_fee + \
+            self.blob_base_fee_scalar * self.blob_base_fee
+        return l1_gas * weighted_price // (16 * 10**6)
+
+class L1FeeModel:
+    """
+    L1 fee parameters read from the GasPriceOracle. They only change with L1
+    blocks, so a snapshot is reused for 'max_age' seconds. As with FeeOracle,
+    callers may batch param_calls() with other requests and pass the raw
+    results to update().
+    """
+
+    SELECTORS = ("l1BaseFee()", "blobBaseFee()", "baseFeeScalar()", "blobBaseFeeScalar()")
+
+    def __init__(self, w3: Web3, max_age: float = 12.0):
+        self.w3 = w3
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.data = None
+        self.expires = 0.0
+
+    def cached(self) -> Optional[L1FeeParams]:
+        """Returns the cached parameters, or None if they need a refresh"""
+        with self.lock:
+            return None if self.data is None or time.monotonic() >= self.expires else self.data
+
+    def params(self) -> L1FeeParams:
+        """Returns the cached parameters, refreshing them once they are stale"""
+        data = self.cached()
+        if data is None:
+            data = self.update([Web3.to_hex(self.w3.eth.call(params[0])) for _, params in self.param_calls()])
+        return data
+
+    def param_calls(self):
+        return [("eth_call", [{'to': GAS_PRICE_ORACLE, 'data': Web3.to_hex(Web3.keccak(text=sig)[:4])}, "latest"])
+                for sig in self.SELECTORS]
+
+    def update(self, results) -> L1FeeParams:
+        """Stores parameters from the raw JSON-RPC results of param_calls()"""
+        data = L1FeeParams(*(Web3.to_int(hexstr=r) for r in results))
+        with self.lock:
+            self.data = data
+            self.expires = time.monotonic() + self.max_age
+        return data
+
+def calldata_gas(data: bytes) -> int:
+    zeros = data.count(0)
+    return zeros * ZERO_BYTE_GAS + (len(data) - zeros) * NONZERO_BYTE_GAS
+
+def filled(op) -> dict:
+    """Copy of the op with unset gas fields and signature given worst-case values"""
+    op = dict(op)
+    for field in ('callGasLimit', 'verificationGasLimit', 'preVerificationGas'):
+        value = op.get(field)
+        if value is not None and (int(value, 16) if isinstance(value, str) else value) == 0:
+            op[field] = GAS_FILL
+    if not op.get('signature'):
+        op['signature'] = "0x" + "ff" * 65
+    return op
+
+def static_pvg(op) -> int:
+    """Calldata and overhead gas of including the op in a bundle"""
+    return packed_static_pvg(packed_op(filled(op)))
+
+def packed_static_pvg(fields) -> int:
+    """static_pvg() of an op already converted by packed_op(filled(op))"""
+    packed = ethabi.encode([PACKED_OP_TYPE], [fields])
+    return calldata_gas(packed) + TX_GAS + PER_OP_GAS + PER_OP_WORD_GAS * ((len(packed) + 31) // 32)
+
+def estimate_pvg(op, l1_params: L1FeeParams, base_fee: int) -> int:
+    """
+    preVerificationGas for Boba: the static part plus the L1 data fee of a
+    handleOps() transaction carrying the op, converted to L2 gas at the op's
+    effective gas price. A higher tip therefore needs less preVerificationGas.
+    """
+    fields = packed_op(filled(op))
+    tip = int.from_bytes(fields[6][:16], 'big')
+    max_fee = int.from_bytes(fields[6][16:], 'big')
+    gas_price = max(min(max_fee, base_fee + tip), 1)
+    tx_data = HANDLE_OPS + ethabi.encode([f"{PACKED_OP_TYPE}[]", 'address'], [[fields], fields[0]])
+    l1_fee = l1_params.l1_fee(tx_data)
+    return packed_static_pvg(fields) + -(-l1_fee // gas_price)
@@ -1,15 +1,105 @@
 import os
 import sys
+import time
+import inspect
+import threading
+from collections import OrderedDict
 from web3 import Web3
 from eth_abi import abi as ethabi
 import eth_account
-from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer, SimpleJSONRPCRequestHandler
+import jsonrpclib
+from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer, SimpleJSONRPCRequestHandler, \
+    validate_request
 from pathlib import Path
 import importlib
 
 class RequestHandler(SimpleJSONRPCRequestHandler):
     rpc_paths = ('/', '/hc')
 
+class BatchJSONRPCServer(SimpleJSONRPCServer):
+    """
+    JSON-RPC server which passes all calls to the same method within a batch
+    request to that method's batch handler, if one was registered. Other calls
+    are dispatched one at a time as in SimpleJSONRPCServer. A batch handler
+    may return a jsonrpclib.Fault in place of a result to fail a single call.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_funcs = {}
+
+    def register_batch_function(self, single, batch, name):
+        """Register 'batch' to handle a list of calls to the method 'name'"""
+        self.batch_funcs[name] = (inspect.signature(single), batch)
+
+    def _marshaled_dispatch(self, data, dispatch_method=None):
+        try:
+            request = jsonrpclib.loads(data)
+        except Exception:
+            request = None
+        if not isinstance(request, list) or not self.batch_funcs:
+            return super()._marshaled_dispatch(data, dispatch_method)
+
+        responses = [None] * len(request)
+        batches = {}
+        for i, entry in enumerate(request):
+            result = validate_request(entry)
+            if isinstance(result, jsonrpclib.Fault):
+                responses[i] = result.response()
+            elif entry['method'] in self.batch_funcs:
+                batches.setdefault(entry['method'], []).append(i)
+            else:
+                responses[i] = self._marshaled_single_dispatch(entry)
+
+        for method, idx in batches.items():
+            (sig, batch) = self.batch_funcs[method]
+            try:
+                # Named or positional params are normalized to the arguments of the single handler
+                calls = []
+                for i in idx:
+                    params = request[i]['params']
+                    bound = sig.bind(**params) if isinstance(params, dict) else sig.bind(*params)
+                    calls.append(bound.args)
+                results = batch(calls)
+                assert len(results) == len(idx)
+            except Exception as e:
+                print("BATCH FAILED", method, e)
+                for i in idx:
+                    responses[i] = self._marshaled_single_dispatch(request[i])
+                continue
+            for i, result in zip(idx, results):
+                if request[i].get('id') is None:
+                    continue  # Notification
+                responses[i] = jsonrpclib.dumps(result, methodresponse=True, rpcid=request[i]['id'])
+
+        responses = [r for r in responses if r is not None]
+        return '[%s]' % ','.join(responses) if responses else ''
+
+class ResultCache:
+    """Bounded LRU of (err_code, resp_payload) results with a TTL, for pure handlers"""
+    def __init__(self, max_entries=4096, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, result):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
 class HybridComputeSDK:
     def __init__(self):
         self.server = None
@@ -52,18 +142,53 @@ class HybridComputeSDK:
             raise ValueError(f"Invalid Ethereum address: {str(e)}")
 
     def create_json_rpc_server_instance(self, host='0.0.0.0', port=1234):
-        self.server = SimpleJSONRPCServer((host, port), requestHandler=RequestHandler)
+        self.server = BatchJSONRPCServer((host, port), requestHandler=RequestHandler)
         return self
 
-    def add_server_action(self, selector_name, action):
+    def add_server_action(self, selector_name, action, batch=None, pure=False,
+                          cache_size=4096, cache_ttl=60.0):
+        """Register a handler. An optional 'batch' function receives a list of argument
+           tuples for all calls to this method in one JSON-RPC batch and returns a list
+           of responses in the same order.
+
+           With pure=True, 'action' is instead a function of the request bytes alone,
+           returning (err_code, resp_payload). Its successful results are cached by request
+           bytes for cache_ttl seconds and only the signed response is generated per call."""
+        if pure:
+            action = self.pure_handler(selector_name, action, ResultCache(cache_size, cache_ttl))
         self.server.register_function(action, self.selector(selector_name))
+        if batch:
+            self.server.register_batch_function(action, batch, self.selector(selector_name))
         return self
 
+    def pure_handler(self, selector_name, compute, cache):
+        """Wrap a pure function of the request bytes as a JSON-RPC handler"""
+        sdk = self
+        def handler(ver, sk, src_addr, src_nonce, oo_nonce, payload, *args):
+            print(f"  -> {selector_name} called with subkey={sk} "
+                f"src_addr={src_addr} src_nonce={src_nonce} oo_nonce={oo_nonce} "
+                f"payload={payload} extra_args={args}"
+            )
+            assert ver == "0.3"
+            req = sdk.parse_req(sk, src_addr, src_nonce, oo_nonce, payload)
+            # The signature binds skey, srcAddr and the nonces, so only the
+            # payload is reused; gen_response runs for every request.
+            result = cache.get(req['reqBytes'])
+            if result is None:
+                result = compute(req['reqBytes'])
+                if result[0] == 0:  # Errors may be transient, so they are not cached
+                    cache.put(req['reqBytes'], result)
+            return sdk.gen_response(req, *result)
+        handler.cache = cache
+        return handler
+
     def import_handler(self, path):
         """Load an offchain handler"""
         mod_name = "handler_" + Path(path).stem
         spec = importlib.util.spec_from_file_location(mod_name, path)
         mod = importlib.util.module_from_spec(spec)
+        # Registered so that handler functions can be pickled, e.g. for a process pool
+        sys.modules[mod_name] = mod
         spec.loader.exec_module(mod)
         return mod.get_handlers()
 
@@ -74,7 +199,9 @@ class HybridComputeSDK:
                 continue
             methods = self.import_handler(dir_path+"/"+filename)
             for m in methods:
-                self.add_server_action(m[0], m[1])
+                # An optional third element holds extra registration options, e.g. {'batch': fn}
+                opts = m[2] if len(m) > 2 else {}
+                self.add_server_action(m[0], m[1], **opts)
 
     def serve_forever(self):
         if self.server:
@@ -0,0 +1,10 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+def http_session(pool_size=10):
+    """A requests.Session keeping up to 'pool_size' connections per host alive"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
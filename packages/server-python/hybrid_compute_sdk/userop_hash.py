@@ -0,0 +1,102 @@
+from typing import Any, Dict, Iterable, List, Tuple
+from eth_hash.auto import keccak
+from web3 import Web3
+
+EMPTY_HASH = keccak(b"")
+ZERO_PAD = bytes(12)
+
+def _int(v) -> int:
+    return v if isinstance(v, int) else int(v, 16)
+
+def _bytes(v) -> bytes:
+    if isinstance(v, (bytes, bytearray)):
+        return bytes(v)
+    return bytes.fromhex(v[2:] if v[:2] in ("0x", "0X") else v)
+
+def _hash_field(v) -> bytes:
+    """keccak of a dynamic bytes field, skipping the hash for the common empty value"""
+    b = _bytes(v) if v else b""
+    return keccak(b) if b else EMPTY_HASH
+
+def _packed_fields(op: Dict[str, Any]) -> Tuple[bytes, bytes, bytes, bytes]:
+    """(initCode, accountGasLimits, gasFees, paymasterAndData) of an op given in
+       either the bundler RPC form or the packed form"""
+    if 'initCode' in op:
+        init_code = _bytes(op['initCode']) if op['initCode'] else b""
+    elif op.get('factory'):
+        init_code = _bytes(op['factory']) + _bytes(op.get('factoryData') or "0x")
+    else:
+        init_code = b""
+
+    if 'accountGasLimits' in op:
+        account_gas_limits = _bytes(op['accountGasLimits'])
+    else:
+        account_gas_limits = _int(op['verificationGasLimit']).to_bytes(16, 'big') + \
+            _int(op['callGasLimit']).to_bytes(16, 'big')
+
+    if 'gasFees' in op:
+        gas_fees = _bytes(op['gasFees'])
+    else:
+        gas_fees = _int(op['maxPriorityFeePerGas']).to_bytes(16, 'big') + \
+            _int(op['maxFeePerGas']).to_bytes(16, 'big')
+
+    if 'paymasterAndData' in op:
+        pm_and_data = _bytes(op['paymasterAndData']) if op['paymasterAndData'] else b""
+    elif op.get('paymaster'):
+        pm_and_data = _bytes(op['paymaster']) + \
+            _int(op['paymasterVerificationGasLimit']).to_bytes(16, 'big') + \
+            _int(op['paymasterPostOpGasLimit']).to_bytes(16, 'big') + \
+            _bytes(op.get('paymasterData') or "0x")
+    else:
+        pm_and_data = b""
+
+    return init_code, account_gas_limits, gas_fees, pm_and_data
+
+def packed_op(op: Dict[str, Any]) -> Tuple:
+    """The op as an EntryPoint v0.7 PackedUserOperation tuple, e.g. for handleOps().
+       Accepts the same forms as UserOpHasher."""
+    (init_code, account_gas_limits, gas_fees, pm_and_data) = _packed_fields(op)
+    return (Web3.to_checksum_address(op['sender']), _int(op['nonce']), init_code, _bytes(op['callData']),
+            account_gas_limits, _int(op['preVerificationGas']), gas_fees, pm_and_data,
+            _bytes(op.get('signature') or "0x"))
+
+class UserOpHasher:
+    """
+    Computes EntryPoint v0.7 getUserOpHash() for one (entry point, chain ID).
+
+    Ops may be given in the bundler RPC form (verificationGasLimit, callGasLimit,
+    maxFeePerGas, ... and optional factory/paymaster fields) or with the packed
+    accountGasLimits, gasFees, initCode and paymasterAndData fields. Values may be
+    ints, hex strings or bytes. The PackedUserOperation words are assembled
+    directly rather than through the generic ABI encoder, and the domain
+    (entry point, chain ID) part of the outer hash is encoded once.
+    """
+
+    def __init__(self, entry_point: str, chain_id: int):
+        self.entry_point = Web3.to_checksum_address(entry_point)
+        self.chain_id = chain_id
+        self.domain = ZERO_PAD + _bytes(self.entry_point) + chain_id.to_bytes(32, 'big')
+
+    def pack(self, op: Dict[str, Any]) -> bytes:
+        """The ABI encoding of the op with its dynamic fields hashed"""
+        (init_code, account_gas_limits, gas_fees, pm_and_data) = _packed_fields(op)
+        return b"".join((
+            ZERO_PAD, _bytes(op['sender']),
+            _int(op['nonce']).to_bytes(32, 'big'),
+            keccak(init_code) if init_code else EMPTY_HASH,
+            _hash_field(op['callData']),
+            account_gas_limits,
+            _int(op['preVerificationGas']).to_bytes(32, 'big'),
+            gas_fees,
+            keccak(pm_and_data) if pm_and_data else EMPTY_HASH,
+        ))
+
+    def hash(self, op: Dict[str, Any]) -> bytes:
+        """getUserOpHash(op)"""
+        return keccak(keccak(self.pack(op)) + self.domain)
+
+    def hash_many(self, ops: Iterable[Dict[str, Any]]) -> List[bytes]:
+        """getUserOpHash() of each op, in order"""
+        domain = self.domain
+        pack = self.pack
+        return [keccak(keccak(pack(op)) + domain) for op in ops]
@@ -1,10 +1,12 @@
+import asyncio
 import os
 from typing import Dict, Any, Optional
-from web3 import Web3
+import aiohttp
+from web3 import AsyncWeb3, Web3
 from eth_abi import abi as ethabi
-import eth_account
 from eth_account import Account
-from eth_account.messages import encode_defunct
+from hybrid_compute_sdk.fee_oracle import get_fee_oracle
+from hybrid_compute_sdk.providers import make_async_provider, async_wait_for_receipt, async_batch_request, is_http
 
 # Account Factory ABI for creating smart accounts
 ACCOUNT_FACTORY_ABI = [
@@ -33,7 +35,15 @@ ACCOUNT_FACTORY_ABI = [
 ]
 
 class UserOpManager:
-    """Python equivalent of the TypeScript UserOpManager for managing smart account operations"""
+    """
+    Python equivalent of the TypeScript UserOpManager for managing smart account operations.
+
+    Node calls go through AsyncWeb3 and receipts are awaited without blocking
+    the event loop, so many lookups or account creations can run concurrently
+    with asyncio.gather(). Transaction nonces for the signing account are
+    allocated locally so that concurrent creations don't collide. Call close()
+    when done.
+    """
     
     def __init__(
         self,
@@ -42,6 +52,7 @@ class UserOpManager:
         entry_point: Optional[str] = None,
         chain_id: Optional[int] = None,
         private_key: Optional[str] = None,
+        max_connections: int = 100,
     ):
         # Use environment variables with fallbacks to constructor parameters
         self.node_url = node_url or os.getenv('RPC_URL', 'https://sepolia.boba.network')
@@ -53,14 +64,22 @@ class UserOpManager:
         if not self.private_key:
             raise ValueError("Private key must be provided either as parameter or via OC_PRIVKEY or CLIENT_PRIVATE_KEY environment variable")
         
-        # Initialize Web3 connection
-        self.w3 = Web3(Web3.HTTPProvider(self.node_url))
-        if not self.w3.is_connected:
-            raise ConnectionError(f"Failed to connect to node at {self.node_url}")
+        # AsyncWeb3 connection (HTTP, WebSocket or IPC), checked on first use by connect()
+        self.w3 = AsyncWeb3(make_async_provider(self.node_url))
+        self.fee_oracle = get_fee_oracle(self.w3)
+        self.fee_lock = asyncio.Lock()
+        self.connected = False
+        self.connect_lock = asyncio.Lock()
+        self.max_connections = max_connections
+        self.session = None
         
         # Create account from private key
         self.account = Account.from_key(self.private_key)
         
+        # Next transaction nonce of the account, None until read from the node
+        self.next_nonce = None
+        self.nonce_lock = asyncio.Lock()
+        
         # Constants
         self.entrypoint_v7 = "0x0000000071727De22E5E9d8BAf0edAc6f37da032"
         self.factory_address = "0x9aC904d8DfeA0866aB341208700dCA9207834DeB"
@@ -71,6 +90,33 @@ class UserOpManager:
             abi=ACCOUNT_FACTORY_ABI
         )
     
+    async def connect(self) -> None:
+        """Opens the node connection (for WebSocket and IPC nodes) and checks it, once"""
+        async with self.connect_lock:
+            if self.connected:
+                return
+            if getattr(self.w3.provider, 'has_persistent_connection', False) is True:
+                await self.w3.provider.connect()
+            elif is_http(self.node_url):
+                # As in AsyncAAUtils, AsyncWeb3 uses a session we own and can close
+                self.session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=self.max_connections),
+                    timeout=aiohttp.ClientTimeout(total=30))
+                await self.w3.provider.cache_async_session(self.session)
+            if not await self.w3.is_connected():
+                await self.close()
+                raise ConnectionError(f"Failed to connect to node at {self.node_url}")
+            self.connected = True
+    
+    async def close(self) -> None:
+        """Closes the node connection"""
+        if getattr(self.w3.provider, 'has_persistent_connection', False) is True:
+            await self.w3.provider.disconnect()
+        if self.session:
+            await self.session.close()
+            self.session = None
+        self.connected = False
+    
     def selector(self, signature: str) -> str:
         """Generate function selector from signature"""
         name_hash = Web3.keccak(text=signature)
@@ -88,6 +134,44 @@ class UserOpManager:
         """Check if this is a v0.7 entry point"""
         return self.entry_point.lower() == self.entrypoint_v7.lower()
     
+    async def gas_price(self) -> int:
+        """Legacy gas price from the shared fee snapshot, refreshed in one batched request"""
+        fees = self.fee_oracle.cached()
+        if fees is None:
+            # Concurrent callers wait for one refresh rather than each making their own
+            async with self.fee_lock:
+                fees = self.fee_oracle.cached()
+                if fees is None:
+                    responses = await async_batch_request(self.w3.provider, self.fee_oracle.fee_calls())
+                    fees = self.fee_oracle.update([r['result'] for r in responses])
+        return fees.gas_price
+    
+    async def allocate_nonce(self) -> int:
+        """Next transaction nonce of the account, read from the node once and then counted locally"""
+        async with self.nonce_lock:
+            if self.next_nonce is None:
+                self.next_nonce = await self.w3.eth.get_transaction_count(
+                    self.account.address,
+                    block_identifier='pending'
+                )
+            nonce = self.next_nonce
+            self.next_nonce += 1
+            return nonce
+    
+    def resync_nonce(self) -> None:
+        """Re-reads the nonce from the node on the next allocation, e.g. after a rejected transaction"""
+        self.next_nonce = None
+    
+    async def send_transaction(self, transaction: Dict[str, Any]) -> bytes:
+        """Signs and sends a transaction with the next nonce. Returns its hash."""
+        transaction['nonce'] = await self.allocate_nonce()
+        signed_txn = self.account.sign_transaction(transaction)
+        try:
+            return await self.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
+        except Exception:
+            self.resync_nonce()
+            raise
+    
     async def create_smart_account(
         self, 
         salt: int, 
@@ -106,83 +190,62 @@ class UserOpManager:
         # Owner is either explicitly set, or derived from the PK
         new_owner = owner_address if owner_address else self.account.address
         
-        # Get the expected smart account address
-        smart_account_address = await self.get_expected_address(salt, new_owner)
-        
-        print(f"New Address: {smart_account_address}")
-        
         # Prepare transaction data
-        create_account_data = self.factory_contract.encodeABI(
-            fn_name="createAccount",
+        create_account_data = self.factory_contract.encode_abi(
+            "createAccount",
             args=[new_owner, salt]
         )
         
-        # Estimate gas
-        gas_estimate = self.w3.eth.estimate_gas({
-            'from': self.account.address,
-            'to': self.factory_address,
-            'data': create_account_data
-        })
+        # The expected address, gas estimate and gas price are independent
+        await self.connect()
+        smart_account_address, gas_estimate, gas_price = await asyncio.gather(
+            self.get_expected_address(salt, new_owner),
+            self.w3.eth.estimate_gas({
+                'from': self.account.address,
+                'to': self.factory_address,
+                'data': create_account_data
+            }),
+            self.gas_price()
+        )
         
-        # Build and sign transaction
+        print(f"New Address: {smart_account_address}")
+        
+        # Build, sign and send transaction
         transaction = {
             'from': self.account.address,
             'to': self.factory_address,
             'data': create_account_data,
             'gas': gas_estimate,
-            'nonce': self.w3.eth.get_transaction_count(self.account.address),
-            'chainId': self.chain_id
+            'chainId': self.chain_id,
+            'gasPrice': gas_price
         }
-        
-        # Get current gas price
-        gas_price = self.w3.eth.gas_price
-        transaction['gasPrice'] = gas_price
-        
-        # Sign and send transaction
-        signed_txn = self.w3.eth.account.sign_transaction(transaction, self.private_key)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
+        tx_hash = await self.send_transaction(transaction)
         
         # Wait for transaction receipt
-        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = await async_wait_for_receipt(self.w3, tx_hash)
         
         # Fund the new account with 0.001 ETH
         funding_amount = Web3.to_wei(0.001, 'ether')
+        fund_transaction = {
+            'from': self.account.address,
+            'to': smart_account_address,
+            'value': funding_amount,
+            'gas': 21000,  # Standard transfer gas
+            'chainId': self.chain_id,
+            'gasPrice': gas_price
+        }
         
         try:
-            # Get pending nonce for funding transaction
-            pending_nonce = self.w3.eth.get_transaction_count(
-                self.account.address, 
-                block_identifier='pending'
-            )
-            
-            fund_transaction = {
-                'from': self.account.address,
-                'to': smart_account_address,
-                'value': funding_amount,
-                'gas': 21000,  # Standard transfer gas
-                'nonce': pending_nonce,
-                'chainId': self.chain_id,
-                'gasPrice': gas_price
-            }
-            
-            signed_fund_txn = self.w3.eth.account.sign_transaction(fund_transaction, self.private_key)
-            fund_hash = self.w3.eth.send_raw_transaction(signed_fund_txn.rawTransaction)
-            fund_receipt = self.w3.eth.wait_for_transaction_receipt(fund_hash)
+            fund_hash = await self.send_transaction(fund_transaction)
+            fund_receipt = await async_wait_for_receipt(self.w3, fund_hash)
             print(f"Funded {smart_account_address} with 0.001 ETH: {fund_hash.hex()}")
             
         except Exception as err:
             error_msg = str(err)
             if "nonce too low" in error_msg.lower():
-                # Retry with updated nonce
-                nonce2 = self.w3.eth.get_transaction_count(
-                    self.account.address, 
-                    block_identifier='pending'
-                )
-                
-                fund_transaction['nonce'] = nonce2
-                signed_fund_txn = self.w3.eth.account.sign_transaction(fund_transaction, self.private_key)
-                fund_hash = self.w3.eth.send_raw_transaction(signed_fund_txn.rawTransaction)
-                fund_receipt = self.w3.eth.wait_for_transaction_receipt(fund_hash)
+                # Retry with a nonce re-read from the node
+                fund_hash = await self.send_transaction(fund_transaction)
+                fund_receipt = await async_wait_for_receipt(self.w3, fund_hash)
                 print(f"Funded on retry: {fund_hash.hex()}")
             else:
                 raise err
@@ -210,7 +273,8 @@ class UserOpManager:
         owner = owner_address if owner_address else self.account.address
         
         # Call the factory contract to get the expected address
-        expected_address = self.factory_contract.functions.getAddress(owner, salt).call()
+        await self.connect()
+        expected_address = await self.factory_contract.functions.getAddress(owner, salt).call()
         
         return expected_address
     
@@ -225,11 +289,12 @@ class UserOpManager:
             Owner address
         """
         # Call the getOwner function (selector: 0x8da5cb5b)
-        result = self.w3.eth.call({
+        await self.connect()
+        result = await self.w3.eth.call({
             'to': contract_address,
             'data': '0x8da5cb5b'
         })
         
         # Decode the result to get the owner address
-        owner_address = self.w3.codec.decode_single('address', result)
+        owner_address = Web3.to_checksum_address(ethabi.decode(['address'], result)[0])
         return owner_address
@@ -1,6 +1,9 @@
 """Offchain handler for the Hybrid Compute word generator + guessing game"""
+import mmap
+import os
 import re
 import random
+import struct
 from web3 import Web3
 from eth_abi import abi as ethabi
 from hybrid_compute_sdk.server import HybridComputeSDK
@@ -10,16 +13,94 @@ def get_handlers():
     print("--> ramble(uint256,bool)")
     return [("ramble(uint256,bool)", offchain_ramble)]
 
-wordlist = []
-def load_words():
-    """Loads a list of dictionary words, assumes a standard file path"""
-    with open("/usr/share/dict/words", "r", encoding="utf-8") as f:
-        p = re.compile('^[a-z]{4}$')
-        for line in f.readlines():
+words_path = os.environ.get('OC_WORDS_FILE', "/usr/share/dict/words")
+index_path = os.environ.get('OC_WORDS_INDEX', "/tmp/hc_ramble_words.idx")
+
+# The word index is a header followed by fixed-width 64-byte records, one per
+# word. Each record is the word's ABI tail within a string[] (its length word
+# followed by the data padded to 32 bytes), so responses are assembled by
+# slicing the memory-mapped index, which all worker processes share through
+# the page cache. The header records the size and mtime of the source
+# dictionary so the index is only rebuilt when the dictionary changes.
+INDEX_MAGIC = b"HCW2"
+INDEX_HEADER = struct.Struct("<4sQQI")
+WORD_LEN = 4
+TAIL_LEN = 64
+
+def abi_tail(word):
+    """ABI tail of a string element: length word plus padded data"""
+    return len(word).to_bytes(32, 'big') + word.ljust(32, b"\0")
+
+word_index = None
+word_count = 0
+
+def build_index():
+    """Scans the dictionary and atomically writes a new word index"""
+    st = os.stat(words_path)
+    p = re.compile('^[a-z]{4}$')
+    records = []
+    with open(words_path, "r", encoding="utf-8") as f:
+        for line in f:
             line = line.strip()
             if p.match(line) and line != "frog": # Reserved for "cheat" mode
-                wordlist.append(line)
-    return wordlist
+                records.append(abi_tail(line.encode("ascii")))
+
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, st.st_size, st.st_mtime_ns, len(records)))
+        f.write(b"".join(records))
+    os.replace(tmp_path, index_path)
+    print("Built word index", index_path, "with", len(records), "words")
+
+def index_is_current():
+    """True if the index exists and matches the current dictionary file"""
+    try:
+        with open(index_path, "rb") as f:
+            (magic, size, mtime, count) = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        index_size = os.stat(index_path).st_size
+    except (OSError, struct.error):
+        return False
+    if magic != INDEX_MAGIC or index_size != INDEX_HEADER.size + TAIL_LEN * count:
+        return False
+    try:
+        st = os.stat(words_path)
+    except FileNotFoundError:
+        return True  # A prebuilt index may be used without the dictionary
+    return (st.st_size, st.st_mtime_ns) == (size, mtime)
+
+def load_words():
+    """Memory-maps the word index, rebuilding it first if the dictionary has changed"""
+    global word_index, word_count  # pylint: disable=global-statement
+    if not index_is_current():
+        build_index()
+    with open(index_path, "rb") as f:
+        word_index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    (_, _, _, word_count) = INDEX_HEADER.unpack_from(word_index)
+    return word_count
+
+def tail_at(i):
+    """ABI tail of word number i from the index"""
+    off = INDEX_HEADER.size + TAIL_LEN * i
+    return word_index[off:off + TAIL_LEN]
+
+# Pre-encoded pieces of the string[] response. The head offsets depend only on
+# the array length, and are sliced from a table of all multiples of 32 that
+# can occur.
+MAX_WORDS = 999
+ARRAY_OFFSET = (32).to_bytes(32, 'big')
+OFFSET_WORDS = [(32 * i).to_bytes(32, 'big') for i in range(3 * MAX_WORDS)]
+FROG_TAIL = abi_tail(b"frog")
+
+def encode_words(idx, cheat_pos=None):
+    """Byte-identical to ethabi.encode(['string[]'], [words]) for the words at the
+       given index positions, optionally replacing one position with "frog"."""
+    n = len(idx)
+    tails = [tail_at(i) for i in idx]
+    if cheat_pos is not None:
+        tails[cheat_pos] = FROG_TAIL
+    # Element i starts at 32*n + 64*i bytes after the length word
+    return ARRAY_OFFSET + n.to_bytes(32, 'big') + \
+        b"".join(OFFSET_WORDS[n:3 * n:2]) + b"".join(tails)
 
 def offchain_ramble(ver, sk, src_addr, src_nonce, oo_nonce, payload, *args):
     """Generates a random list of words, cheating if requested to do so"""
@@ -35,19 +116,15 @@ def offchain_ramble(ver, sk, src_addr, src_nonce, oo_nonce, payload, *args):
     try:
         req = sdk.parse_req(sk, src_addr, src_nonce, oo_nonce, payload)
         (n, cheat) = ethabi.decode(['uint256', 'bool'], req['reqBytes'])
-        words = []
-
-        if 1 <= n < 1000:
-            for _i in range(n):
-                r = random.randint(0, len(wordlist)-1)
-                words.append(wordlist[r])
 
+        if 1 <= n <= MAX_WORDS:
+            idx = random.choices(range(word_count), k=n)
+            pos = None
             if cheat:
-                pos = random.randint(0, len(words)-1)
+                pos = random.randint(0, n-1)
                 print("Cheat at position", pos)
-                words[pos] = "frog"
 
-            resp = ethabi.encode(['string[]'], [words])
+            resp = encode_words(idx, pos)
             err_code = 0
         else:
             print("Invalid length", n)
@@ -1,7 +1,13 @@
 """Offchain handler for the Hybrid Compute sports betting example"""
+import os
 from web3 import Web3
 from eth_abi import abi as ethabi
 from hybrid_compute_sdk.server import HybridComputeSDK
+from hybrid_compute_sdk.fetch import get_fetcher
+
+# Score API URL template, e.g. "https://scores.example.com/games/{game_id}",
+# returning {"score": [home, away]}. Without it the demo scores below are used.
+score_api = os.environ.get('OC_SPORTS_API')
 
 def get_handlers():
     """Return the method signatures and the associated handlers"""
@@ -36,6 +42,7 @@ def offchain_sports_betting(ver, sk, src_addr, src_nonce, oo_nonce, payload, *ar
         print("End result: ", end_result)
         resp = ethabi.encode(['uint256'], [end_result])
     except Exception as e:
+        # Includes FetchError, raised immediately while the score API is down
         resp = ethabi.encode(["bool"], [False])
         err_code = 1
         print("DECODE FAILED", e)
@@ -44,10 +51,12 @@ def offchain_sports_betting(ver, sk, src_addr, src_nonce, oo_nonce, payload, *ar
 
 def get_game_score(game_id):
     """
-    This is a dummy function to simulate the offchain data retrieval
-    In a real-world scenario, this function would query an API
-    to get the game score
+    Query the score API for a game. Repeat lookups are served from the
+    fetcher's cache. If no API is configured this simulates the offchain
+    data retrieval with fixed scores.
     """
+    if score_api:
+        return get_fetcher().get_json(score_api.format(game_id=game_id))['score']
     if game_id == "123":
         return [2, 1]
     if game_id == "456":
@@ -4,8 +4,12 @@ Offchain handler to support HybridCompute auto-registration protocol
 
 import os
 from web3 import Web3
+from eth_abi import abi as ethabi
+from hybrid_compute_sdk.server import HybridComputeSDK
+from hybrid_compute_sdk.membership import AddressSet
 
-allow_reg = []
+allow_reg = AddressSet()
+allow_any = False
 
 def get_handlers():
     """Return the method signatures and the associated handlers"""
@@ -14,17 +18,25 @@ def get_handlers():
 
 
 def load_allow_reg():
-    """ Load a list of accounts permitted to register this server """
+    """ Load a list of accounts permitted to register this server. A large list
+        may be given as an address index file in OC_ALLOW_REG_FILE instead of
+        OC_ALLOW_REG, but not both. """
+    global allow_reg, allow_any  # pylint: disable=global-statement
+    if 'OC_ALLOW_REG' in os.environ and 'OC_ALLOW_REG_FILE' in os.environ:
+        raise ValueError("Only one of OC_ALLOW_REG and OC_ALLOW_REG_FILE may be set")
     allow_reg_list = ""
     if 'OC_ALLOW_REG' in os.environ:
         allow_reg_list = os.environ['OC_ALLOW_REG']
     if allow_reg_list == "Any":
         # Special case for dev/test
-        allow_reg.append("Any")
+        allow_any = True
+    elif 'OC_ALLOW_REG_FILE' in os.environ:
+        allow_reg = AddressSet(os.environ['OC_ALLOW_REG_FILE'])
+        allow_reg_list = f"{len(allow_reg)} addresses from {os.environ['OC_ALLOW_REG_FILE']}"
     elif allow_reg_list:
         for a in allow_reg_list.split():
             assert a == Web3.to_checksum_address(a)
-            allow_reg.append(a)
+        allow_reg = AddressSet.from_addresses(allow_reg_list.split())
     return allow_reg_list
 
 def sys_register_caller(ver, sk, src_addr, src_nonce, oo_nonce, payload, *args):
@@ -46,7 +58,7 @@ def sys_register_caller(ver, sk, src_addr, src_nonce, oo_nonce, payload, *args):
         print("Registration request for", addr, url)
         err_code = 0
 
-        if Web3.to_checksum_address(addr) in allow_reg or "Any" in allow_reg:
+        if allow_any or addr in allow_reg:
             resp_ok = True
         else:
             print(f"WARN Rejecting registration request for {addr}->{url}")
@@ -57,5 +69,4 @@ def sys_register_caller(ver, sk, src_addr, src_nonce, oo_nonce, payload, *args):
 
     return sdk.gen_response(req, err_code, resp)
 
-allow_reg = load_allow_reg()
-print("Allowed registration list:", allow_reg or "[]")
+print("Allowed registration list:", load_allow_reg() or "[]")
@@ -6,10 +6,16 @@ random number.
 Reference: https://eprint.iacr.org/2017/099.pdf
 """
 
+import atexit
 import os
+import secrets
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from web3 import Web3
 from eth_abi import abi as ethabi
+from jsonrpclib import Fault
 from hybrid_compute_sdk.server import HybridComputeSDK
+from hybrid_compute_sdk.node_client import NodeClient
 
 # --------------------------------------
 from fastecdsa import curve,keys,util,point
@@ -17,11 +23,18 @@ from eth_keys import keys as ethkeys
 
 rand_key_hex = os.environ['OC_RANDOM_SECRET']
 oc_node_http = os.environ['OC_NODE_HTTP']
+# OC_NODE_HTTP may list several comma-separated nodes; block reads fail over
+# between them and go to whichever node already has the block
+oc_node = NodeClient(oc_node_http, timeout=900)
+
+# Number of worker processes used by make_proofs(). Defaults to one per core.
+vrf_workers = int(os.environ.get('OC_VRF_WORKERS', os.cpu_count() or 1))
 
 def get_handlers():
     """Return the method signatures and the associated handlers"""
     print("--> random(uint256,bytes32)")
-    return [("random(uint256,bytes32)", offchain_random)]
+    start_proof_pool()
+    return [("random(uint256,bytes32)", offchain_random, {'batch': offchain_random_batch})]
 
 assert len(rand_key_hex) == 66
 
@@ -119,15 +132,15 @@ def scalar_from_curve_points(h, pk, gamma, u_witness, v):
     c_hex = Web3.to_hex(Web3.keccak(Web3.to_bytes(hexstr=c_pre_hash)))
     return Web3.to_int(hexstr=c_hex)
 
-def make_proof(sk, pk, seed):
-    """Construct the VRF proof"""
+def make_proof(sk, pk, seed, nonce=None):
+    """Construct the VRF proof. A fixed nonce may be given to make the proof deterministic."""
     proof = {}
     proof['seed'] = seed
 
     h = hash_to_curve(pk, seed)
     proof['gamma'] = h * sk
 
-    sm = keys.gen_private_key(curve.secp256k1)
+    sm = keys.gen_private_key(curve.secp256k1) if nonce is None else nonce
     u = G * sm
     proof['uWitness'] = point_ethereum_address(u)
 
@@ -203,6 +216,293 @@ def verify_proof(pk, proof):
     dc = scalar_from_curve_points(h, pk, proof['gamma'], proof['uWitness'], v)
     assert proof['c'] == dc
 
+# Batch verification. The two scalar multiplication checks of every proof,
+# c*gamma == cGammaWitness and s*hash == sHashWitness, are combined with
+# independent random 128-bit weights into a single multi-scalar multiplication
+# which must sum to the point at infinity. Points are kept in Jacobian
+# coordinates (None is the point at infinity) to avoid a field inversion
+# per addition.
+
+def jacobian_double(p):
+    """Double a Jacobian point on secp256k1 (a=0)"""
+    if p is None or p[1] == 0:
+        return None
+    (x, y, z) = p
+    a = x * x % FIELD_SIZE
+    b = y * y % FIELD_SIZE
+    c = b * b % FIELD_SIZE
+    d = 2 * ((x + b) * (x + b) - a - c) % FIELD_SIZE
+    e = 3 * a % FIELD_SIZE
+    x3 = (e * e - 2 * d) % FIELD_SIZE
+    y3 = (e * (d - x3) - 8 * c) % FIELD_SIZE
+    z3 = 2 * y * z % FIELD_SIZE
+    return (x3, y3, z3)
+
+def jacobian_add(p, q):
+    """Add a Jacobian point p and an affine point q, given as (x, y)"""
+    if p is None:
+        return (q[0], q[1], 1)
+    (x1, y1, z1) = p
+    zz = z1 * z1 % FIELD_SIZE
+    h = (q[0] * zz - x1) % FIELD_SIZE
+    r = (q[1] * z1 * zz - y1) % FIELD_SIZE
+    if h == 0:
+        return jacobian_double(p) if r == 0 else None
+    hh = h * h % FIELD_SIZE
+    hhh = h * hh % FIELD_SIZE
+    v = x1 * hh % FIELD_SIZE
+    x3 = (r * r - hhh - 2 * v) % FIELD_SIZE
+    y3 = (r * (v - x3) - y1 * hhh) % FIELD_SIZE
+    return (x3, y3, z1 * h % FIELD_SIZE)
+
+def jacobian_add_full(p, q):
+    """Add two Jacobian points"""
+    if p is None:
+        return q
+    if q is None:
+        return p
+    (x1, y1, z1) = p
+    (x2, y2, z2) = q
+    z1z1 = z1 * z1 % FIELD_SIZE
+    z2z2 = z2 * z2 % FIELD_SIZE
+    u1 = x1 * z2z2 % FIELD_SIZE
+    s1 = y1 * z2 * z2z2 % FIELD_SIZE
+    h = (x2 * z1z1 - u1) % FIELD_SIZE
+    r = (y2 * z1 * z1z1 - s1) % FIELD_SIZE
+    if h == 0:
+        return jacobian_double(p) if r == 0 else None
+    hh = h * h % FIELD_SIZE
+    hhh = h * hh % FIELD_SIZE
+    v = u1 * hh % FIELD_SIZE
+    x3 = (r * r - hhh - 2 * v) % FIELD_SIZE
+    y3 = (r * (v - x3) - s1 * hhh) % FIELD_SIZE
+    return (x3, y3, z1 * z2 * h % FIELD_SIZE)
+
+def jacobian_to_affine(p):
+    """Convert a Jacobian point back to a fastecdsa Point"""
+    z_inv = pow(p[2], -1, FIELD_SIZE)
+    zz_inv = z_inv * z_inv % FIELD_SIZE
+    return point.Point(p[0] * zz_inv % FIELD_SIZE, p[1] * zz_inv * z_inv % FIELD_SIZE,
+        curve.secp256k1)
+
+def signed_digits(k, width, count):
+    """Split a scalar into 'count' signed base-2^width digits"""
+    half = 1 << (width - 1)
+    mask = (1 << width) - 1
+    digits = []
+    for _ in range(count):
+        d = k & mask
+        k >>= width
+        if d > half:
+            d -= 1 << width
+            k += 1
+        digits.append(d)
+    return digits
+
+def multi_scalar_mul(terms):
+    """Pippenger bucket method for the sum of k*P over a list of (k, (x, y)) terms"""
+    width = max(2, min(12, (len(terms).bit_length() * 2) // 3 + 2))
+    count = 256 // width + 2
+    digits = [signed_digits(k % GROUP_ORDER, width, count) for (k, _) in terms]
+    result = None
+    for w in reversed(range(count)):
+        for _ in range(width):
+            result = jacobian_double(result)
+        buckets = [None] * ((1 << (width - 1)) + 1)
+        for (d, (_, (x, y))) in zip((ds[w] for ds in digits), terms):
+            if d > 0:
+                buckets[d] = jacobian_add(buckets[d], (x, y))
+            elif d < 0:
+                buckets[-d] = jacobian_add(buckets[-d], (x, FIELD_SIZE - y))
+        running = None
+        window_sum = None
+        for b in reversed(buckets[1:]):
+            running = jacobian_add_full(running, b)
+            window_sum = jacobian_add_full(window_sum, running)
+        result = jacobian_add_full(result, window_sum)
+    return result
+
+FIXED_BASE_WIDTH = 8
+fixed_base_tables = {}
+
+def fixed_base_table(b):
+    """Precompute d * 2^(8*j) * b for each window j and digit d, for repeated use of base b"""
+    key = (b.x, b.y)
+    if key not in fixed_base_tables:
+        table = []
+        base = (b.x, b.y, 1)
+        for _ in range(256 // FIXED_BASE_WIDTH + 2):
+            row = [None]
+            acc = None
+            for _ in range(1 << (FIXED_BASE_WIDTH - 1)):
+                acc = jacobian_add_full(acc, base)
+                p = jacobian_to_affine(acc)
+                row.append((p.x, p.y))
+            table.append(row)
+            for _ in range(FIXED_BASE_WIDTH):
+                base = jacobian_double(base)
+        fixed_base_tables[key] = table
+    return fixed_base_tables[key]
+
+def fixed_base_mul(table, k, acc=None):
+    """Add k*b to the Jacobian point acc, using a table from fixed_base_table(b)"""
+    digits = signed_digits(k % GROUP_ORDER, FIXED_BASE_WIDTH, len(table))
+    for (d, row) in zip(digits, table):
+        if d > 0:
+            acc = jacobian_add(acc, row[d])
+        elif d < 0:
+            acc = jacobian_add(acc, (row[-d][0], FIELD_SIZE - row[-d][1]))
+    return acc
+
+def precheck_proof(pk, proof, pk_table, g_table):
+    """The per-proof checks of verify_proof other than the two scalar multiplications.
+       Returns the hash point for use in the batch equation."""
+    for p in (pk, proof['gamma'], proof['cGammaWitness'], proof['sHashWitness']):
+        assert curve.secp256k1.is_point_on_curve((p.x, p.y))
+
+    # addr(c*pk+s*g) == uWitness, computed directly rather than through ecrecover
+    u = fixed_base_mul(g_table, proof['s'], fixed_base_mul(pk_table, proof['c']))
+    assert u is not None
+    assert point_ethereum_address(jacobian_to_affine(u)) == proof['uWitness']
+
+    h = hash_to_curve(pk, proof['seed'])
+    assert proof['gamma'].x % FIELD_SIZE != h.x % FIELD_SIZE
+
+    v = proof['cGammaWitness'] + proof['sHashWitness']
+    (_, _, az) = projective_add(proof['cGammaWitness'], proof['sHashWitness'])
+    assert (az * proof['zInv']) % FIELD_SIZE == 1
+
+    assert proof['c'] == scalar_from_curve_points(h, pk, proof['gamma'], proof['uWitness'], v)
+    return h
+
+def verify_proofs(pk, proofs):
+    """Verify a list of proofs made with the same key. Returns a list of booleans in the
+       same order. The scalar multiplication checks are done as one randomized batch;
+       if the batch fails each proof is checked again with verify_proof()."""
+    pk_table = fixed_base_table(pk)
+    g_table = fixed_base_table(G)
+    ok = [False] * len(proofs)
+    terms = []
+    for (i, proof) in enumerate(proofs):
+        try:
+            h = precheck_proof(pk, proof, pk_table, g_table)
+        except Exception:  # pylint: disable=broad-except
+            continue
+        ok[i] = True
+        r1 = secrets.randbits(128)
+        r2 = secrets.randbits(128)
+        cgw = proof['cGammaWitness']
+        shw = proof['sHashWitness']
+        terms.append((r1 * proof['c'], (proof['gamma'].x, proof['gamma'].y)))
+        terms.append((r1, (cgw.x, FIELD_SIZE - cgw.y)))
+        terms.append((r2 * proof['s'], (h.x, h.y)))
+        terms.append((r2, (shw.x, FIELD_SIZE - shw.y)))
+
+    if terms and multi_scalar_mul(terms) is not None:
+        print("Batch verification failed, checking proofs individually")
+        for (i, proof) in enumerate(proofs):
+            if ok[i]:
+                try:
+                    verify_proof(pk, proof)
+                except Exception:  # pylint: disable=broad-except
+                    ok[i] = False
+    return ok
+
+def proof_worker(sk, pk_xy, seed, nonce=None):
+    """Generate and verify one proof in a worker process. fastecdsa Points can not
+       be pickled, so they are passed and returned as (x,y) tuples."""
+    pk = point.Point(pk_xy[0], pk_xy[1], curve.secp256k1)
+    proof = make_proof(sk, pk, seed, nonce)
+    verify_proof(pk, proof)
+    return {k: (v.x, v.y) if isinstance(v, point.Point) else v for k, v in proof.items()}
+
+proof_pool = None
+
+def start_proof_pool():
+    """Start the make_proofs() worker processes. They are forked so that they
+       inherit the loaded handler module rather than re-importing it, which is
+       only safe before the server has started any threads. get_handlers()
+       therefore starts them while the server is being set up."""
+    global proof_pool  # pylint: disable=global-statement
+    if proof_pool is not None or vrf_workers <= 1:
+        return
+    proof_pool = ProcessPoolExecutor(max_workers=vrf_workers,
+        mp_context=multiprocessing.get_context("fork"))
+    # With "fork" all workers are launched on the first submission
+    proof_pool.submit(int).result()
+    atexit.register(stop_proof_pool)
+
+def stop_proof_pool():
+    """Shut down the make_proofs() worker processes"""
+    global proof_pool  # pylint: disable=global-statement
+    if proof_pool is not None:
+        proof_pool.shutdown()
+        proof_pool = None
+
+def make_proofs(seeds, sk=None, pk=None, nonces=None):
+    """Construct and verify VRF proofs for a list of seeds using a process pool.
+       Proofs are returned in the same order as the seeds."""
+    if sk is None:
+        (sk, pk) = (rand_key, pub_key)
+    if nonces is None:
+        nonces = [None] * len(seeds)
+
+    if len(seeds) <= 1 or vrf_workers <= 1:
+        proofs = [make_proof(sk, pk, seed, nonce) for (seed, nonce) in zip(seeds, nonces)]
+        for proof in proofs:
+            verify_proof(pk, proof)
+        return proofs
+
+    start_proof_pool()  # For callers such as vrf_bench.py which skip get_handlers()
+    n = len(seeds)
+    raw = proof_pool.map(proof_worker, [sk] * n, [(pk.x, pk.y)] * n, seeds, nonces,
+        chunksize=max(1, n // (4 * vrf_workers)))
+    return [{k: point.Point(v[0], v[1], curve.secp256k1) if isinstance(v, tuple) else v
+             for k, v in r.items()} for r in raw]
+
+def encode_proof(proof):
+    """ABI-encode a proof as the response payload expected by the VRF contract"""
+    return ethabi.encode([
+      'uint256[2]',
+      'uint256[2]',
+      'uint256',
+      'uint256',
+      'uint256',
+      'address',
+      'uint256[2]',
+      'uint256[2]',
+      'uint256'
+    ],[
+      [pub_key.x,pub_key.y],
+      [proof['gamma'].x,proof['gamma'].y],
+      proof['c'],
+      proof['s'],
+      proof['seed'],
+      proof['uWitness'],
+      [proof['cGammaWitness'].x, proof['cGammaWitness'].y],
+      [proof['sHashWitness'].x, proof['sHashWitness'].y],
+      proof['zInv']
+    ])
+
+def decode_proof(resp):
+    """Inverse of encode_proof. Returns the public key and the proof, with proof['seed']
+       holding the client seed as sent to the contract."""
+    (pk, gamma, c, s, seed, u_witness, cgw, shw, z_inv) = ethabi.decode([
+      'uint256[2]', 'uint256[2]', 'uint256', 'uint256', 'uint256',
+      'address', 'uint256[2]', 'uint256[2]', 'uint256'
+    ], resp)
+    proof = {
+      'gamma': point.Point(gamma[0], gamma[1], curve.secp256k1),
+      'c': c,
+      's': s,
+      'seed': seed,
+      'uWitness': u_witness.lower(),
+      'cGammaWitness': point.Point(cgw[0], cgw[1], curve.secp256k1),
+      'sHashWitness': point.Point(shw[0], shw[1], curve.secp256k1),
+      'zInv': z_inv,
+    }
+    return point.Point(pk[0], pk[1], curve.secp256k1), proof
+
 rand_key = Web3.to_int(hexstr=rand_key_hex)
 pub_key = G * rand_key
 pub_key_hash = Web3.keccak(ethabi.encode(['uint256','uint256'],[pub_key.x,pub_key.y]))
@@ -219,13 +519,10 @@ def offchain_random(ver, sk, src_addr, src_nonce, oo_nonce, payload, *args):
     assert ver == "0.3"
     sdk = HybridComputeSDK()
     try:
-        w3 = Web3(Web3.HTTPProvider(oc_node_http, request_kwargs={'timeout': 900}))
-        assert w3.is_connected
-
         req = sdk.parse_req(sk, src_addr, src_nonce, oo_nonce, payload)
         (bn, req_seed) = ethabi.decode(['uint256', 'bytes32'], req['reqBytes'])
 
-        bh = Web3.to_hex(w3.eth.get_block(bn).hash)
+        bh = Web3.to_hex(oc_node.block_hash(bn))
 
         actual_seed = Web3.to_hex(Web3.keccak(req_seed + Web3.to_bytes(hexstr=bh)))
         proof = make_proof(rand_key, pub_key, Web3.to_int(hexstr=actual_seed))
@@ -233,27 +530,7 @@ def offchain_random(ver, sk, src_addr, src_nonce, oo_nonce, payload, *args):
 
         proof['seed'] = Web3.to_int(req_seed) # contract will construct its own actualSeed
 
-        resp = ethabi.encode([
-          'uint256[2]',
-          'uint256[2]',
-          'uint256',
-          'uint256',
-          'uint256',
-          'address',
-          'uint256[2]',
-          'uint256[2]',
-          'uint256'
-        ],[
-          [pub_key.x,pub_key.y],
-          [proof['gamma'].x,proof['gamma'].y],
-          proof['c'],
-          proof['s'],
-          proof['seed'],
-          proof['uWitness'],
-          [proof['cGammaWitness'].x, proof['cGammaWitness'].y],
-          [proof['sHashWitness'].x, proof['sHashWitness'].y],
-          proof['zInv']
-        ])
+        resp = encode_proof(proof)
 
         err_code = 0
 
@@ -263,3 +540,49 @@ def offchain_random(ver, sk, src_addr, src_nonce, oo_nonce, payload, *args):
             resp = Web3.to_bytes(text="HC01: OC_NODE_HTTP connection failure")
 
     return sdk.gen_response(req, err_code, resp)
+
+def offchain_random_batch(calls):
+    """Batch variant of offchain_random. Requests are decoded in order, then
+       the proofs for the whole batch are generated in parallel by make_proofs()"""
+
+    print(f"  -> offchain_random_batch handler called with {len(calls)} requests")
+    sdk = HybridComputeSDK()
+    reqs = []
+    seeds = []
+    errors = []
+    for (ver, sk, src_addr, src_nonce, oo_nonce, payload, *_) in calls:
+        assert ver == "0.3"
+        req = None
+        err = Web3.to_bytes(text="unknown error")
+        try:
+            req = sdk.parse_req(sk, src_addr, src_nonce, oo_nonce, payload)
+            (bn, req_seed) = ethabi.decode(['uint256', 'bytes32'], req['reqBytes'])
+            bh = Web3.to_hex(oc_node.block_hash(bn))
+            actual_seed = Web3.to_hex(Web3.keccak(req_seed + Web3.to_bytes(hexstr=bh)))
+            req['seed'] = Web3.to_int(req_seed)
+            seeds.append(Web3.to_int(hexstr=actual_seed))
+            err = None
+        except Exception as e:
+            print("METHOD FAILED", e)
+            if req is None:
+                # Without a parsed request there is nothing to sign a response
+                # for, so the call fails as it would outside of a batch
+                err = Fault(-32603, f"Server error: {e}")
+            elif "HTTPConnection" in str(e):
+                err = Web3.to_bytes(text="HC01: OC_NODE_HTTP connection failure")
+        reqs.append(req)
+        errors.append(err)
+
+    proofs = iter(make_proofs(seeds))
+    responses = []
+    for (req, err) in zip(reqs, errors):
+        if isinstance(err, Fault):
+            responses.append(err)
+            continue
+        if err is not None:
+            responses.append(sdk.gen_response(req, 1, err))
+            continue
+        proof = next(proofs)
+        proof['seed'] = req['seed'] # contract will construct its own actualSeed
+        responses.append(sdk.gen_response(req, 0, encode_proof(proof)))
+    return responses
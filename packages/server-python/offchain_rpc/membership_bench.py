@@ -0,0 +1,54 @@
+"""
+Benchmark for hybrid_compute_sdk.membership.AddressSet.
+
+Builds an index of random addresses (10M by default), maps it and checks a
+sample of members and non-members, then times lookups for both. Also reports
+the index size and the build and load times.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from hybrid_compute_sdk.membership import AddressSet, write_index
+
+def main():
+    """Build, load and time lookups"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=10_000_000, help="Number of addresses in the list")
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--index", help="Index file to write (default: a temporary file)")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    members = [rng.randbytes(20) for _ in range(args.count)]
+    path = args.index or os.path.join(tempfile.mkdtemp(), "bench.idx")
+
+    t0 = time.perf_counter()
+    write_index(members, path)
+    t1 = time.perf_counter()
+    s = AddressSet(path, check_interval=3600)
+    t2 = time.perf_counter()
+    print(f"{len(s)} addresses, {os.path.getsize(path) / 2**20:.1f} MiB, "
+          f"build {t1 - t0:.1f} s, load {(t2 - t1) * 1e3:.2f} ms")
+
+    hits = ['0x' + a.hex() for a in rng.sample(members, min(args.lookups, args.count))]
+    misses = ['0x' + rng.randbytes(20).hex() for _ in range(args.lookups)]
+    assert all(a in s for a in hits[:1000])
+    false_positives = 0
+    for (name, sample) in (("members", hits), ("non-members", misses)):
+        t0 = time.perf_counter()
+        found = sum(1 for a in sample if a in s)
+        per_lookup = (time.perf_counter() - t0) / len(sample)
+        if name == "members":
+            assert found == len(sample)
+        else:
+            false_positives = found
+        print(f"  {name:12} {per_lookup * 1e6:8.2f} us/lookup")
+    print(f"  {false_positives} of {len(misses)} random non-members found")
+    if not args.index:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
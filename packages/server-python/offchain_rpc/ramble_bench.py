@@ -0,0 +1,70 @@
+"""
+Benchmark for the ramble handler's string[] response encoding.
+
+Checks that encode_words() in handlers/ramble_offchain.py is byte-identical
+to ethabi.encode(['string[]'], ...) for random samples, with and without the
+"cheat" word. It then times the generic per-word sampling and encoding path
+against the pre-encoded fragments at the given length (999 by default, the
+largest the handler accepts).
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import time
+from eth_abi import abi as ethabi
+
+def load_ramble():
+    """Load the ramble handler module, which builds or maps the word index"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "handlers", "ramble_offchain.py")
+    spec = importlib.util.spec_from_file_location("ramble_offchain", path)
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+def word_at(ramble, i):
+    """Returns word number i from the index"""
+    return ramble.tail_at(i)[32:32 + ramble.WORD_LEN].decode("ascii")
+
+def generic(ramble, n):
+    """The previous implementation: one randint() and one word per element, then eth_abi"""
+    words = []
+    for _ in range(n):
+        words.append(word_at(ramble, random.randint(0, ramble.word_count - 1)))
+    return ethabi.encode(['string[]'], [words])
+
+def fragments(ramble, n):
+    """Vectorized index sampling plus pre-encoded fragments"""
+    return ramble.encode_words(random.choices(range(ramble.word_count), k=n))
+
+def main():
+    """Check equivalence, then time both encoders"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=999, help="Number of words per response")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    ramble = load_ramble()
+    print(f"{ramble.word_count} words in {ramble.index_path}")
+
+    for n in (1, 2, 17, args.n):
+        for cheat in (None, n - 1):
+            idx = random.choices(range(ramble.word_count), k=n)
+            words = [word_at(ramble, i) for i in idx]
+            if cheat is not None:
+                words[cheat] = "frog"
+            assert ramble.encode_words(idx, cheat) == ethabi.encode(['string[]'], [words])
+    print("encode_words is byte-identical to eth_abi")
+
+    for (name, fn) in (("eth_abi", generic), ("fragments", fragments)):
+        t0 = time.perf_counter()
+        for _ in range(args.iterations):
+            fn(ramble, args.n)
+        per_call = (time.perf_counter() - t0) / args.iterations
+        print(f"  {name:10} n={args.n}: {per_call * 1e6:10.1f} us/response")
+
+if __name__ == "__main__":
+    main()
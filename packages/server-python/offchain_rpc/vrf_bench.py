@@ -0,0 +1,278 @@
+"""
+Correctness and performance harness for the VRF handler.
+
+Runs every proof and verification implementation in handlers/vrf_offchain.py
+against the fixed corpus in tests/vrf_vectors.json. Each vector holds a
+(secret key, seed, block hash) input, the nonce used for the proof, and the
+expected hash point, proof fields and output_hash.
+
+The expected values were generated by this handler, so on their own they
+only catch regressions. Each vector is therefore also checked with
+sol_verify(), a line-by-line transcription of the on-chain verifier in
+packages/contracts/v0_7/lib/chainlink/VRF.sol which shares no code with the
+handler and uses ecrecover as the EVM does, and the public keys of small
+secret keys are checked against published multiples of the secp256k1
+generator. Any mismatch is reported and the script exits non-zero.
+Otherwise proofs/sec and verifies/sec are reported for each implementation.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+from eth_keys import KeyAPI
+from web3 import Web3
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+VECTORS = os.path.join(HERE, "tests", "vrf_vectors.json")
+
+# secp256k1 parameters, from SEC 2 section 2.4.1 as in VRF.sol
+FIELD_SIZE = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+GROUP_ORDER = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+# Published multiples k*G of the secp256k1 generator, keyed by k
+KNOWN_PUBLIC_KEYS = {
+    2: (0xC6047F9441ED7D6D3045406E95C07CD85C778E4B8CEF3CA7ABAC09B95C709EE5,
+        0x1AE168FEA63DC339A3C58419466CEAEEF7F632653266D0E1236431A950CFE52A),
+    3: (0xF9308A019258C31049344F85F89D5229B531C845836F99B08601F113BCE036F9,
+        0x388F7B0F632DE8140FE337E62A37F3566500A99934C2231B6CB9FD7584B8E672),
+}
+# (n-k)*G is the negation of k*G
+KNOWN_PUBLIC_KEYS.update({GROUP_ORDER - k: (x, FIELD_SIZE - y) for (k, (x, y)) in list(KNOWN_PUBLIC_KEYS.items())})
+
+def load_vrf():
+    """Load the VRF handler module. It reads OC_RANDOM_SECRET and OC_NODE_HTTP at
+       import time."""
+    spec = importlib.util.spec_from_file_location("vrf_offchain",
+        os.path.join(HERE, "handlers", "vrf_offchain.py"))
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = mod  # Needed by the make_proofs() process pool
+    spec.loader.exec_module(mod)
+    return mod
+
+def words(*values):
+    """abi.encodePacked of uint256 values"""
+    return b"".join(v.to_bytes(32, 'big') for v in values)
+
+def keccak_int(b):
+    return int.from_bytes(Web3.keccak(b), 'big')
+
+def ecrecover(msg_hash, v, r, s):
+    """The EVM ecrecover precompile. Returns the address as lower-case hex, or
+       None where the precompile returns address(0)."""
+    try:
+        sig = KeyAPI.Signature(vrs=(v - 27, r, s))
+        return sig.recover_public_key_from_msg_hash(msg_hash.to_bytes(32, 'big')).to_address()
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+def address_of(p):
+    return "0x" + Web3.keccak(words(*p))[12:].hex()
+
+def y_squared(x):
+    return (x * x * x + 7) % FIELD_SIZE
+
+def is_on_curve(p):
+    assert p[0] < FIELD_SIZE and p[1] < FIELD_SIZE
+    return y_squared(p[0]) == p[1] * p[1] % FIELD_SIZE
+
+def field_hash(b):
+    x = keccak_int(b)
+    while x >= FIELD_SIZE:
+        x = keccak_int(words(x))
+    return x
+
+def new_candidate_point(b):
+    x = field_hash(b)
+    y = pow(y_squared(x), (FIELD_SIZE + 1) >> 2, FIELD_SIZE)
+    return (x, FIELD_SIZE - y if y % 2 == 1 else y)
+
+def sol_hash_to_curve(pk, seed):
+    rv = new_candidate_point(words(1, pk[0], pk[1], seed))
+    while not is_on_curve(rv):
+        rv = new_candidate_point(words(rv[0]))
+    return rv
+
+def ecmul_verify(multiplicand, scalar, product):
+    assert scalar != 0
+    parity = 27 if multiplicand[1] % 2 == 0 else 28
+    actual = ecrecover(0, parity, multiplicand[0], scalar * multiplicand[0] % GROUP_ORDER)
+    return actual == address_of(product)
+
+def projective_ec_add(px, py, qx, qy):
+    def sub(x1, z1, x2, z2):
+        return ((z2 * x1 + (FIELD_SIZE - x2) * z1) % FIELD_SIZE, z1 * z2 % FIELD_SIZE)
+    def mul(x1, z1, x2, z2):
+        return (x1 * x2 % FIELD_SIZE, z1 * z2 % FIELD_SIZE)
+    lx = (qy + FIELD_SIZE - py) % FIELD_SIZE
+    lz = (qx + FIELD_SIZE - px) % FIELD_SIZE
+    (sx, dx) = mul(lx, lz, lx, lz)
+    (sx, dx) = sub(sx, dx, px, 1)
+    (sx, dx) = sub(sx, dx, qx, 1)
+    (sy, dy) = sub(px, 1, sx, dx)
+    (sy, dy) = mul(sy, dy, lx, lz)
+    (sy, dy) = sub(sy, dy, py, 1)
+    if dx != dy:
+        return (sx * dy % FIELD_SIZE, sy * dx % FIELD_SIZE, dx * dy % FIELD_SIZE)
+    return (sx, sy, dx)
+
+def sol_verify(pk, gamma, c, s, seed, u_witness, c_gamma_witness, s_hash_witness, z_inv):
+    """VRF.sol _randomValueFromVRFProof. Points are (x, y) tuples and u_witness is
+       a lower-case hex address. Returns the VRF output, or raises AssertionError
+       where the contract would revert."""
+    for p in (pk, gamma, c_gamma_witness, s_hash_witness):
+        assert is_on_curve(p)
+    # _verifyLinearCombinationWithGenerator
+    assert int(u_witness, 16) != 0
+    parity = 27 if pk[1] % 2 == 0 else 28
+    pseudo_hash = GROUP_ORDER - pk[0] * s % GROUP_ORDER
+    assert ecrecover(pseudo_hash, parity, pk[0], c * pk[0] % GROUP_ORDER) == u_witness
+    h = sol_hash_to_curve(pk, seed)
+    # _linearCombination
+    assert c_gamma_witness[0] % FIELD_SIZE != s_hash_witness[0] % FIELD_SIZE
+    assert ecmul_verify(gamma, c, c_gamma_witness)
+    assert ecmul_verify(h, s, s_hash_witness)
+    (x, y, z) = projective_ec_add(*c_gamma_witness, *s_hash_witness)
+    assert z * z_inv % FIELD_SIZE == 1
+    v = (x * z_inv % FIELD_SIZE, y * z_inv % FIELD_SIZE)
+    # _scalarFromCurvePoints
+    derived_c = keccak_int(words(2, *h, *pk, *gamma, *v) + Web3.to_bytes(hexstr=u_witness))
+    assert c == derived_c
+    return keccak_int(words(3, *gamma))
+
+def check_vector(vec):
+    """Check a corpus vector against sol_verify() and the published public keys.
+       Returns a list of errors."""
+    def xy(p):
+        return (Web3.to_int(hexstr=p[0]), Web3.to_int(hexstr=p[1]))
+    errors = []
+    sk = Web3.to_int(hexstr=vec['secretKey'])
+    if sk in KNOWN_PUBLIC_KEYS and xy(vec['publicKey']) != KNOWN_PUBLIC_KEYS[sk]:
+        errors.append(f"public key of {vec['secretKey']} differs from the published value")
+    if xy(vec['hash']) != sol_hash_to_curve(xy(vec['publicKey']), Web3.to_int(hexstr=vec['actualSeed'])):
+        errors.append(f"VRF.sol: hash point mismatch for seed {vec['seed']}")
+    try:
+        output = sol_verify(xy(vec['publicKey']), xy(vec['gamma']), Web3.to_int(hexstr=vec['c']),
+            Web3.to_int(hexstr=vec['s']), Web3.to_int(hexstr=vec['actualSeed']), vec['uWitness'].lower(),
+            xy(vec['cGammaWitness']), xy(vec['sHashWitness']), Web3.to_int(hexstr=vec['zInv']))
+        if output != Web3.to_int(hexstr=vec['outputHash']):
+            errors.append(f"VRF.sol: output mismatch for seed {vec['seed']}")
+    except AssertionError:
+        errors.append(f"VRF.sol: proof rejected for seed {vec['seed']}")
+    return errors
+
+def check_proof(vrf, vec, proof, name):
+    """Compare a proof field by field with a corpus vector. Returns a list of errors."""
+    def xy(p):
+        return [Web3.to_int(hexstr=p[0]), Web3.to_int(hexstr=p[1])]
+    expect = {
+        'gamma': xy(vec['gamma']),
+        'cGammaWitness': xy(vec['cGammaWitness']),
+        'sHashWitness': xy(vec['sHashWitness']),
+        'c': Web3.to_int(hexstr=vec['c']),
+        's': Web3.to_int(hexstr=vec['s']),
+        'zInv': Web3.to_int(hexstr=vec['zInv']),
+        'uWitness': vec['uWitness'],
+    }
+    errors = []
+    for (k, v) in expect.items():
+        got = [proof[k].x, proof[k].y] if isinstance(v, list) else proof[k]
+        if got != v:
+            errors.append(f"{name}: {k} mismatch for seed {vec['seed']}")
+    if vrf.output_hash(proof) != vec['outputHash']:
+        errors.append(f"{name}: output_hash mismatch for seed {vec['seed']}")
+    return errors
+
+def inputs(vrf, vec):
+    """Returns (sk, pk, actual_seed, nonce) for a corpus vector"""
+    sk = Web3.to_int(hexstr=vec['secretKey'])
+    pk = vrf.G * sk
+    seed = Web3.to_int(Web3.keccak(Web3.to_bytes(hexstr=vec['seed']) +
+        Web3.to_bytes(hexstr=vec['blockHash'])))
+    return sk, pk, seed, Web3.to_int(hexstr=vec['nonce'])
+
+def check_corpus(vrf, vectors):
+    """Check the corpus against VRF.sol, then run every implementation against it.
+       Returns a list of errors."""
+    errors = []
+    for vec in vectors:
+        errors += check_vector(vec)
+        (sk, pk, seed, nonce) = inputs(vrf, vec)
+        if [pk.x, pk.y] != [Web3.to_int(hexstr=p) for p in vec['publicKey']]:
+            errors.append(f"public key mismatch for {vec['secretKey']}")
+        if seed != Web3.to_int(hexstr=vec['actualSeed']):
+            errors.append(f"actual seed mismatch for seed {vec['seed']}")
+        h = vrf.hash_to_curve(pk, seed)
+        if [h.x, h.y] != [Web3.to_int(hexstr=p) for p in vec['hash']]:
+            errors.append(f"hash_to_curve mismatch for seed {vec['seed']}")
+
+        proof = vrf.make_proof(sk, pk, seed, nonce)
+        errors += check_proof(vrf, vec, proof, "make_proof")
+        # Several copies so that the process pool is used when there are multiple workers
+        for proof in vrf.make_proofs([seed] * 3, sk, pk, [nonce] * 3):
+            errors += check_proof(vrf, vec, proof, "make_proofs")
+
+        try:
+            vrf.verify_proof(pk, proof)
+        except AssertionError:
+            errors.append(f"verify_proof rejected seed {vec['seed']}")
+        if vrf.verify_proofs(pk, [proof]) != [True]:
+            errors.append(f"verify_proofs rejected seed {vec['seed']}")
+
+        bad = dict(proof)
+        bad['s'] = (bad['s'] + 1) % vrf.GROUP_ORDER
+        try:
+            vrf.verify_proof(pk, bad)
+            errors.append(f"verify_proof accepted a modified proof for seed {vec['seed']}")
+        except AssertionError:
+            pass
+        if vrf.verify_proofs(pk, [proof, bad]) != [True, False]:
+            errors.append(f"verify_proofs accepted a modified proof for seed {vec['seed']}")
+    return errors
+
+def rate(n, fn):
+    """Returns calls per second for fn(), which performs n operations"""
+    t0 = time.perf_counter()
+    fn()
+    return n / (time.perf_counter() - t0)
+
+def benchmark(vrf, vectors, rounds):
+    """Report proofs/sec and verifies/sec using the corpus seeds under a single key"""
+    (sk, pk, _, _) = inputs(vrf, vectors[0])
+    seeds = [inputs(vrf, v)[2] + r for r in range(rounds) for v in vectors]
+    proofs = vrf.make_proofs(seeds, sk, pk)
+    n = len(seeds)
+
+    print(f"{n} proofs, {vrf.vrf_workers} workers")
+    print(f"  make_proof    {rate(n, lambda: [vrf.make_proof(sk, pk, s) for s in seeds]):10.1f} proofs/sec")
+    print(f"  make_proofs   {rate(n, lambda: vrf.make_proofs(seeds, sk, pk)):10.1f} proofs/sec")
+    print(f"  verify_proof  {rate(n, lambda: [vrf.verify_proof(pk, p) for p in proofs]):10.1f} verifies/sec")
+    print(f"  verify_proofs {rate(n, lambda: vrf.verify_proofs(pk, proofs)):10.1f} verifies/sec")
+
+def main():
+    """Check the corpus, then benchmark"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=4,
+        help="Number of passes over the corpus seeds for the benchmark")
+    args = parser.parse_args()
+
+    with open(VECTORS, "r", encoding="ascii") as f:
+        vectors = json.load(f)
+    # The handler reads its key at import time; use one from the corpus if none is set
+    os.environ.setdefault('OC_RANDOM_SECRET', vectors[0]['secretKey'])
+    os.environ.setdefault('OC_NODE_HTTP', "http://localhost:8545")
+    vrf = load_vrf()
+
+    errors = check_corpus(vrf, vectors)
+    for e in errors:
+        print("MISMATCH", e)
+    if errors:
+        raise SystemExit(1)
+    print(f"All {len(vectors)} vectors match VRF.sol and the stored corpus")
+
+    benchmark(vrf, vectors, args.rounds)
+
+if __name__ == "__main__":
+    main()
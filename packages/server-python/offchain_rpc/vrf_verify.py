@@ -0,0 +1,105 @@
+"""
+Offline re-verification of served VRF responses.
+
+Reads a JSON-lines file where each record holds the request 'payload' and the
+'response' returned by the random(uint256,bytes32) handler, both hex. The
+block hash is taken from an optional 'blockHash' field or fetched from
+OC_NODE_HTTP. Proofs are checked with the batch verifier; with --compare the
+sequential verifier is also run and both throughputs are reported.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+from dotenv import load_dotenv, find_dotenv
+from eth_abi import abi as ethabi
+from web3 import Web3
+
+load_dotenv(find_dotenv())
+
+def load_vrf():
+    """Load the VRF handler module"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "handlers", "vrf_offchain.py")
+    spec = importlib.util.spec_from_file_location("vrf_offchain", path)
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = mod  # Needed by the make_proofs() process pool
+    spec.loader.exec_module(mod)
+    return mod
+
+def load_records(path, vrf):
+    """Decode the served proofs, replacing the client seed with the actual seed"""
+    keys = []
+    proofs = []
+    with open(path, "r", encoding="ascii") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            (bn, req_seed) = ethabi.decode(['uint256', 'bytes32'],
+                Web3.to_bytes(hexstr=rec['payload']))
+            if 'blockHash' in rec:
+                bh = Web3.to_bytes(hexstr=rec['blockHash'])
+            else:
+                bh = vrf.oc_node.block_hash(bn)
+            (pk, proof) = vrf.decode_proof(Web3.to_bytes(hexstr=rec['response']))
+            proof['seed'] = Web3.to_int(Web3.keccak(req_seed + bh))
+            keys.append(pk)
+            proofs.append(proof)
+    return keys, proofs
+
+def verify_all(vrf, keys, proofs):
+    """Batch-verify the proofs, grouped by public key. Returns indexes of bad proofs."""
+    groups = {}
+    for (i, pk) in enumerate(keys):
+        groups.setdefault((pk.x, pk.y), []).append(i)
+    bad = []
+    for idx in groups.values():
+        ok = vrf.verify_proofs(keys[idx[0]], [proofs[i] for i in idx])
+        bad.extend(i for (i, good) in zip(idx, ok) if not good)
+    return sorted(bad)
+
+def verify_sequential(vrf, keys, proofs):
+    """Verify the proofs one at a time. Returns indexes of bad proofs."""
+    bad = []
+    for (i, (pk, proof)) in enumerate(zip(keys, proofs)):
+        try:
+            vrf.verify_proof(pk, proof)
+        except Exception:  # pylint: disable=broad-except
+            bad.append(i)
+    return bad
+
+def main():
+    """Verify a file of served responses and report throughput"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("records", help="JSON-lines file of {payload, response[, blockHash]}")
+    parser.add_argument("--compare", action="store_true",
+        help="Also run the sequential verifier and compare throughput")
+    args = parser.parse_args()
+
+    vrf = load_vrf()
+    (keys, proofs) = load_records(args.records, vrf)
+    n = len(proofs)
+    print(f"Loaded {n} proofs")
+
+    t0 = time.perf_counter()
+    bad = verify_all(vrf, keys, proofs)
+    t_batch = time.perf_counter() - t0
+    print(f"Batch verifier:      {n / t_batch:10.1f} proofs/sec")
+
+    if args.compare:
+        t0 = time.perf_counter()
+        seq_bad = verify_sequential(vrf, keys, proofs)
+        t_seq = time.perf_counter() - t0
+        print(f"Sequential verifier: {n / t_seq:10.1f} proofs/sec ({t_seq / t_batch:.1f}x slower)")
+        assert seq_bad == bad
+
+    if bad:
+        print("FAILED records (0-based line index among non-empty lines):", bad)
+        raise SystemExit(1)
+    print("All proofs verified")
+
+if __name__ == "__main__":
+    main()
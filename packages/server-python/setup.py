@@ -7,6 +7,7 @@ setup(
     install_requires=[
         "jsonrpcserver",
         "aiohttp",
+        "web3>=7,<8",
     ],
     author="Boba",
     author_email="",
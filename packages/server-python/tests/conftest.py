@@ -0,0 +1,38 @@
+import importlib.util
+import os
+import sys
+import pytest
+
+OFFCHAIN_RPC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "offchain_rpc")
+
+class OffchainLoader:
+    """Loads scripts and handler modules from offchain_rpc for one test module"""
+
+    def __init__(self, mp: pytest.MonkeyPatch):
+        self.mp = mp
+        self.handlers = []
+
+    def script(self, name):
+        """Load offchain_rpc/<name>.py, e.g. a benchmark harness"""
+        spec = importlib.util.spec_from_file_location(name, os.path.join(OFFCHAIN_RPC, name + ".py"))
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        return mod
+
+    def handler(self, name, load, **env):
+        """Set the environment a handler reads at import time, then load it with
+           load(). The variables are restored and the module 'name' is unloaded
+           at the end of the test module."""
+        for (key, value) in env.items():
+            self.mp.setenv(key, value)
+        mod = load()
+        self.handlers.append(name)
+        return mod
+
+@pytest.fixture(scope="module")
+def offchain():
+    with pytest.MonkeyPatch.context() as mp:
+        loader = OffchainLoader(mp)
+        yield loader
+        for name in loader.handlers:
+            sys.modules.pop(name, None)
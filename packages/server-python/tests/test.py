@@ -1,7 +1,9 @@
 import pytest
 import sys
 import os
+import json
 import socket
+import jsonrpclib
 from web3 import Web3
 from unittest.mock import Mock, patch, MagicMock
 from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
@@ -158,6 +160,96 @@ class TestHybridComputeSDK:
         sdk_instance.create_json_rpc_server_instance(port=port)
         assert sdk_instance.get_server() is not None
 
+    def test_batch_dispatch(self, sdk_instance):
+        sdk_instance.create_json_rpc_server_instance(host='127.0.0.1', port=get_free_port())
+        batches = []
+
+        def single(ver, sk, src_addr, src_nonce, oo_nonce, payload, *args):
+            return "single-" + payload
+
+        def batch(calls):
+            batches.append(calls)
+            return ["batch-" + c[5] for c in calls]
+
+        sdk_instance.add_server_action("test_function(uint256)", single, batch=batch)
+        method = sdk_instance.selector("test_function(uint256)")
+        params = {'ver': '0.3', 'sk': '0x01', 'src_addr': '0x02', 'src_nonce': '0x03', 'oo_nonce': '0x04'}
+        req = [
+            {'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': dict(params, payload='a')},
+            {'jsonrpc': '2.0', 'id': 2, 'method': 'unknown', 'params': []},
+            {'jsonrpc': '2.0', 'id': 3, 'method': method, 'params': ['0.3', '0x01', '0x02', '0x03', '0x04', 'b']},
+        ]
+
+        resp = json.loads(sdk_instance.server._marshaled_dispatch(json.dumps(req)))
+        sdk_instance.server.server_close()
+
+        assert len(batches) == 1 and len(batches[0]) == 2
+        assert [r['id'] for r in resp] == [1, 2, 3]
+        assert resp[0]['result'] == "batch-a"
+        assert 'error' in resp[1]
+        assert resp[2]['result'] == "batch-b"
+
+    def test_batch_dispatch_fault(self, sdk_instance):
+        sdk_instance.create_json_rpc_server_instance(host='127.0.0.1', port=get_free_port())
+
+        def single(ver, sk, src_addr, src_nonce, oo_nonce, payload, *args):
+            return "single-" + payload
+
+        def batch(calls):
+            return [jsonrpclib.Fault(-32603, "bad " + c[5]) if c[5] == 'b' else "batch-" + c[5]
+                    for c in calls]
+
+        sdk_instance.add_server_action("test_function(uint256)", single, batch=batch)
+        method = sdk_instance.selector("test_function(uint256)")
+        req = [{'jsonrpc': '2.0', 'id': i, 'method': method,
+                'params': ['0.3', '0x01', '0x02', '0x03', '0x04', p]} for i, p in enumerate("ab")]
+
+        resp = json.loads(sdk_instance.server._marshaled_dispatch(json.dumps(req)))
+        sdk_instance.server.server_close()
+
+        assert resp[0]['result'] == "batch-a"
+        assert resp[1]['id'] == 1 and resp[1]['error']['message'] == "bad b"
+
+    def test_pure_handler(self, sdk_instance):
+        sdk_instance.create_json_rpc_server_instance(host='127.0.0.1', port=get_free_port())
+        calls = []
+
+        def compute(req_bytes):
+            calls.append(req_bytes)
+            return 0, req_bytes[::-1]
+
+        sdk_instance.add_server_action("test_function(uint256)", compute, pure=True)
+        method = sdk_instance.selector("test_function(uint256)")
+        handler = sdk_instance.server.funcs[method]
+        sdk_instance.server.server_close()
+
+        r1 = handler('0.3', '0x' + '01' * 32, '0x' + '02' * 20, '0x03', '0x04', '0x1234')
+        r2 = handler('0.3', '0x' + '01' * 32, '0x' + '02' * 20, '0x05', '0x06', '0x1234')
+        handler('0.3', '0x' + '01' * 32, '0x' + '02' * 20, '0x03', '0x04', '0x5678')
+
+        assert calls == [b'\x12\x34', b'\x56\x78']
+        assert r1['response'] == r2['response'] == '0x3412'
+        assert r1['signature'] != r2['signature']
+
+    def test_pure_handler_error_not_cached(self, sdk_instance):
+        sdk_instance.create_json_rpc_server_instance(host='127.0.0.1', port=get_free_port())
+        results = [(1, b'busy'), (0, b'ok')]
+        calls = []
+
+        def compute(req_bytes):
+            calls.append(req_bytes)
+            return results[len(calls) - 1]
+
+        sdk_instance.add_server_action("test_function(uint256)", compute, pure=True)
+        handler = sdk_instance.server.funcs[sdk_instance.selector("test_function(uint256)")]
+        sdk_instance.server.server_close()
+
+        args = ('0.3', '0x' + '01' * 32, '0x' + '02' * 20, '0x03', '0x04', '0x1234')
+        assert handler(*args)['success'] is False
+        assert handler(*args)['response'] == Web3.to_hex(b'ok')
+        handler(*args)
+        assert len(calls) == 2
+
     def test_gen_response_v7_match(self, sdk_instance):
         # Set up the same environment variables as TypeScript test
         os.environ['HC_HELPER_ADDR'] = '0x11c4DbbaC4A0A47a7c76b5603bc219c5dAe752D6'
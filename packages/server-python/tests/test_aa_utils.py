@@ -0,0 +1,371 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock, patch
+import pytest
+from hybrid_compute_sdk.aa_utils import AAUtils, PollSchedule, ReceiptWatcher, UserOpSubmitError, \
+    UserOpTimeoutError, UserOpFailedError, FeeBump, assemble_op, execute_batch_calldata, split_calls
+from eth_abi import abi as ethabi
+from web3 import Web3
+from hybrid_compute_sdk.fee_oracle import FeeData
+from hybrid_compute_sdk.gas_cache import GasEstimateCache, op_shape
+
+SENDER = "0x" + "3" * 40
+TARGET = "0x" + "4" * 40
+
+def fake_node(posts):
+    """requests.Session.post replacement answering JSON-RPC batches"""
+    results = {
+        'eth_call': "0x" + "0" * 63 + "5",
+        'eth_blockNumber': hex(100),
+        'eth_gasPrice': hex(30 * 10**9),
+        'eth_maxPriorityFeePerGas': hex(10**9),
+        'eth_chainId': hex(28882),
+    }
+    def post(url, json=None, **kwargs):
+        posts.append(json)
+        body = [{'jsonrpc': '2.0', 'id': c['id'], 'result': results[c['method']]} for c in json]
+        return Mock(json=Mock(return_value=body))
+    return post
+
+def test_build_op_single_round_trip():
+    aa = AAUtils(node_url="http://batch-node.test:8545", bundler_url="http://bundler.test")
+    posts = []
+    with patch('requests.Session.post', side_effect=fake_node(posts)):
+        op = aa.build_op(SENDER, TARGET, 0, b"")
+        assert len(posts) == 1
+        assert [c['method'] for c in posts[0]] == \
+            ['eth_call', 'eth_blockNumber', 'eth_gasPrice', 'eth_maxPriorityFeePerGas', 'eth_chainId']
+        assert op['nonce'] == "0x" + "0" * 63 + "5"
+        assert op['maxPriorityFeePerGas'] == hex(10**9)
+        assert op['maxFeePerGas'] == hex(2 * 29 * 10**9 + 10**9)
+        assert aa.chain_id == 28882
+
+        # Fees and chain ID are cached, so the next op only reads the nonce
+        aa.build_op(SENDER, TARGET, 0, b"")
+        assert [c['method'] for c in posts[1]] == ['eth_call']
+
+def test_split_calls():
+    calls = [(TARGET, 0, bytes(100))] * 50
+    groups = split_calls(calls, max_calldata=2048)
+    assert sum(groups, []) == calls and len(groups) > 1
+    assert all(len(execute_batch_calldata(g)) <= 2048 for g in groups)
+    # A call over budget on its own is sent alone
+    assert split_calls([(TARGET, 0, bytes(4096))] + calls[:2], max_calldata=2048) == \
+        [[(TARGET, 0, bytes(4096))], calls[:2]]
+    gas_calls = [(TARGET, 1, b"", 400_000)] * 5
+    assert [len(g) for g in split_calls(gas_calls, max_call_gas=1_000_000)] == [2, 2, 1]
+
+def test_build_batch_op():
+    aa = AAUtils(node_url="http://batch-op-node.test:8545", bundler_url="http://bundler.test")
+    posts = []
+    calls = [(TARGET, 0, bytes([i]) * 200) for i in range(40)]
+    with patch('requests.Session.post', side_effect=fake_node(posts)):
+        ops = aa.build_batch_op(SENDER, calls)
+    assert len(posts) == 1 and len(ops) == 2
+    assert [op['nonce'] for op in ops] == ["0x5", "0x6"]
+    decoded = []
+    for op in ops:
+        data = Web3.to_bytes(hexstr=op['callData'])
+        assert data[:4] == Web3.keccak(text="executeBatch(address[],uint256[],bytes[])")[:4]
+        dest, values, funcs = ethabi.decode(['address[]', 'uint256[]', 'bytes[]'], data[4:])
+        assert values == () and len(dest) == len(funcs)
+        decoded.extend(funcs)
+    assert decoded == [c[2] for c in calls]
+
+def test_node_batch_error():
+    aa = AAUtils(node_url="http://batch-node-err.test:8545", bundler_url="http://bundler.test")
+    body = [{'jsonrpc': '2.0', 'id': 0, 'error': {'code': -32000, 'message': "execution reverted"}}]
+    with patch('requests.Session.post', return_value=Mock(json=Mock(return_value=body))):
+        with pytest.raises(RuntimeError, match="execution reverted"):
+            aa.node_batch([("eth_call", [{}, "latest"])])
+
+RECEIPT = {'success': True, 'receipt': {'status': "0x1", 'transactionHash': "0x" + "ab" * 32}}
+
+def bundler(answers, posts):
+    """requests.Session.post replacement returning the given bundler results in turn"""
+    def post(url, json=None, **kwargs):
+        posts.append(json)
+        return Mock(json=Mock(return_value=answers.pop(0)))
+    return post
+
+def test_poll_schedule():
+    delays = list(PollSchedule(initial=1, factor=2, max_interval=5, deadline=20).delays())
+    assert delays == [1, 2, 4, 5, 5]
+
+def test_wait_for_receipt():
+    aa = AAUtils(node_url="http://receipt-node.test:8545", bundler_url="http://bundler.test")
+    posts = []
+    answers = [{'result': None}, {'result': None}, {'result': RECEIPT}]
+    with patch('requests.Session.post', side_effect=bundler(answers, posts)), \
+         patch('hybrid_compute_sdk.aa_utils.time.sleep') as sleep:
+        assert aa.wait_for_receipt("0x01") == RECEIPT
+    assert [c.args[0] for c in sleep.call_args_list] == [1.0, 1.5, 2.25]
+    assert posts[0]['params'] == {'hash': "0x01"}
+
+def test_wait_for_receipt_errors():
+    aa = AAUtils(node_url="http://receipt-node.test:8545", bundler_url="http://bundler.test")
+    failed = {'success': False, 'receipt': {'status': "0x1", 'transactionHash': "0x00"}}
+    with patch('requests.Session.post', side_effect=bundler([{'result': failed}], [])), \
+         patch('hybrid_compute_sdk.aa_utils.time.sleep'):
+        with pytest.raises(UserOpFailedError):
+            aa.wait_for_receipt("0x01")
+    with patch('requests.Session.post', side_effect=bundler([{'result': None}] * 3, [])), \
+         patch('hybrid_compute_sdk.aa_utils.time.sleep'):
+        with pytest.raises(UserOpTimeoutError):
+            aa.wait_for_receipt("0x01", PollSchedule(initial=0.001, factor=1, deadline=0.0025))
+
+def test_submit_rejected():
+    aa = AAUtils(node_url="http://receipt-node.test:8545", bundler_url="http://bundler.test")
+    aa._chain_id = 28882
+    op = {'sender': SENDER, 'nonce': "0x0", 'callData': "0x", 'callGasLimit': "0x0",
+          'verificationGasLimit': "0x0", 'preVerificationGas': "0x0",
+          'maxFeePerGas': "0x1", 'maxPriorityFeePerGas': "0x1"}
+    error = {'code': -32602, 'message': "invalid signature"}
+    with patch('requests.Session.post', side_effect=bundler([{'error': error}], [])):
+        with pytest.raises(UserOpSubmitError):
+            aa.sign_submit_op(op, "0x" + "1" * 64)
+
+def test_receipt_watcher():
+    aa = AAUtils(node_url="http://watch-node.test:8545", bundler_url="http://bundler.test")
+    posts = []
+    def post(url, json=None, **kwargs):
+        posts.append(json)
+        def answer(c):
+            op_hash = c['params']['hash']
+            if op_hash == "0xfail":
+                return dict(RECEIPT, success=False)
+            # Receipts appear on the second poll
+            return RECEIPT if len(posts) > 1 and op_hash != "0xlost" else None
+        return Mock(json=Mock(return_value=[{'jsonrpc': '2.0', 'id': c['id'], 'result': answer(c)} for c in json]))
+
+    watcher = ReceiptWatcher(aa, interval=0.05, deadline=0.5)
+    with patch('requests.Session.post', side_effect=post):
+        futures = [watcher.watch(f"0x{i:02x}") for i in range(100)]
+        failed = watcher.watch("0xfail")
+        lost = watcher.watch("0xlost")
+        assert watcher.watch("0x00") is futures[0]
+        assert all(f.result(timeout=5) == RECEIPT for f in futures)
+        with pytest.raises(UserOpFailedError):
+            failed.result(timeout=5)
+        with pytest.raises(UserOpTimeoutError):
+            lost.result(timeout=5)
+    # Every poll covered all pending ops in one request
+    assert len(posts[0]) == 102 and len(posts[1]) == 101
+    assert all(len(p) == 1 for p in posts[2:])
+    # The thread exits once nothing is pending
+    time.sleep(0.2)
+    assert watcher.thread is None
+
+def test_receipt_watcher_errors():
+    aa = AAUtils(node_url="http://watch-err-node.test:8545", bundler_url="http://bundler.test")
+    # A malformed receipt fails only its own future
+    post = lambda url, json=None, **kwargs: Mock(json=Mock(return_value=[
+        {'jsonrpc': '2.0', 'id': c['id'], 'result': {'success': True} if c['params']['hash'] == "0xbad" else RECEIPT}
+        for c in json]))
+    watcher = ReceiptWatcher(aa, interval=0.01)
+    with patch('requests.Session.post', side_effect=post):
+        bad = watcher.watch("0xbad")
+        good = watcher.watch("0xgood")
+        with pytest.raises(UserOpFailedError):
+            bad.result(timeout=5)
+        assert good.result(timeout=5) == RECEIPT
+
+    # If the loop itself fails, pending futures fail and the next watch() starts a new thread
+    heads = Mock()
+    heads.wait_for_block.side_effect = [RuntimeError("subscription lost"), 1]
+    watcher = ReceiptWatcher(aa, heads=heads)
+    with patch('requests.Session.post', side_effect=post):
+        with pytest.raises(RuntimeError):
+            watcher.watch("0x01").result(timeout=5)
+        time.sleep(0.05)
+        assert watcher.thread is None and watcher.pending == {}
+        assert watcher.watch("0x02").result(timeout=5) == RECEIPT
+
+ESTIMATE = {'preVerificationGas': hex(50000), 'verificationGasLimit': hex(100000), 'callGasLimit': hex(30000)}
+
+def cached_aa():
+    aa = AAUtils(node_url="http://gas-node.test:8545", bundler_url="http://bundler.test",
+                 gas_cache=GasEstimateCache(margins={'preVerificationGas': 1.5}))
+    aa._chain_id = 28882
+    return aa
+
+def make_op(target=TARGET, value=0, calldata=b"\x12\x34\x56\x78" + bytes(32)):
+    return assemble_op(SENDER, "0x0", FeeData(None, 2, 1), target, value, calldata)
+
+def test_gas_estimate_cache():
+    aa = cached_aa()
+    posts = []
+    with patch('requests.Session.post', side_effect=bundler([{'result': ESTIMATE}] * 2, posts)):
+        assert aa.estimate_op_gas(make_op())[1]['callGasLimit'] == hex(30000)
+        # Same shape with a different value is served from the cache, with margins
+        op = aa.estimate_op_gas(make_op(value=5), extra_cg=7)[1]
+        assert len(posts) == 1
+        assert op['preVerificationGas'] == hex(75000)
+        assert op['verificationGasLimit'] == hex(110000)
+        assert op['callGasLimit'] == hex(33000 + 7)
+        # Another target or calldata length is estimated
+        aa.estimate_op_gas(make_op(target="0x" + "5" * 40))
+        assert len(posts) == 2
+    assert (aa.gas_cache.hits, aa.gas_cache.misses) == (1, 2)
+
+def test_gas_estimate_cache_fallback():
+    aa = cached_aa()
+    aa.gas_cache.store(make_op(), ESTIMATE)
+    posts = []
+    answers = [{'error': {'code': -32602, 'message': "AA40 over verificationGasLimit"}},
+               {'result': dict(ESTIMATE, verificationGasLimit=hex(200000))},
+               {'result': "0x01"}, {'result': RECEIPT}]
+    with patch('requests.Session.post', side_effect=bundler(answers, posts)), \
+         patch('hybrid_compute_sdk.aa_utils.time.sleep'):
+        success, op = aa.estimate_op_gas(make_op())
+        assert success
+        assert aa.sign_submit_op(op, "0x" + "1" * 64, PollSchedule()) == RECEIPT
+    assert [p['method'] for p in posts] == ['eth_sendUserOperation', 'eth_estimateUserOperationGas',
+                                           'eth_sendUserOperation', 'eth_getUserOperationReceipt']
+    assert posts[2]['params'][0]['verificationGasLimit'] == hex(200000)
+
+def test_gas_estimate_cache_validation_errors():
+    aa = cached_aa()
+    aa.gas_cache.store(make_op(), ESTIMATE)
+    posts = []
+    # Not a gas complaint, but a stale verificationGasLimit can make the account revert
+    answers = [{'error': {'code': -32500, 'message': "AA23 reverted"}},
+               {'result': dict(ESTIMATE, verificationGasLimit=hex(200000))},
+               {'result': "0x01"}]
+    with patch('requests.Session.post', side_effect=bundler(answers, posts)):
+        op = aa.estimate_op_gas(make_op())[1]
+        aa.sign_send_op(op, "0x" + "1" * 64)
+    assert [p['method'] for p in posts] == ['eth_sendUserOperation', 'eth_estimateUserOperationGas',
+                                           'eth_sendUserOperation']
+    assert posts[2]['params'][0]['verificationGasLimit'] == hex(200000)
+
+def test_gas_estimate_cache_other_errors():
+    aa = cached_aa()
+    aa.gas_cache.store(make_op(), ESTIMATE)
+    posts = []
+    answers = [{'error': {'code': -32603, 'message': "internal error"}}]
+    with patch('requests.Session.post', side_effect=bundler(answers, posts)):
+        op = aa.estimate_op_gas(make_op())[1]
+        with pytest.raises(UserOpSubmitError):
+            aa.sign_submit_op(op, "0x" + "1" * 64, PollSchedule())
+    # Not a validation error, so no live re-estimate, and the cached estimate is kept
+    assert [p['method'] for p in posts] == ['eth_sendUserOperation']
+    assert aa.gas_cache.get(make_op()) is not None
+
+def test_op_shape_no_init_code():
+    base = make_op()
+    shapes = {op_shape(dict(base, **extra)) for extra in
+              ({}, {'initCode': "0x"}, {'initCode': ""}, {'initCode': None}, {'factory': ""}, {'factory': None})}
+    assert len(shapes) == 1
+    assert op_shape(dict(base, factory="0x" + "6" * 40)) not in shapes
+    assert op_shape(dict(base, initCode="0x" + "6" * 48)) not in shapes
+
+def test_fee_bump():
+    bump = FeeBump(percent=12.5, max_fee=150)
+    op = bump.bump({'maxFeePerGas': hex(100), 'maxPriorityFeePerGas': hex(3)})
+    assert op == {'maxFeePerGas': hex(113), 'maxPriorityFeePerGas': hex(4)}
+    assert bump.bump(bump.bump(bump.bump(op))) is None
+
+UNDERPRICED = {'error': {'code': -32602, 'message': "replacement underpriced: fee increase too small"}}
+
+def test_underpriced_without_fee_bump():
+    aa = AAUtils(node_url="http://bump-node.test:8545", bundler_url="http://bundler.test")
+    aa._chain_id = 28882
+    posts = []
+    with patch('requests.Session.post', side_effect=bundler([UNDERPRICED], posts)):
+        with pytest.raises(UserOpSubmitError):
+            aa.sign_send_op(make_op(), "0x" + "1" * 64)
+    assert len(posts) == 1
+
+def test_replace_pending():
+    aa = AAUtils(node_url="http://bump-node.test:8545", bundler_url="http://bundler.test", fee_bump=FeeBump())
+    aa._chain_id = 28882
+    posts = []
+    with patch('requests.Session.post', side_effect=bundler([UNDERPRICED, UNDERPRICED, {'result': "0x02"}], posts)):
+        op, op_hash = aa.sign_send_op(dict(make_op(), maxFeePerGas=hex(100), maxPriorityFeePerGas=hex(8)),
+                                      "0x" + "1" * 64)
+    assert op_hash == "0x02"
+    sent = [p['params'][0] for p in posts]
+    assert [s['maxFeePerGas'] for s in sent] == [hex(100), hex(113), hex(128)]
+    assert [s['maxPriorityFeePerGas'] for s in sent] == [hex(8), hex(9), hex(11)]
+    assert len({s['signature'] for s in sent}) == 3
+    assert op is sent[-1]
+
+def test_replace_unmined():
+    aa = AAUtils(node_url="http://bump-node.test:8545", bundler_url="http://bundler.test",
+                 receipt_poll=PollSchedule(initial=0.01), fee_bump=FeeBump(interval=0.1))
+    aa._chain_id = 28882
+    sent = []
+    def post(url, json=None, **kwargs):
+        if isinstance(json, list):
+            # Only the replacement is ever mined
+            body = [{'jsonrpc': '2.0', 'id': c['id'], 'result': RECEIPT if c['params']['hash'] == "0x02" else None}
+                    for c in json]
+        else:
+            sent.append(json['params'][0])
+            body = {'jsonrpc': '2.0', 'id': json['id'], 'result': f"0x{len(sent):02x}"}
+        return Mock(json=Mock(return_value=body))
+    with patch('requests.Session.post', side_effect=post):
+        op = dict(make_op(), maxFeePerGas=hex(100), maxPriorityFeePerGas=hex(8))
+        assert aa.sign_submit_op(op, "0x" + "1" * 64) == RECEIPT
+    assert [s['maxFeePerGas'] for s in sent] == [hex(100), hex(113)]
+    time.sleep(0.05)
+    assert aa.receipt_watcher.pending == {}
+
+def test_no_replacement_by_default():
+    aa = AAUtils(node_url="http://bump-node.test:8545", bundler_url="http://bundler.test",
+                 receipt_poll=PollSchedule(initial=0.01))
+    aa._chain_id = 28882
+    sent = []
+    polls = []
+    def post(url, json=None, **kwargs):
+        if isinstance(json, list):
+            polls.append(json)
+            # Mined on the tenth poll
+            body = [{'jsonrpc': '2.0', 'id': c['id'], 'result': RECEIPT if len(polls) >= 10 else None} for c in json]
+        else:
+            sent.append(json['params'][0])
+            body = {'jsonrpc': '2.0', 'id': json['id'], 'result': "0x01"}
+        return Mock(json=Mock(return_value=body))
+    with patch('requests.Session.post', side_effect=post):
+        assert aa.sign_submit_op(make_op(), "0x" + "1" * 64) == RECEIPT
+    assert len(sent) == 1
+
+class KeepAliveNode(BaseHTTPRequestHandler):
+    """JSON-RPC endpoint recording the client port of each request"""
+    protocol_version = "HTTP/1.1"
+    peers = []
+
+    def do_POST(self):
+        KeepAliveNode.peers.append(self.client_address[1])
+        req = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        answer = lambda c: {'jsonrpc': '2.0', 'id': c['id'], 'result': hex(28882)}
+        body = json.dumps([answer(c) for c in req] if isinstance(req, list) else answer(req)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def test_connection_reuse():
+    KeepAliveNode.peers = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveNode)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    aa = AAUtils(node_url=url, bundler_url=url)
+    try:
+        assert aa.chain_id == 28882
+        aa.node_batch([("eth_chainId", []), ("eth_chainId", [])])
+        aa.send_op({})
+        aa.w3.eth.block_number
+    finally:
+        aa.close()
+        server.shutdown()
+    # Web3 and the direct JSON-RPC calls all went over one connection
+    assert len(KeepAliveNode.peers) == 4
+    assert len(set(KeepAliveNode.peers)) == 1
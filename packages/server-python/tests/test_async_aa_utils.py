@@ -0,0 +1,101 @@
+import asyncio
+from contextlib import asynccontextmanager
+import pytest
+from aiohttp import web
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from hybrid_compute_sdk.aa_utils import PollSchedule, UserOpSubmitError
+from hybrid_compute_sdk.async_aa_utils import AsyncAAUtils
+
+KEY = "0x" + "1" * 64
+SENDER = "0x" + "3" * 40
+TARGET = "0x" + "4" * 40
+
+class FakeChain:
+    """Node and bundler JSON-RPC endpoints on one aiohttp app"""
+    def __init__(self):
+        self.requests = []
+        self.sent = []
+
+    def answer(self, call):
+        method = call['method']
+        if method == 'eth_call':
+            return {'result': "0x" + "0" * 63 + "7"}
+        if method == 'eth_blockNumber':
+            return {'result': hex(100)}
+        if method == 'eth_gasPrice':
+            return {'result': hex(30 * 10**9)}
+        if method == 'eth_maxPriorityFeePerGas':
+            return {'result': hex(10**9)}
+        if method == 'eth_chainId':
+            return {'result': hex(28882)}
+        if method == 'eth_sendUserOperation':
+            op = call['params'][0]
+            if op['callData'] == "0xdead":
+                return {'error': {'code': -32602, 'message': "invalid op"}}
+            self.sent.append(op)
+            return {'result': "0x" + f"{len(self.sent):064x}"}
+        if method == 'eth_getUserOperationReceipt':
+            return {'result': {'success': True, 'receipt': {
+                'status': "0x1", 'transactionHash': call['params']['hash']}}}
+        return {'error': {'code': -32601, 'message': "method not found"}}
+
+    async def handle(self, req):
+        body = await req.json()
+        self.requests.append(body)
+        if isinstance(body, list):
+            return web.json_response([dict(self.answer(c), jsonrpc="2.0", id=c['id']) for c in body])
+        return web.json_response(dict(self.answer(body), jsonrpc="2.0", id=body.get('id')))
+
+@asynccontextmanager
+async def fake_chain():
+    fake = FakeChain()
+    app = web.Application()
+    app.router.add_post('/', fake.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    fake.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/"
+    yield fake
+    await runner.cleanup()
+
+@pytest.mark.asyncio
+async def test_many_ops_in_flight():
+    poll = PollSchedule(initial=0.01, deadline=5)
+    async with fake_chain() as chain, AsyncAAUtils(chain.url, chain.url, receipt_poll=poll) as aa:
+        async def submit(i):
+            op = await aa.build_op(SENDER, TARGET, i, b"", nonce_key=i)
+            return await aa.sign_submit_op(op, KEY)
+        receipts = await asyncio.gather(*(submit(i) for i in range(200)))
+
+    assert len(receipts) == 200 and all(r['success'] for r in receipts)
+    assert len({r['receipt']['transactionHash'] for r in receipts}) == 200
+    assert aa._chain_id == 28882
+
+@pytest.mark.asyncio
+async def test_signature():
+    async with fake_chain() as chain, AsyncAAUtils(chain.url, chain.url) as aa:
+        op = await aa.build_op(SENDER, TARGET, 0, b"")
+        signed = await aa.sign_v7_op(dict(op), KEY)
+        op_hash = (await aa.op_hasher()).hash(op)
+        assert await aa.aa_nonce(SENDER, 0) == op['nonce'] == "0x" + "0" * 63 + "7"
+    signer = Account.recover_message(encode_defunct(op_hash), signature=signed['signature'])
+    assert signer == Account.from_key(KEY).address
+
+@pytest.mark.asyncio
+async def test_rejected():
+    async with fake_chain() as chain, AsyncAAUtils(chain.url, chain.url) as aa:
+        op = await aa.build_op(SENDER, TARGET, 0, b"")
+        op['callData'] = "0xdead"
+        with pytest.raises(UserOpSubmitError):
+            await aa.sign_submit_op(op, KEY)
+
+@pytest.mark.asyncio
+async def test_fee_refresh_coalesced():
+    async with fake_chain() as chain, AsyncAAUtils(chain.url, chain.url) as aa:
+        ops = await asyncio.gather(*(aa.build_op(SENDER, TARGET, 0, b"", nonce_key=i) for i in range(20)))
+
+    calls = [c['method'] for body in chain.requests for c in (body if isinstance(body, list) else [body])]
+    assert calls.count('eth_gasPrice') == 1
+    assert len({op['maxFeePerGas'] for op in ops}) == 1
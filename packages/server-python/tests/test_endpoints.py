@@ -0,0 +1,87 @@
+import time
+from unittest.mock import Mock, patch
+import pytest
+import requests
+from hybrid_compute_sdk.aa_utils import AAUtils
+from hybrid_compute_sdk.endpoints import EndpointPool, parse_urls
+
+def in_order(population, weights):
+    """Stands in for random.choices, always drawing the first endpoint"""
+    return [population[0]]
+
+def test_parse_urls():
+    assert parse_urls("http://a, http://b,") == ["http://a", "http://b"]
+    assert parse_urls(["http://a"]) == ["http://a"]
+    with pytest.raises(ValueError):
+        EndpointPool("")
+
+def test_failover():
+    pool = EndpointPool(["http://a", "http://b"], failure_threshold=2)
+    def fn(url):
+        if url == "http://a":
+            raise ConnectionError("down")
+        return url
+    with patch('hybrid_compute_sdk.endpoints.random.choices', side_effect=in_order):
+        for _ in range(5):
+            assert pool.call(fn) == "http://b"
+    # a is now skipped rather than tried first
+    assert [ep.url for ep in pool.ranked()] == ["http://b", "http://a"]
+    with pytest.raises(ConnectionError):
+        pool.call(fn, candidates=pool.endpoints[:1])
+
+def test_latency_weighting():
+    pool = EndpointPool(["http://slow", "http://fast"])
+    slow, fast = pool.endpoints
+    slow.latencies.extend([1.0] * 10)
+    fast.latencies.extend([0.01] * 10)
+    firsts = [pool.ranked()[0] for _ in range(200)]
+    assert firsts.count(fast) > 180
+
+def test_hedging():
+    pool = EndpointPool(["http://slow", "http://fast"])
+    slow, fast = pool.endpoints
+    slow.latencies.extend([0.01] * 10)
+    fast.latencies.extend([0.01] * 10)
+    calls = []
+    def fn(url):
+        calls.append(url)
+        if url == "http://slow":
+            time.sleep(0.5)
+        return url
+    with patch('hybrid_compute_sdk.endpoints.random.choices', return_value=[slow]):
+        start = time.monotonic()
+        assert pool.call(fn, hedge=True) == "http://fast"
+        assert time.monotonic() - start < 0.3
+        assert calls == ["http://slow", "http://fast"]
+        # Writes are not hedged
+        assert pool.call(fn) == "http://slow"
+
+def test_close():
+    pool = EndpointPool(["http://a", "http://b"])
+    with patch('hybrid_compute_sdk.endpoints.random.choices', side_effect=in_order):
+        assert pool.call(lambda url: url, hedge=True) == "http://a"
+    threads = list(pool.executor._threads)
+    assert threads
+    pool.close()
+    for t in threads:
+        t.join(timeout=5)
+    assert not any(t.is_alive() for t in threads)
+
+def test_bundler_failover():
+    aa = AAUtils(node_url="http://failover-node.test:8545",
+                 bundler_url="http://bundler-a.test,http://bundler-b.test")
+    urls = []
+    def post(url, json=None, **kwargs):
+        urls.append(url)
+        if url == "http://bundler-a.test":
+            raise requests.ConnectionError("refused")
+        return Mock(json=Mock(return_value={'jsonrpc': '2.0', 'id': json['id'], 'result': "0x01"}))
+    with patch('requests.Session.post', side_effect=post), \
+         patch('hybrid_compute_sdk.endpoints.random.choices', side_effect=in_order):
+        for _ in range(4):
+            assert aa.send_op({}) == "0x01"
+    assert aa.bundler_url == "http://bundler-a.test"
+    # After three failures bundler-a is skipped
+    assert urls.count("http://bundler-a.test") == 3
+    aa.close()
+    assert aa.bundlers.executor._shutdown
@@ -0,0 +1,84 @@
+from unittest.mock import Mock
+import pytest
+from hybrid_compute_sdk.fee_oracle import FeeOracle, get_fee_oracle
+
+def make_w3(block=7):
+    w3 = Mock()
+    w3.provider.is_async = False
+    results = {
+        'eth_blockNumber': lambda: hex(block),
+        'eth_gasPrice': lambda: hex(30),
+        'eth_maxPriorityFeePerGas': lambda: hex(10),
+        'eth_feeHistory': lambda: {'oldestBlock': hex(100), 'baseFeePerGas': [hex(18), hex(20)],
+                                   'reward': [[hex(5)]]},
+    }
+    w3.provider.make_batch_request.side_effect = \
+        lambda calls: [{'result': results[method]()} for method, _ in calls]
+    w3.provider.make_request.side_effect = lambda method, params: {'result': results[method]()}
+    return w3
+
+def test_cached_within_block():
+    w3 = make_w3()
+    oracle = FeeOracle(w3, max_age=60)
+    for _ in range(5):
+        fees = oracle.fees()
+    assert (fees.block, fees.gas_price, fees.tip, fees.base_fee) == (7, 30, 10, 20)
+    assert oracle.gas_price() == 30
+    # Block number and both fee suggestions in a single round trip
+    w3.provider.make_batch_request.assert_called_once_with(
+        [("eth_blockNumber", []), ("eth_gasPrice", []), ("eth_maxPriorityFeePerGas", [])])
+
+def test_refresh_on_new_block():
+    w3 = make_w3()
+    oracle = FeeOracle(w3, max_age=60)
+    oracle.fees()
+    oracle.observe_block(7)
+    oracle.fees()
+    assert w3.provider.make_batch_request.call_count == 1
+    oracle.observe_block(8)
+    oracle.fees()
+    assert w3.provider.make_batch_request.call_count == 2
+
+def test_refresh_after_max_age():
+    w3 = make_w3()
+    oracle = FeeOracle(w3, max_age=0)
+    oracle.fees()
+    oracle.fees()
+    assert w3.provider.make_batch_request.call_count == 2
+
+def test_fee_history():
+    w3 = make_w3()
+    oracle = FeeOracle(w3, percentile=50, max_age=60)
+    fees = oracle.fees()
+    oracle.fees()
+    assert (fees.block, fees.gas_price, fees.tip, fees.base_fee) == (100, 25, 5, 20)
+    w3.provider.make_request.assert_called_once_with("eth_feeHistory", ["0x1", "latest", [50]])
+    assert w3.provider.make_batch_request.call_count == 0
+
+def test_provider_without_batches():
+    w3 = make_w3()
+    w3.provider.make_batch_request.side_effect = NotImplementedError
+    fees = FeeOracle(w3).fees()
+    assert (fees.block, fees.gas_price, fees.tip) == (7, 30, 10)
+    assert w3.provider.make_request.call_count == 3
+
+def test_fetch_error():
+    w3 = make_w3()
+    w3.provider.make_batch_request.side_effect = lambda calls: [{'error': {'message': "down"}}] * len(calls)
+    with pytest.raises(ValueError):
+        FeeOracle(w3).fees()
+
+def test_async_oracle_is_not_fetched():
+    w3 = make_w3()
+    w3.provider.is_async = True
+    oracle = FeeOracle(w3)
+    with pytest.raises(TypeError):
+        oracle.fees()
+    fees = oracle.update([hex(9), hex(30), hex(10)])
+    assert oracle.fees() is fees and fees.block == 9
+
+def test_shared_per_node():
+    w3a = make_w3()
+    w3b = make_w3()
+    w3a.provider.endpoint_uri = w3b.provider.endpoint_uri = "http://node.test:8545"
+    assert get_fee_oracle(w3a) is get_fee_oracle(w3b)
@@ -0,0 +1,121 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hybrid_compute_sdk.fetch import Fetcher, FetchError, CircuitOpenError
+
+class Upstream(BaseHTTPRequestHandler):
+    """Test API. /ok, /slow and /etag return JSON; /flaky fails twice first; /down always fails;
+       /stray304 answers 304 unless caches are bypassed; /always304 always answers 304."""
+    hits = {}
+
+    def do_GET(self):
+        Upstream.hits[self.path] = Upstream.hits.get(self.path, 0) + 1
+        n = Upstream.hits[self.path]
+        if self.path == '/slow':
+            time.sleep(0.3)
+        if self.path == '/down' or (self.path == '/flaky' and n <= 2):
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.path == '/missing':
+            self.send_response(404)
+            self.end_headers()
+            return
+        if (self.path == '/etag' and self.headers.get('If-None-Match') == '"v1"') or \
+                (self.path == '/stray304' and self.headers.get('Cache-Control') != 'no-cache') or \
+                self.path == '/always304':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps({'score': [2, 1], 'n': n}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if self.path == '/etag':
+            self.send_header('ETag', '"v1"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def upstream():
+    Upstream.hits = {}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+@pytest.fixture
+def fetcher():
+    f = Fetcher(ttl=60, backoff=0.01, failure_threshold=2, reset_timeout=60)
+    yield f
+    f.close()
+
+def test_cached(upstream, fetcher):
+    assert fetcher.get_json(upstream + '/ok') == {'score': [2, 1], 'n': 1}
+    assert fetcher.get_json(upstream + '/ok') == {'score': [2, 1], 'n': 1}
+    assert Upstream.hits['/ok'] == 1
+
+def test_unexpected_not_modified(upstream, fetcher):
+    # A 304 without a cached entry has no body to reuse, so the request is
+    # repeated once with Cache-Control: no-cache
+    assert fetcher.get_json(upstream + '/stray304')['n'] == 2
+    assert Upstream.hits['/stray304'] == 2
+    with pytest.raises(FetchError):
+        fetcher.get_json(upstream + '/always304')
+    assert Upstream.hits['/always304'] == 2
+
+def test_etag_revalidation(upstream, fetcher):
+    assert fetcher.get_json(upstream + '/etag', ttl=0)['n'] == 1
+    # Expired, so revalidated with a 304 and the cached body is kept
+    assert fetcher.get_json(upstream + '/etag', ttl=0)['n'] == 1
+    assert Upstream.hits['/etag'] == 2
+
+def test_coalescing(upstream, fetcher):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(fetcher.get_json(upstream + '/slow')))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(results) == 8
+    assert Upstream.hits['/slow'] == 1
+
+def test_retry(upstream, fetcher):
+    assert fetcher.get_json(upstream + '/flaky')['n'] == 3
+
+def test_client_error_not_retried(upstream, fetcher):
+    with pytest.raises(FetchError):
+        fetcher.get_json(upstream + '/missing')
+    assert Upstream.hits['/missing'] == 1
+
+def test_circuit_breaker(upstream, fetcher):
+    for _ in range(2):
+        with pytest.raises(FetchError):
+            fetcher.get_json(upstream + '/down')
+    hits = Upstream.hits['/down']
+    with pytest.raises(CircuitOpenError):
+        fetcher.get_json(upstream + '/ok')
+    assert Upstream.hits['/down'] == hits
+    assert '/ok' not in Upstream.hits
+
+def test_deadline(upstream):
+    f = Fetcher(deadline=0.05)
+    try:
+        with pytest.raises(FetchError):
+            f.get_json(upstream + '/slow')
+    finally:
+        f.close()
+
+@pytest.mark.asyncio
+async def test_fetch_json(upstream, fetcher):
+    assert (await fetcher.fetch_json(upstream + '/ok'))['score'] == [2, 1]
@@ -0,0 +1,68 @@
+import pytest
+import requests
+from eth_account import Account
+from web3 import Web3
+from hybrid_compute_sdk.aa_utils import AAUtils, FeeBump, PollSchedule, UserOpSubmitError
+from hybrid_compute_sdk.localnet import LocalChain, serve
+from hybrid_compute_sdk.node_client import NodeClient
+
+SENDER = "0x" + "5a" * 20
+OWNER = Account.create()
+
+@pytest.fixture
+def local():
+    with serve(block_time=0) as server:
+        yield server
+
+def make_aa(server, **kwargs):
+    return AAUtils(node_url=server.url, bundler_url=server.url,
+                   receipt_poll=PollSchedule(initial=0.01, deadline=5), **kwargs)
+
+def test_submit_op(local):
+    aa = make_aa(local)
+    op = aa.build_op(SENDER, OWNER.address, 0, b"\x01\x02")
+    ok, op = aa.estimate_op_gas(op)
+    assert ok and Web3.to_int(hexstr=op['callGasLimit']) > 0
+    receipt = aa.sign_submit_op(op, OWNER.key.hex())
+    assert receipt['success'] and receipt['sender'] == SENDER
+    # The nonce advanced on chain, so reusing it is rejected
+    assert Web3.to_int(hexstr=aa.build_op(SENDER, OWNER.address, 0, b"")['nonce']) == 1
+    with pytest.raises(UserOpSubmitError, match="AA25"):
+        aa.send_op(aa.sign_v7_op(op, OWNER.key.hex()))
+    aa.close()
+
+def test_replacement():
+    with serve(block_time=60) as server:
+        aa = make_aa(server, fee_bump=FeeBump(interval=60))
+        op = aa.sign_v7_op(aa.build_op(SENDER, OWNER.address, 0, b""), OWNER.key.hex())
+        aa.send_op(op)
+        with pytest.raises(UserOpSubmitError, match="replacement underpriced"):
+            aa.send_op(dict(op, signature="0x00"))
+        # sign_send_op bumps the fees and replaces the pending op
+        (replaced, _) = aa.sign_send_op(op, OWNER.key.hex())
+        assert Web3.to_int(hexstr=replaced['maxFeePerGas']) > Web3.to_int(hexstr=op['maxFeePerGas'])
+        assert len(server.chain.mempool) == 1
+        aa.close()
+
+def test_fault_injection():
+    def run(seed):
+        chain = LocalChain(block_time=0, error_rate=0.3, drop_rate=0.2, seed=seed)
+        outcomes = []
+        with serve(chain) as server:
+            for _ in range(20):
+                response = requests.post(server.url, json={'jsonrpc': "2.0", 'id': 1, 'method': "eth_chainId"},
+                                         timeout=5)
+                outcomes.append(response.status_code if response.status_code != 200 else
+                                'error' in response.json())
+        return outcomes
+    outcomes = run(7)
+    assert 503 in outcomes and True in outcomes and False in outcomes
+    # The same seed injects the same faults
+    assert run(7) == outcomes
+
+def test_node_client(local):
+    local.chain.mine()
+    local.chain.mine()
+    client = NodeClient(local.url, block_wait=0)
+    assert client.block_number() == 2
+    assert client.get_block(2)['hash'] == local.chain.block_hash(2)
@@ -0,0 +1,86 @@
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hybrid_compute_sdk.membership import AddressSet, encode_index, normalize_address, write_index, \
+    write_index_from_file
+
+ADDRS = ['0x' + f"{i:040x}" for i in range(1, 1001)]
+
+def test_normalize_address():
+    expected = bytes.fromhex('ab' * 20)
+    assert normalize_address('0x' + 'ab' * 20) == expected
+    assert normalize_address('0X' + 'AB' * 20) == expected
+    assert normalize_address('ab' * 20) == expected
+    assert normalize_address(expected) == expected
+    assert normalize_address('0x123') is None
+    assert normalize_address('0x' + 'zz' * 20) is None
+    assert normalize_address(123) is None
+
+def test_in_memory_set():
+    s = AddressSet.from_addresses(ADDRS[:10])
+    assert len(s) == 10
+    assert ADDRS[0] in s
+    assert ADDRS[0].upper().replace('0X', '0x') in s
+    assert ADDRS[10] not in s
+    assert '0x123' not in s
+    assert len(AddressSet()) == 0
+    assert ADDRS[0] not in AddressSet()
+
+def test_invalid_entry():
+    with pytest.raises(ValueError):
+        AddressSet.from_addresses(['0x123'])
+
+def test_external_sort(tmp_path):
+    # Shuffled with duplicates, in chunks small enough to spill several runs
+    addrs = ADDRS[::-3] + ADDRS[::2] + ADDRS[:100]
+    assert encode_index(addrs, chunk=64) == encode_index(addrs)
+    path = str(tmp_path / 'list.idx')
+    write_index(addrs, path, chunk=50)
+    s = AddressSet(path)
+    assert len(s) == len(set(addrs))
+    assert all(a in s for a in addrs)
+    assert ADDRS[101] not in s
+
+def test_invalid_entry_in_file(tmp_path):
+    path = tmp_path / 'list.idx'
+    with pytest.raises(ValueError):
+        write_index(ADDRS[:100] + ['0x123'], str(path), chunk=10)
+    assert list(tmp_path.iterdir()) == []
+
+def test_index_file(tmp_path):
+    path = str(tmp_path / 'list.idx')
+    write_index(ADDRS[::2], path)
+    s = AddressSet(path)
+    assert len(s) == 500
+    assert all(a in s for a in ADDRS[::2])
+    assert not any(a in s for a in ADDRS[1::2])
+
+def test_index_from_text_file(tmp_path):
+    src = tmp_path / 'list.txt'
+    src.write_text("# allow list\n\n" + "\n".join(ADDRS[:3]) + "\n" + ADDRS[0] + "\n")
+    path = str(tmp_path / 'list.idx')
+    write_index_from_file(str(src), path)
+    s = AddressSet(path)
+    assert len(s) == 3
+    assert ADDRS[2] in s
+
+def test_reload_on_replace(tmp_path):
+    path = str(tmp_path / 'list.idx')
+    write_index(ADDRS[:1], path)
+    s = AddressSet(path, check_interval=0)
+    assert ADDRS[0] in s and ADDRS[1] not in s
+    write_index(ADDRS[1:3], path)
+    assert ADDRS[1] in s and ADDRS[0] not in s
+    assert len(s) == 2
+
+def test_bad_replacement_keeps_loaded_index(tmp_path):
+    path = str(tmp_path / 'list.idx')
+    write_index(ADDRS[:1], path)
+    s = AddressSet(path, check_interval=0)
+    with open(path + '.new', 'wb') as f:
+        f.write(b'garbage')
+    os.replace(path + '.new', path)
+    assert ADDRS[0] in s
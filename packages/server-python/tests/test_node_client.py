@@ -0,0 +1,63 @@
+from unittest.mock import Mock, patch
+import pytest
+from hybrid_compute_sdk.node_client import NodeClient, BlockNotFound
+
+class FakeNodes:
+    """Nodes at different heights, answering eth_blockNumber and eth_getBlockByNumber"""
+    def __init__(self, heights):
+        self.heights = heights
+        self.requests = []
+
+    def post(self, url, json=None, **kwargs):
+        self.requests.append((url, json['method']))
+        if json['method'] == 'eth_blockNumber':
+            result = hex(self.heights[url])
+        else:
+            number = int(json['params'][0], 16)
+            result = None if number > self.heights[url] else {'number': hex(number), 'hash': "0x" + f"{number:064x}"}
+        return Mock(json=Mock(return_value={'jsonrpc': '2.0', 'id': json['id'], 'result': result}))
+
+def test_skips_lagging_node():
+    nodes = FakeNodes({"http://behind.test": 10, "http://ahead.test": 12})
+    client = NodeClient(list(nodes.heights), block_wait=0)
+    with patch('requests.Session.post', side_effect=nodes.post):
+        assert client.block_hash(12) == (12).to_bytes(32, 'big')
+        assert client.height("http://behind.test") == 10
+        # Heights are now known, so only the node which has the block is asked
+        nodes.requests.clear()
+        client.get_block(11)
+        assert nodes.requests == [("http://ahead.test", "eth_getBlockByNumber")]
+    client.close()
+    assert client.nodes.executor._shutdown
+
+def test_block_race():
+    nodes = FakeNodes({"http://a.test": 10, "http://b.test": 11})
+    client = NodeClient(list(nodes.heights), block_wait=0)
+    # Both nodes are believed to be at 11, but only b has the block
+    client.heights = {"http://a.test": 11, "http://b.test": 11}
+    with patch('requests.Session.post', side_effect=nodes.post), \
+         patch('hybrid_compute_sdk.endpoints.random.choices', side_effect=lambda population, weights: [population[0]]):
+        assert client.get_block(11)['number'] == "0xb"
+        assert client.height("http://a.test") == 10
+        with pytest.raises(BlockNotFound):
+            client.get_block(13)
+
+def test_block_wait():
+    nodes = FakeNodes({"http://a.test": 10})
+    client = NodeClient("http://a.test", block_wait=2)
+    def mine(*args, **kwargs):
+        nodes.heights["http://a.test"] += 1
+    with patch('requests.Session.post', side_effect=nodes.post), \
+         patch('hybrid_compute_sdk.node_client.time.sleep', side_effect=mine):
+        assert client.get_block(12)['number'] == "0xc"
+
+def test_missing_block_not_a_failure():
+    nodes = FakeNodes({"http://a.test": 10})
+    client = NodeClient("http://a.test", block_wait=0)
+    with patch('requests.Session.post', side_effect=nodes.post):
+        for _ in range(5):
+            with pytest.raises(BlockNotFound):
+                client.get_block(11)
+    # The node answered, so it is neither benched nor penalised
+    (ep,) = client.nodes.endpoints
+    assert ep.failures == 0 and ep.healthy()
@@ -0,0 +1,111 @@
+from unittest.mock import Mock, patch
+import pytest
+from web3 import Web3
+from hybrid_compute_sdk.aa_utils import AAUtils, PollSchedule, UserOpSubmitError
+from hybrid_compute_sdk.op_pipeline import OpPipeline
+
+KEY = "0x" + "1" * 64
+SENDER = "0x" + "3" * 40
+
+class FakeBundler:
+    """Node and bundler for requests.Session.post. Ops are accepted only with the next
+       sequence number of their nonce key, as a bundler mempool would."""
+    def __init__(self, chain_seq=None):
+        self.chain_seq = dict(chain_seq or {})
+        self.expected = dict(self.chain_seq)
+        self.sent = []
+        self.posts = []
+        self.reject = None
+
+    def answer(self, call):
+        method = call['method']
+        if method == 'eth_call':
+            key = Web3.to_int(Web3.to_bytes(hexstr=call['params'][0]['data'])[36:68])
+            return {'result': "0x" + f"{(key << 64) | self.chain_seq.get(key, 0):064x}"}
+        if method == 'eth_chainId':
+            return {'result': hex(28882)}
+        if method == 'eth_sendUserOperation':
+            if self.reject:
+                return {'error': {'code': -32602, 'message': self.reject}}
+            nonce = Web3.to_int(hexstr=call['params'][0]['nonce'])
+            (key, seq) = (nonce >> 64, nonce & (2**64 - 1))
+            if seq != self.expected.get(key, 0):
+                return {'error': {'code': -32602, 'message': "AA25 invalid account nonce"}}
+            self.expected[key] = seq + 1
+            self.sent.append(nonce)
+            return {'result': "0x" + f"{nonce:064x}"}
+        if method == 'eth_getUserOperationReceipt':
+            return {'result': {'success': True, 'userOpHash': call['params']['hash'],
+                               'receipt': {'status': "0x1", 'transactionHash': "0x00"}}}
+        raise AssertionError(method)
+
+    def post(self, url, json=None, **kwargs):
+        self.posts.append(json)
+        if isinstance(json, list):
+            body = [dict(self.answer(c), jsonrpc="2.0", id=c['id']) for c in json]
+        else:
+            body = dict(self.answer(json), jsonrpc="2.0", id=json['id'])
+        return Mock(json=Mock(return_value=body))
+
+def make_op():
+    return {'sender': SENDER, 'nonce': "0x0", 'callData': "0x", 'callGasLimit': "0x1",
+            'verificationGasLimit': "0x1", 'preVerificationGas': "0x1",
+            'maxFeePerGas': "0x1", 'maxPriorityFeePerGas': "0x1"}
+
+def make_aa():
+    aa = AAUtils(node_url="http://pipeline-node.test:8545", bundler_url="http://bundler.test",
+                 receipt_poll=PollSchedule(initial=0.01, deadline=5))
+    aa._chain_id = 28882
+    return aa
+
+def test_pipelined_submission():
+    bundler = FakeBundler(chain_seq={1: 5, 2: 0, 3: 9})
+    pipeline = OpPipeline(make_aa(), SENDER, KEY, keys=[1, 2, 3])
+    with patch('requests.Session.post', side_effect=bundler.post):
+        hashes = pipeline.submit_all(make_op() for _ in range(9))
+        receipts = pipeline.wait_all()
+
+    assert [(n >> 64, n & 0xffff) for n in bundler.sent] == \
+        [(1, 5), (2, 0), (3, 9), (1, 6), (2, 1), (3, 10), (1, 7), (2, 2), (3, 11)]
+    assert [r['userOpHash'] for r in receipts] == hashes
+    # One batched nonce read and nine sends, with receipts polled in batches by the watcher
+    sends = [p for p in bundler.posts if isinstance(p, dict)]
+    polls = [p for p in bundler.posts[1:] if isinstance(p, list)]
+    assert len(bundler.posts[0]) == 3 and len(sends) == 9
+    assert sum(len(p) for p in polls) == 9
+    assert pipeline.pending == []
+
+def test_resync_on_nonce_error():
+    bundler = FakeBundler(chain_seq={1: 0})
+    pipeline = OpPipeline(make_aa(), SENDER, KEY, keys=[1])
+    with patch('requests.Session.post', side_effect=bundler.post):
+        pipeline.submit(make_op())
+        # Another client used the key behind our back
+        bundler.chain_seq[1] = bundler.expected[1] = 4
+        pipeline.submit(make_op())
+    assert bundler.sent == [(1 << 64) | 0, (1 << 64) | 4]
+
+def test_other_errors_raised():
+    bundler = FakeBundler()
+    bundler.reject = "AA21 didn't pay prefund"
+    pipeline = OpPipeline(make_aa(), SENDER, KEY, keys=[1])
+    with patch('requests.Session.post', side_effect=bundler.post):
+        with pytest.raises(UserOpSubmitError):
+            pipeline.submit(make_op())
+    assert pipeline.pending == []
+
+def test_failed_send_releases_nonce():
+    bundler = FakeBundler(chain_seq={1: 3})
+    pipeline = OpPipeline(make_aa(), SENDER, KEY, keys=[1])
+    with patch('requests.Session.post', side_effect=bundler.post):
+        pipeline.submit(make_op())
+        bundler.reject = "AA21 didn't pay prefund"
+        with pytest.raises(UserOpSubmitError):
+            pipeline.submit(make_op())
+        bundler.reject = None
+        # The rejected op's sequence number is reused, so no nonce error and no resync
+        pipeline.submit(make_op())
+        receipts = pipeline.wait_all()
+    assert bundler.sent == [(1 << 64) | 3, (1 << 64) | 4]
+    assert len(receipts) == 2
+    assert sum(1 for p in bundler.posts if isinstance(p, list) and p[0]['method'] == 'eth_call') == 1
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import threading
+import pytest
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+from web3 import Web3
+from hybrid_compute_sdk import providers
+from hybrid_compute_sdk.fee_oracle import get_fee_oracle
+from hybrid_compute_sdk.providers import make_provider, get_head_subscription, wait_for_receipt
+
+TX_HASH = "0x" + "ab" * 32
+
+class FakeWsNode:
+    """WebSocket node which mines a block every 50ms once subscribed to, and
+       has a receipt for TX_HASH from block 3"""
+    def __init__(self):
+        self.block = 0
+        self.receipt_calls = 0
+
+    def answer(self, req):
+        if req['method'] == 'eth_getTransactionReceipt':
+            self.receipt_calls += 1
+            if self.block < 3:
+                return None
+            return {'transactionHash': TX_HASH, 'blockNumber': "0x3", 'status': "0x1", 'logs': []}
+        return hex(28882)
+
+    async def handler(self, ws):
+        async for raw in ws:
+            req = json.loads(raw)
+            if req['method'] == 'eth_subscribe':
+                await ws.send(json.dumps({'jsonrpc': "2.0", 'id': req['id'], 'result': "0x5ub"}))
+                asyncio.ensure_future(self.mine(ws))
+            else:
+                await ws.send(json.dumps({'jsonrpc': "2.0", 'id': req['id'], 'result': self.answer(req)}))
+
+    async def mine(self, ws):
+        for _ in range(20):
+            await asyncio.sleep(0.05)
+            self.block += 1
+            head = {'number': hex(self.block), 'hash': "0x" + f"{self.block:064x}"}
+            try:
+                await ws.send(json.dumps({'jsonrpc': "2.0", 'method': "eth_subscription",
+                                          'params': {'subscription': "0x5ub", 'result': head}}))
+            except ConnectionClosed:
+                return
+
+@pytest.fixture
+def ws_node():
+    node = FakeWsNode()
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    async def run():
+        async with serve(node.handler, '127.0.0.1', 0) as server:
+            node.url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            ready.set()
+            await asyncio.Future()
+    threading.Thread(target=loop.run_until_complete, args=(run(),), daemon=True).start()
+    ready.wait(5)
+    yield node
+    heads = providers.subscriptions.pop(node.url, None)
+    if heads:
+        heads.close()
+
+def test_make_provider():
+    assert isinstance(make_provider("https://node.test"), Web3.HTTPProvider)
+    assert isinstance(make_provider("ws://node.test:8546"), providers.LegacyWebSocketProvider)
+    ipc = make_provider("ipc:///tmp/geth.ipc")
+    assert isinstance(ipc, Web3.IPCProvider) and ipc.ipc_path == "/tmp/geth.ipc"
+    assert get_head_subscription("https://node.test") is None
+
+def test_receipt_per_head(ws_node):
+    w3 = Web3(make_provider(ws_node.url))
+    oracle = get_fee_oracle(w3)
+    receipt = wait_for_receipt(w3, TX_HASH, timeout=5)
+    assert receipt['status'] == 1 and receipt['blockNumber'] == 3
+    # Looked up once at the start and once per head until block 3
+    assert ws_node.receipt_calls <= 4
+    assert oracle.latest_block >= 3
@@ -0,0 +1,65 @@
+from unittest.mock import Mock, patch
+from web3 import Web3
+from eth_abi import abi as ethabi
+from hybrid_compute_sdk.aa_utils import AAUtils, assemble_op
+from hybrid_compute_sdk.fee_oracle import FeeData
+from hybrid_compute_sdk.pvg import L1FeeParams, GAS_PRICE_ORACLE, PACKED_OP_TYPE, static_pvg, estimate_pvg
+from hybrid_compute_sdk.userop_hash import packed_op
+
+SENDER = "0x" + "3" * 40
+TARGET = "0x" + "4" * 40
+GWEI = 10**9
+L1 = L1FeeParams(l1_base_fee=20 * GWEI, blob_base_fee=1, base_fee_scalar=1368, blob_base_fee_scalar=810949)
+
+def make_op(calldata=b"", tip=GWEI):
+    return assemble_op(SENDER, "0x5", FeeData(None, 2 * GWEI + tip, tip), TARGET, 0, calldata)
+
+def test_l1_fee():
+    data = bytes(10) + b"\x01" * 10
+    l1_gas = 10 * 4 + 10 * 16 + 68 * 16
+    assert L1.l1_fee(data) == l1_gas * (16 * 1368 * 20 * GWEI + 810949) // (16 * 10**6)
+
+def test_static_pvg():
+    op = dict(make_op(), callData="0x12345678")
+    base = static_pvg(op)
+    # 32 more calldata bytes add one word to the packed op
+    assert static_pvg(dict(op, callData="0x12345678" + "ff" * 32)) == base + 32 * 16 + 4
+    assert static_pvg(dict(op, callData="0x12345678" + "00" * 32)) == base + 32 * 4 + 4
+    assert base > 21000 + 18300
+
+def test_estimate_pvg():
+    low_tip = estimate_pvg(make_op(tip=GWEI // 100), L1, 2 * GWEI)
+    high_tip = estimate_pvg(make_op(tip=GWEI), L1, 2 * GWEI)
+    # The L1 fee is paid through L2 gas, so a higher gas price needs less of it
+    assert low_tip > high_tip > static_pvg(make_op())
+    assert estimate_pvg(make_op(b"\xff" * 1000), L1, 2 * GWEI) > high_tip
+
+def test_packed_op_forms():
+    op = dict(make_op(b"\x01\x02"), preVerificationGas="0x1234", signature="0xaabb")
+    fields = packed_op(op)
+    packed = dict(op, accountGasLimits=Web3.to_hex(fields[4]), gasFees=Web3.to_hex(fields[6]),
+                  initCode="0x", paymasterAndData="0x")
+    assert packed_op(packed) == fields
+    assert ethabi.encode([PACKED_OP_TYPE], [fields])
+
+def test_build_op_local_pvg():
+    aa = AAUtils(node_url="http://pvg-node.test:8545", bundler_url="http://bundler.test", local_pvg=True)
+    l1_results = [hex(v) for v in L1]
+    posts = []
+    def post(url, json=None, **kwargs):
+        posts.append(json)
+        def result(c):
+            if c['method'] == 'eth_call' and c['params'][0]['to'] == GAS_PRICE_ORACLE:
+                return l1_results.pop(0)
+            return {'eth_call': "0x0", 'eth_blockNumber': hex(100), 'eth_gasPrice': hex(3 * GWEI),
+                    'eth_maxPriorityFeePerGas': hex(GWEI), 'eth_chainId': hex(28882)}[c['method']]
+        return Mock(json=Mock(return_value=[{'jsonrpc': '2.0', 'id': c['id'], 'result': result(c)} for c in json]))
+
+    with patch('requests.Session.post', side_effect=post):
+        op = aa.build_op(SENDER, TARGET, 0, b"")
+        assert len(posts) == 1 and len(posts[0]) == 9
+        assert Web3.to_int(hexstr=op['preVerificationGas']) == \
+            estimate_pvg(dict(op, preVerificationGas="0x0"), L1, 2 * GWEI)
+        # Parameters are cached, so the next op only reads the nonce
+        aa.build_op(SENDER, TARGET, 0, b"")
+        assert len(posts[1]) == 1
@@ -0,0 +1,32 @@
+import random
+import pytest
+from eth_abi import abi as ethabi
+
+WORDS = ["able", "Bold", "cart", "frog", "dusk", "toolong", "e-go", "fern", "gust"]
+
+@pytest.fixture(scope="module")
+def bench(offchain):
+    return offchain.script("ramble_bench")
+
+@pytest.fixture(scope="module")
+def ramble(offchain, bench, tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("ramble")
+    (tmp / "words").write_text("\n".join(WORDS) + "\n", encoding="utf-8")
+    return offchain.handler("ramble_offchain", bench.load_ramble,
+        OC_WORDS_FILE=str(tmp / "words"), OC_WORDS_INDEX=str(tmp / "words.idx"))
+
+def test_index(bench, ramble):
+    # Lower-case four letter words only, with "frog" reserved for cheat mode
+    assert ramble.word_count == 5
+    assert [bench.word_at(ramble, i) for i in range(5)] == ["able", "cart", "dusk", "fern", "gust"]
+    assert ramble.index_is_current()
+
+@pytest.mark.parametrize("n", [1, 2, 17, 999])
+def test_encode_words_matches_eth_abi(bench, ramble, n):
+    rng = random.Random(n)
+    for cheat in (None, 0, n - 1):
+        idx = rng.choices(range(ramble.word_count), k=n)
+        words = [bench.word_at(ramble, i) for i in idx]
+        if cheat is not None:
+            words[cheat] = "frog"
+        assert ramble.encode_words(idx, cheat) == ethabi.encode(['string[]'], [words])
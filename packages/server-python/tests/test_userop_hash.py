@@ -0,0 +1,88 @@
+import random
+from web3 import Web3
+from eth_abi import abi as ethabi
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from hybrid_compute_sdk.userop_hash import UserOpHasher, packed_op
+from hybrid_compute_sdk.aa_utils import AAUtils
+
+ENTRY_POINT = "0x0000000071727De22E5E9d8BAf0edAc6f37da032"
+CHAIN_ID = 28882
+
+def reference_hash(op):
+    """getUserOpHash via the generic ABI encoder, as AAUtils.sign_v7_op previously computed it"""
+    pm_and_data = op.get('paymasterAndData', "0x")
+    if 'paymaster' in op:
+        pm_and_data = op['paymaster'] + op['paymasterVerificationGasLimit'][2:].zfill(32) + \
+            op['paymasterPostOpGasLimit'][2:].zfill(32)
+    if 'accountGasLimits' in op:
+        account_gas_limits = Web3.to_bytes(hexstr=op['accountGasLimits'])
+        gas_fees = Web3.to_bytes(hexstr=op['gasFees'])
+    else:
+        account_gas_limits = ethabi.encode(['uint128'], [Web3.to_int(hexstr=op['verificationGasLimit'])])[16:32] \
+            + ethabi.encode(['uint128'], [Web3.to_int(hexstr=op['callGasLimit'])])[16:32]
+        gas_fees = ethabi.encode(['uint128'], [Web3.to_int(hexstr=op['maxPriorityFeePerGas'])])[16:32] \
+            + ethabi.encode(['uint128'], [Web3.to_int(hexstr=op['maxFeePerGas'])])[16:32]
+    pack1 = ethabi.encode(['address','uint256','bytes32','bytes32','bytes32','uint256','bytes32','bytes32'], [
+        op['sender'], Web3.to_int(hexstr=op['nonce']), Web3.keccak(hexstr="0x"),
+        Web3.keccak(hexstr=op['callData']), account_gas_limits,
+        Web3.to_int(hexstr=op['preVerificationGas']), gas_fees, Web3.keccak(hexstr=pm_and_data)])
+    return Web3.keccak(ethabi.encode(['bytes32','address','uint256'], [Web3.keccak(pack1), ENTRY_POINT, CHAIN_ID]))
+
+def random_op(rng, paymaster=False):
+    op = {
+        'sender': Web3.to_checksum_address(Web3.to_hex(rng.randbytes(20))),
+        'nonce': Web3.to_hex(rng.getrandbits(256)),
+        'callData': Web3.to_hex(rng.randbytes(rng.randrange(0, 300))),
+        'callGasLimit': hex(rng.getrandbits(32)),
+        'verificationGasLimit': hex(rng.getrandbits(32)),
+        'preVerificationGas': hex(rng.getrandbits(40)),
+        'maxFeePerGas': hex(rng.getrandbits(64)),
+        'maxPriorityFeePerGas': hex(rng.getrandbits(48)),
+    }
+    if paymaster:
+        op['paymaster'] = Web3.to_hex(rng.randbytes(20))
+        op['paymasterData'] = "0x"
+        op['paymasterVerificationGasLimit'] = "0x10002"
+        op['paymasterPostOpGasLimit'] = "0x10000"
+    return op
+
+def test_matches_reference():
+    rng = random.Random(7)
+    hasher = UserOpHasher(ENTRY_POINT, CHAIN_ID)
+    ops = [random_op(rng, paymaster=i % 2 == 1) for i in range(20)]
+    ops.append({
+        'sender': "0x" + "3" * 40, 'nonce': "0x" + "0" * 63 + "1", 'initCode': "0x",
+        'callData': "0x1234", 'accountGasLimits': "0x" + "00" * 14 + "6ed9" + "00" * 13 + "053652",
+        'preVerificationGas': "0xF0000", 'gasFees': "0x" + "00" * 12 + "39d10680" + "00" * 11 + "025b9c274c",
+        'paymasterAndData': "0x",
+    })
+    expected = [reference_hash(op) for op in ops]
+    assert [hasher.hash(op) for op in ops] == expected
+    assert hasher.hash_many(ops) == expected
+
+def test_sign_v7_op():
+    aa = AAUtils(node_url="http://hasher-node.test:8545", bundler_url="http://bundler.test")
+    aa._chain_id = CHAIN_ID
+    key = "0x" + "1" * 64
+    op = random_op(random.Random(1))
+    signed = aa.sign_v7_op(dict(op), key)
+    signer = Account.recover_message(encode_defunct(reference_hash(op)), signature=signed['signature'])
+    assert signer == Account.from_key(key).address
+
+def test_packed_form_hashes_the_same():
+    rng = random.Random(3)
+    hasher = UserOpHasher(ENTRY_POINT, CHAIN_ID)
+    for i in range(6):
+        op = random_op(rng, paymaster=i % 2 == 1)
+        if i >= 2:
+            op['factory'] = Web3.to_hex(rng.randbytes(20))
+            op['factoryData'] = Web3.to_hex(rng.randbytes(i * 10))
+        fields = packed_op(op)
+        packed = {'sender': op['sender'], 'nonce': op['nonce'], 'initCode': fields[2], 'callData': op['callData'],
+                  'accountGasLimits': fields[4], 'preVerificationGas': op['preVerificationGas'],
+                  'gasFees': fields[6], 'paymasterAndData': fields[7]}
+        assert hasher.pack(packed) == hasher.pack(op)
+    # An empty initCode or paymasterAndData may be given as "" as well as "0x"
+    op = dict(packed, initCode="", paymasterAndData="")
+    assert hasher.hash(op) == hasher.hash(dict(op, initCode="0x", paymasterAndData="0x"))
@@ -1,8 +1,10 @@
+import asyncio
+import time
 import pytest
-import os
-from unittest.mock import Mock, patch, AsyncMock, MagicMock
+from unittest.mock import Mock, patch, AsyncMock
 from web3 import Web3
 from eth_account import Account
+from hybrid_compute_sdk.localnet import serve
 from hybrid_compute_sdk.userop_manager import UserOpManager, ACCOUNT_FACTORY_ABI
 
 # Test constants
@@ -21,28 +23,28 @@ class TestUserOpManager:
     
     @pytest.fixture
     def mock_w3(self):
-        """Mock Web3 instance"""
+        """Mock AsyncWeb3 instance"""
         mock_w3 = Mock()
-        mock_w3.is_connected = True
+        mock_w3.is_connected = AsyncMock(return_value=True)
+        mock_w3.provider.has_persistent_connection = True
+        mock_w3.provider.connect = AsyncMock()
+        fees = {'eth_blockNumber': hex(100), 'eth_gasPrice': hex(20000000000),  # 20 gwei
+                'eth_maxPriorityFeePerGas': hex(1000000000)}
+        mock_w3.provider.make_batch_request = AsyncMock(
+            side_effect=lambda calls: [{'result': fees[method]} for method, _ in calls])
         
         # Mock eth namespace
         mock_eth = Mock()
-        mock_eth.gas_price = 20000000000  # 20 gwei
-        mock_eth.get_transaction_count.return_value = 0
-        mock_eth.estimate_gas.return_value = 100000
-        mock_eth.send_raw_transaction.return_value = b'\x01' * 32
-        mock_eth.wait_for_transaction_receipt.return_value = Mock(
+        mock_eth.get_transaction_count = AsyncMock(return_value=0)
+        mock_eth.estimate_gas = AsyncMock(return_value=100000)
+        mock_eth.send_raw_transaction = AsyncMock(return_value=b'\x01' * 32)
+        mock_eth.wait_for_transaction_receipt = AsyncMock(return_value=Mock(
             status=1,
             transactionHash=b'\x01' * 32
-        )
-        mock_eth.call.return_value = b'\x00' * 32
-        
-        # Mock codec for decoding
-        mock_codec = Mock()
-        mock_codec.decode_single.return_value = "0x" + "3" * 40
+        ))
+        mock_eth.call = AsyncMock(return_value=b'\x00' * 32)
         
         mock_w3.eth = mock_eth
-        mock_w3.codec = mock_codec
         
         return mock_w3
     
@@ -50,17 +52,17 @@ class TestUserOpManager:
     def mock_factory_contract(self):
         """Mock factory contract instance"""
         mock_contract = Mock()
-        mock_contract.functions.getAddress.return_value.call.return_value = "0x" + "3" * 40
-        mock_contract.encodeABI.return_value = "0x" + "4" * 100
+        mock_contract.functions.getAddress.return_value.call = AsyncMock(return_value="0x" + "3" * 40)
+        mock_contract.encode_abi.return_value = "0x" + "4" * 100
         return mock_contract
     
     @pytest.fixture
     def userop_manager(self, mock_w3, mock_factory_contract):
         """Create UserOpManager instance with mocked dependencies"""
-        with patch('hybrid_compute_sdk.userop_manager.Web3') as mock_web3_class, \
+        with patch('hybrid_compute_sdk.userop_manager.AsyncWeb3') as mock_web3_class, \
              patch('eth_account.Account.from_key') as mock_account:
             
-            # Mock the Web3 constructor to return our mock instance
+            # Mock the AsyncWeb3 constructor to return our mock instance
             mock_web3_class.return_value = mock_w3
             mock_account.return_value = TEST_ACCOUNT
             
@@ -147,8 +149,8 @@ class TestUserOpManager:
         )
         
         # Verify the account creation transaction was prepared
-        mock_factory_contract.encodeABI.assert_called_once_with(
-            fn_name="createAccount",
+        mock_factory_contract.encode_abi.assert_called_once_with(
+            "createAccount",
             args=[TEST_ACCOUNT.address, TEST_SALT]
         )
         
@@ -175,8 +177,8 @@ class TestUserOpManager:
         )
         
         # Verify the account creation transaction was prepared with custom owner
-        mock_factory_contract.encodeABI.assert_called_once_with(
-            fn_name="createAccount",
+        mock_factory_contract.encode_abi.assert_called_once_with(
+            "createAccount",
             args=[TEST_OWNER_ADDRESS, TEST_SALT]
         )
         
@@ -187,13 +189,11 @@ class TestUserOpManager:
     @pytest.mark.asyncio
     async def test_create_smart_account_funding_success(self, userop_manager, mock_w3, mock_factory_contract):
         """Test successful funding of new smart account"""
-        # Mock successful funding transaction
-        mock_w3.eth.get_transaction_count.return_value = 1  # Different nonce for funding
-        
         result = await userop_manager.create_smart_account(TEST_SALT)
         
-        # Verify funding transaction was sent
+        # Verify funding transaction was sent, its nonce counted locally rather than re-read
         assert mock_w3.eth.send_raw_transaction.call_count >= 2  # Creation + funding
+        assert mock_w3.eth.get_transaction_count.call_count == 1
         
         # Verify result structure
         assert 'address' in result
@@ -213,6 +213,8 @@ class TestUserOpManager:
         
         # Verify funding was retried
         assert mock_w3.eth.send_raw_transaction.call_count >= 3
+        # The nonce was re-read from the node for the retry
+        assert mock_w3.eth.get_transaction_count.call_count == 2
         
         # Verify result structure
         assert 'address' in result
@@ -238,10 +240,7 @@ class TestUserOpManager:
         mock_owner_address = "0x" + "6" * 40
         
         # Mock the eth_call response
-        mock_w3.eth.call.return_value = mock_owner_address.encode()
-        
-        # Mock the codec decode
-        mock_w3.codec.decode_single.return_value = mock_owner_address
+        mock_w3.eth.call.return_value = bytes(12) + Web3.to_bytes(hexstr=mock_owner_address)
         
         owner = await userop_manager.get_owner(test_contract_address)
         
@@ -275,22 +274,52 @@ class TestUserOpManager:
             {"internalType": "address", "name": "", "type": "address"}
         ]
     
-    def test_connection_failure_handling(self):
-        """Test handling of connection failure during initialization"""
-        with patch('hybrid_compute_sdk.userop_manager.Web3') as mock_web3_class:
+    @pytest.mark.asyncio
+    async def test_connection_failure_handling(self):
+        """Test handling of connection failure on first use"""
+        with patch('hybrid_compute_sdk.userop_manager.AsyncWeb3') as mock_web3_class:
             
             mock_w3 = Mock()
-            mock_w3.is_connected = False
+            mock_w3.is_connected = AsyncMock(return_value=False)
+            mock_w3.provider.has_persistent_connection = True
+            mock_w3.provider.connect = AsyncMock()
+            mock_w3.provider.disconnect = AsyncMock()
             mock_web3_class.return_value = mock_w3
             
+            manager = UserOpManager(
+                TEST_NODE_URL,
+                TEST_BUNDLER_URL,
+                TEST_ENTRY_POINT,
+                TEST_CHAIN_ID,
+                TEST_PRIVATE_KEY
+            )
             with pytest.raises(ConnectionError, match="Failed to connect to node"):
-                UserOpManager(
-                    TEST_NODE_URL,
-                    TEST_BUNDLER_URL,
-                    TEST_ENTRY_POINT,
-                    TEST_CHAIN_ID,
-                    TEST_PRIVATE_KEY
-                )
+                await manager.get_owner("0x" + "5" * 40)
+    
+    @pytest.mark.asyncio
+    async def test_lookups_overlap(self, userop_manager, mock_factory_contract):
+        """Test that concurrent lookups wait on the node together rather than in turn"""
+        async def slow_call():
+            await asyncio.sleep(0.1)
+            return "0x" + "3" * 40
+        mock_factory_contract.functions.getAddress.return_value.call = AsyncMock(side_effect=slow_call)
+        
+        start = time.monotonic()
+        addresses = await asyncio.gather(*(userop_manager.get_expected_address(salt) for salt in range(50)))
+        assert len(addresses) == 50
+        assert time.monotonic() - start < 1.0
+
+@pytest.mark.asyncio
+async def test_concurrent_creation():
+    """Accounts created concurrently against a local node get distinct nonces"""
+    with serve(block_time=0.05, latency=0.02) as server:
+        manager = UserOpManager(server.url, server.url, TEST_ENTRY_POINT, TEST_CHAIN_ID, TEST_PRIVATE_KEY)
+        results = await asyncio.gather(*(manager.create_smart_account(salt) for salt in range(20)))
+        assert all(r['receipt']['status'] == 1 for r in results)
+        # One creation and one funding transaction each, all accepted
+        assert server.chain.tx_counts[TEST_ACCOUNT.address.lower()] == 40
+        assert server.chain.calls['eth_getTransactionCount'] == 1
+        await manager.close()
 
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -0,0 +1,76 @@
+import json
+import os
+import pytest
+
+pytest.importorskip("fastecdsa")  # Listed in offchain_rpc/requirements.txt
+
+@pytest.fixture(scope="module")
+def bench(offchain):
+    return offchain.script("vrf_bench")
+
+@pytest.fixture(scope="module")
+def vectors(bench):
+    with open(bench.VECTORS, "r", encoding="ascii") as f:
+        return json.load(f)
+
+@pytest.fixture(scope="module")
+def vrf(offchain, bench, vectors):
+    mod = offchain.handler("vrf_offchain", bench.load_vrf,
+        OC_VRF_WORKERS=os.environ.get('OC_VRF_WORKERS', "2"),
+        OC_RANDOM_SECRET=vectors[0]['secretKey'], OC_NODE_HTTP="http://localhost:8545")
+    yield mod
+    mod.stop_proof_pool()
+
+def test_corpus(bench, vrf, vectors):
+    # Checks the corpus against the VRF.sol transcription, then covers make_proof,
+    # the make_proofs pool and both verifiers (Pippenger multi-scalar
+    # multiplication and Jacobian coordinates)
+    assert bench.check_corpus(vrf, vectors) == []
+
+def test_vrf_sol_rejects_modified_vectors(bench, vectors):
+    vec = vectors[0]
+    assert bench.check_vector(vec) == []
+    bad_s = dict(vec, s=hex(int(vec['s'], 16) + 1))
+    assert bench.check_vector(bad_s) == [f"VRF.sol: proof rejected for seed {vec['seed']}"]
+    bad_output = dict(vec, outputHash="0x" + "00" * 32)
+    assert bench.check_vector(bad_output) == [f"VRF.sol: output mismatch for seed {vec['seed']}"]
+    wrong_key = dict(vec, publicKey=vectors[1]['publicKey'])
+    assert f"public key of {vec['secretKey']} differs from the published value" in bench.check_vector(wrong_key)
+
+def test_verify_proofs_mixed_batch(bench, vrf, vectors):
+    (sk, pk, _, _) = bench.inputs(vrf, vectors[0])
+    seeds = [bench.inputs(vrf, v)[2] for v in vectors]
+    proofs = vrf.make_proofs(seeds, sk, pk)
+    bad = dict(proofs[3])
+    bad['gamma'] = proofs[4]['gamma']
+    proofs[3] = bad
+
+    expect = [i != 3 for i in range(len(proofs))]
+    assert vrf.verify_proofs(pk, proofs) == expect
+
+def test_verify_proofs_batch_equation(bench, vrf, vectors, capsys):
+    (sk, pk, _, _) = bench.inputs(vrf, vectors[0])
+    seeds = [bench.inputs(vrf, v)[2] for v in vectors[:6]]
+    proofs = vrf.make_proofs(seeds, sk, pk)
+    # Shifting the two witnesses by opposite amounts keeps their sum v, and so c,
+    # unchanged: the proof passes precheck_proof() and only the batched scalar
+    # multiplication checks catch it
+    bad = dict(proofs[2])
+    shift = vrf.G * 5
+    bad['cGammaWitness'] = bad['cGammaWitness'] + shift
+    bad['sHashWitness'] = bad['sHashWitness'] - shift
+    (_, _, z) = vrf.projective_add(bad['cGammaWitness'], bad['sHashWitness'])
+    bad['zInv'] = pow(z, -1, vrf.FIELD_SIZE)
+    proofs[2] = bad
+    vrf.precheck_proof(pk, bad, vrf.fixed_base_table(pk), vrf.fixed_base_table(vrf.G))
+
+    assert vrf.verify_proofs(pk, proofs) == [i != 2 for i in range(len(proofs))]
+    assert "checking proofs individually" in capsys.readouterr().out
+
+def test_proof_pool_started_with_handlers(vrf):
+    vrf.stop_proof_pool()
+    vrf.get_handlers()
+    # Every worker is forked up front, before the server starts any threads
+    assert len(vrf.proof_pool._processes) == vrf.vrf_workers
+    vrf.stop_proof_pool()
+    assert vrf.proof_pool is None